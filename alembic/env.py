@@ -15,8 +15,12 @@ from app.models import *  # noqa: F401, F403 - Import all models for Alembic
 # access to the values within the .ini file in use.
 config = context.config
 
-# Override sqlalchemy.url with the one from settings
-config.set_main_option("sqlalchemy.url", settings.database_url)
+# Override sqlalchemy.url with the one from settings, or from `-x url=...`
+# to migrate another database such as a shard
+config.set_main_option(
+    "sqlalchemy.url",
+    context.get_x_argument(as_dictionary=True).get("url", settings.database_url),
+)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
@@ -0,0 +1,66 @@
+"""Add full-text search column to patient notes
+
+Revision ID: 3f9c2d7b1e4a
+Revises: a0ff62a3101d
+Create Date: 2026-02-09 10:12:41.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f9c2d7b1e4a"
+down_revision: Union[str, None] = "a0ff62a3101d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    # A stored generated column rewrites the table under an ACCESS EXCLUSIVE
+    # lock; see "Upgrade notes" in the README
+    op.add_column(
+        "patient_notes",
+        sa.Column(
+            "content_search",
+            postgresql.TSVECTOR(),
+            sa.Computed("to_tsvector('english'::regconfig, content)", persisted=True),
+            nullable=True,
+        ),
+    )
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_patient_notes_content_search",
+            "patient_notes",
+            ["content_search"],
+            postgresql_using="gin",
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_patient_notes_patient_id_timestamp",
+            "patient_notes",
+            ["patient_id", "timestamp"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_patient_notes_patient_id_timestamp",
+            table_name="patient_notes",
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            "ix_patient_notes_content_search",
+            table_name="patient_notes",
+            postgresql_concurrently=True,
+        )
+    op.drop_column("patient_notes", "content_search")
@@ -0,0 +1,35 @@
+"""Add patient external_id
+
+Revision ID: 5d27be6a9c13
+Revises: c81e5a04d2f7
+Create Date: 2026-02-17 09:26:55.214876
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d27be6a9c13"
+down_revision: Union[str, None] = "c81e5a04d2f7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    op.add_column(
+        "patients", sa.Column("external_id", sa.String(length=64), nullable=True)
+    )
+    op.create_index(
+        "ix_patients_external_id", "patients", ["external_id"], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    op.drop_index("ix_patients_external_id", table_name="patients")
+    op.drop_column("patients", "external_id")
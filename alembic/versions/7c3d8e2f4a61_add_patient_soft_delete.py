@@ -0,0 +1,40 @@
+"""Add patient soft delete
+
+Revision ID: 7c3d8e2f4a61
+Revises: e27a4c9d1b05
+Create Date: 2026-02-26 16:21:38.905127
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7c3d8e2f4a61"
+down_revision: Union[str, None] = "e27a4c9d1b05"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    op.add_column(
+        "patients",
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    # Only patients waiting to be purged are indexed
+    op.create_index(
+        "ix_patients_deleted_at",
+        "patients",
+        ["deleted_at"],
+        postgresql_where=sa.text("deleted_at IS NOT NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    op.drop_index("ix_patients_deleted_at", table_name="patients")
+    op.drop_column("patients", "deleted_at")
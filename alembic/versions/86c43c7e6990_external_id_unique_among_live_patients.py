@@ -0,0 +1,42 @@
+"""Make external_id unique among live patients only
+
+Revision ID: 86c43c7e6990
+Revises: b5e8d3a7f912
+Create Date: 2026-10-19 14:05:31.527190
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "86c43c7e6990"
+down_revision: Union[str, None] = "b5e8d3a7f912"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    # Patients waiting to be purged no longer hold their external_id, so an
+    # upsert never matches a row that is about to disappear
+    op.drop_index("ix_patients_external_id", table_name="patients")
+    op.create_index(
+        "ix_patients_external_id",
+        "patients",
+        ["external_id"],
+        unique=True,
+        postgresql_where=sa.text("deleted_at IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    # Fails while a purged patient shares its external_id with a live one
+    op.drop_index("ix_patients_external_id", table_name="patients")
+    op.create_index(
+        "ix_patients_external_id", "patients", ["external_id"], unique=True
+    )
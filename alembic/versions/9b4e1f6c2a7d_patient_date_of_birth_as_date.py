@@ -0,0 +1,45 @@
+"""Store patient date_of_birth as DATE
+
+Revision ID: 9b4e1f6c2a7d
+Revises: 5d27be6a9c13
+Create Date: 2026-02-19 14:03:27.640115
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b4e1f6c2a7d"
+down_revision: Union[str, None] = "5d27be6a9c13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    op.alter_column(
+        "patients",
+        "date_of_birth",
+        type_=sa.Date(),
+        existing_type=sa.String(length=10),
+        existing_nullable=False,
+        postgresql_using="date_of_birth::date",
+    )
+    op.create_index("ix_patients_date_of_birth", "patients", ["date_of_birth"])
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    op.drop_index("ix_patients_date_of_birth", table_name="patients")
+    op.alter_column(
+        "patients",
+        "date_of_birth",
+        type_=sa.String(length=10),
+        existing_type=sa.Date(),
+        existing_nullable=False,
+        postgresql_using="to_char(date_of_birth, 'YYYY-MM-DD')",
+    )
@@ -0,0 +1,38 @@
+"""Drop count_estimate function
+
+Revision ID: b5e8d3a7f912
+Revises: 7c3d8e2f4a61
+Create Date: 2026-10-19 10:12:44.318204
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b5e8d3a7f912"
+down_revision: Union[str, None] = "7c3d8e2f4a61"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Estimates now come from EXPLAIN with bound parameters, run by the app
+    op.execute("DROP FUNCTION IF EXISTS count_estimate(text)")
+
+
+def downgrade() -> None:
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION count_estimate(query text) RETURNS bigint
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            plan jsonb;
+        BEGIN
+            EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+            RETURN (plan->0->'Plan'->>'Plan Rows')::bigint;
+        END;
+        $$
+        """
+    )
@@ -0,0 +1,38 @@
+"""Add count_estimate function
+
+Revision ID: c81e5a04d2f7
+Revises: 3f9c2d7b1e4a
+Create Date: 2026-02-11 16:40:02.907315
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "c81e5a04d2f7"
+down_revision: Union[str, None] = "3f9c2d7b1e4a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Returns the planner's row estimate for a query without executing it
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION count_estimate(query text) RETURNS bigint
+        LANGUAGE plpgsql AS $$
+        DECLARE
+            plan jsonb;
+        BEGIN
+            EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+            RETURN (plan->0->'Plan'->>'Plan Rows')::bigint;
+        END;
+        $$
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS count_estimate(text)")
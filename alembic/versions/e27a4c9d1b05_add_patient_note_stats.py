@@ -0,0 +1,178 @@
+"""Add maintained note statistics to patients
+
+Revision ID: e27a4c9d1b05
+Revises: 9b4e1f6c2a7d
+Create Date: 2026-02-23 11:47:09.382614
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e27a4c9d1b05"
+down_revision: Union[str, None] = "9b4e1f6c2a7d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema."""
+    op.add_column(
+        "patients",
+        sa.Column("notes_count", sa.Integer(), server_default="0", nullable=False),
+    )
+    op.add_column(
+        "patients",
+        sa.Column("first_note_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.add_column(
+        "patients",
+        sa.Column("last_note_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.execute(
+        """
+        UPDATE patients p
+        SET notes_count = s.notes_count,
+            first_note_at = s.first_note_at,
+            last_note_at = s.last_note_at
+        FROM (
+            SELECT patient_id, count(*) AS notes_count,
+                   min(timestamp) AS first_note_at, max(timestamp) AS last_note_at
+            FROM patient_notes
+            GROUP BY patient_id
+        ) s
+        WHERE p.id = s.patient_id
+        """
+    )
+    op.create_index("ix_patients_notes_count", "patients", ["notes_count"])
+    op.create_index(
+        "ix_patients_last_note_at",
+        "patients",
+        [sa.text("last_note_at DESC NULLS LAST")],
+    )
+
+    # Statement-level triggers: one UPDATE per statement whatever the number
+    # of notes it touched, using transition tables.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION patient_notes_stats_insert() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE patients p
+            SET notes_count = p.notes_count + n.notes_count,
+                first_note_at = LEAST(p.first_note_at, n.first_note_at),
+                last_note_at = GREATEST(p.last_note_at, n.last_note_at),
+                updated_at = now()
+            FROM (
+                SELECT patient_id, count(*) AS notes_count,
+                       min(timestamp) AS first_note_at,
+                       max(timestamp) AS last_note_at
+                FROM new_notes
+                GROUP BY patient_id
+            ) n
+            WHERE p.id = n.patient_id;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    # Bounds are re-read through ix_patient_notes_patient_id_timestamp
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION patient_notes_stats_delete() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE patients p
+            SET notes_count = p.notes_count - o.notes_count,
+                first_note_at = (
+                    SELECT min(timestamp) FROM patient_notes WHERE patient_id = p.id
+                ),
+                last_note_at = (
+                    SELECT max(timestamp) FROM patient_notes WHERE patient_id = p.id
+                ),
+                updated_at = now()
+            FROM (
+                SELECT patient_id, count(*) AS notes_count
+                FROM old_notes
+                GROUP BY patient_id
+            ) o
+            WHERE p.id = o.patient_id;
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION patient_notes_stats_update() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE patients p
+            SET notes_count = (
+                    SELECT count(*) FROM patient_notes WHERE patient_id = p.id
+                ),
+                first_note_at = (
+                    SELECT min(timestamp) FROM patient_notes WHERE patient_id = p.id
+                ),
+                last_note_at = (
+                    SELECT max(timestamp) FROM patient_notes WHERE patient_id = p.id
+                ),
+                updated_at = now()
+            WHERE p.id IN (
+                SELECT o.patient_id
+                FROM old_notes o JOIN new_notes n ON n.id = o.id
+                WHERE (o.patient_id, o.timestamp) IS DISTINCT FROM
+                      (n.patient_id, n.timestamp)
+                UNION
+                SELECT n.patient_id
+                FROM old_notes o JOIN new_notes n ON n.id = o.id
+                WHERE (o.patient_id, o.timestamp) IS DISTINCT FROM
+                      (n.patient_id, n.timestamp)
+            );
+            RETURN NULL;
+        END;
+        $$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER patient_notes_stats_insert
+        AFTER INSERT ON patient_notes
+        REFERENCING NEW TABLE AS new_notes
+        FOR EACH STATEMENT EXECUTE FUNCTION patient_notes_stats_insert()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER patient_notes_stats_delete
+        AFTER DELETE ON patient_notes
+        REFERENCING OLD TABLE AS old_notes
+        FOR EACH STATEMENT EXECUTE FUNCTION patient_notes_stats_delete()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER patient_notes_stats_update
+        AFTER UPDATE ON patient_notes
+        REFERENCING OLD TABLE AS old_notes NEW TABLE AS new_notes
+        FOR EACH STATEMENT EXECUTE FUNCTION patient_notes_stats_update()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema."""
+    for action in ("update", "delete", "insert"):
+        op.execute(
+            f"DROP TRIGGER IF EXISTS patient_notes_stats_{action} ON patient_notes"
+        )
+        op.execute(f"DROP FUNCTION IF EXISTS patient_notes_stats_{action}()")
+    op.drop_index("ix_patients_last_note_at", table_name="patients")
+    op.drop_index("ix_patients_notes_count", table_name="patients")
+    op.drop_column("patients", "last_note_at")
+    op.drop_column("patients", "first_note_at")
+    op.drop_column("patients", "notes_count")
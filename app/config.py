@@ -9,15 +9,136 @@ class Settings(BaseSettings):
     app_name: str = "Python Data Processing API"
     debug: bool = False
     database_url: str = "sqlite:///./test.db"
+    # Read replicas for GET requests, e.g. '["postgresql://...@replica1/db"]'
+    database_replica_urls: list[str] = []
+    replica_sticky_seconds: float = 5.0  # Reads stay on the primary after a write
+    replica_retry_seconds: float = 30.0  # How long a failing replica is skipped
+    replica_connect_timeout: float = 2.0
+    # Spread patients and their notes over these databases by patient_id;
+    # database_url then only allocates patient ids. Never change the count
+    # of a populated deployment, rows are not moved between shards.
+    database_shard_urls: list[str] = []
+
+    # Connection pool, per engine (primary and each replica)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    # Connections each engine opens and primes at startup, before serving
+    db_pool_min_size: int = 2
+    db_pool_timeout: float = 30.0  # Seconds to wait for a free connection
+    db_pool_recycle: int = 3600  # Recycle connections every hour
+    db_pool_pre_ping: bool = True  # One extra round trip per checkout
+    # asyncpg; set the statement cache to 0 behind pgbouncer transaction pooling
+    db_statement_cache_size: int = 100
+    db_command_timeout: float | None = None
+    db_server_settings: dict[str, str] = {}
+    # Cap on lock waits; statements are otherwise bounded by the request deadline
+    db_lock_timeout: float | None = None
+    # Statements slower than this are logged; 0 turns the log off
+    slow_query_seconds: float = 0.5
+    # In debug mode, warn when a request runs the same statement this often
+    n_plus_one_threshold: int = 5
+
+    # Log records as "json" objects or "text" lines, written by a background thread
+    log_format: str = "json"
+    # Share of fast, successful requests written to the access log; errors and
+    # requests slower than slow_request_seconds are always logged
+    access_log_sample_rate: float = 1.0
+    slow_request_seconds: float = 1.0
+
+    # Bucket upper bounds of the /metrics duration (seconds) and response size
+    # (bytes) histograms; unset uses the defaults in app/core/metrics.py
+    metrics_latency_buckets: list[float] | None = None
+    metrics_size_buckets: list[float] | None = None
+    # Directory where workers share their metrics so that /metrics reports
+    # the whole server; python -m app.server sets it when unset. Each worker
+    # writes its counters there every metrics_flush_interval seconds.
+    metrics_dir: str | None = None
+    metrics_flush_interval: float = 1.0
+
+    # Tracing: spans of requests, statements and LLM calls are written to
+    # the "console" (stderr), a "file" of JSON lines or kept in "memory";
+    # unset turns tracing off. A `traceparent` header on a request decides
+    # its sampling, otherwise trace_sample_ratio of the requests are traced.
+    trace_exporter: str | None = None
+    trace_file: str = "traces.jsonl"
+    trace_sample_ratio: float = 1.0
+
+    # Request deadlines in seconds per route group (see app/core/routing.py).
+    # Clients can ask for less with the X-Request-Timeout header, never more.
+    request_deadlines: dict[str, float] = {
+        "health": 2.0,
+        "read": 10.0,
+        "search": 15.0,
+        "write": 30.0,
+        "upload": 60.0,
+        "summary": 60.0,
+    }
+
+    # Admission control per route group and process: requests running at
+    # once, and how many more may wait up to admission_queue_timeout seconds
+    # for a slot. The rest are answered 503 with Retry-After at once. Groups
+    # without a limit, and health checks always, are admitted unconditionally.
+    admission_limits: dict[str, int] = {
+        "summary": 20,
+        "upload": 10,
+        "search": 50,
+        "write": 100,
+        "read": 500,
+    }
+    admission_queue_limits: dict[str, int] = {
+        "summary": 20,
+        "upload": 10,
+        "search": 50,
+        "write": 100,
+        "read": 500,
+    }
+    admission_queue_timeout: float = 1.0
+    admission_retry_after: int = 1  # Seconds
+
+    # Rate limits: requests per client and route group in any
+    # rate_limit_window seconds. Clients are told apart by the
+    # rate_limit_key_header value (e.g. "X-API-Key") when sent, else by IP.
+    # Buckets are per worker process, so a client spread over all workers may
+    # make up to WEB_CONCURRENCY times these many requests.
+    rate_limits: dict[str, int] = {"summary": 10, "upload": 30}
+    rate_limit_window: float = 60.0
+    rate_limit_key_header: str | None = None
+    # Requests with a key also spend from their IP's budget, this many times
+    # the per-client one, so rotating key values cannot lift the limit
+    rate_limit_keys_per_ip: int = 5
 
     # File upload settings
     max_upload_size: int = 10 * 1024 * 1024  # 10MB
     allowed_upload_types: list[str] = ["text/plain"]
+    max_bulk_patients: int = 100_000
+    max_bulk_body_size: int = 32 * 1024 * 1024  # 32MB, checked while reading
+    max_batch_patients: int = 1_000
 
     # LLM settings
     openai_api_key: str | None = None
     llm_provider: str = "openai"  # Check llm/backends for supported providers
     llm_model: str = "gpt-4o-mini"
+    llm_timeout: float = 30.0  # Also bounded by the request deadline
+
+    # Patient read cache (per process); a size or TTL of 0 disables it
+    patient_cache_size: int = 10_000
+    patient_cache_ttl: float = 60.0
+    # A worker does not see the invalidations of the others, so with more
+    # than one worker an entry stays fresh for at most this long
+    patient_cache_worker_ttl: float = 2.0
+
+    # Patients with more notes than this are soft-deleted and purged in the
+    # background, in batches of `patient_purge_batch_size` notes
+    patient_purge_threshold: int = 10_000
+    patient_purge_batch_size: int = 5_000
+
+    # Production server (python -m app.server); WEB_CONCURRENCY defaults to
+    # the CPUs this process may run on
+    host: str = "0.0.0.0"
+    port: int = 8000
+    web_concurrency: int | None = None
+    graceful_timeout: float = 30.0  # Time a stopping worker has to finish requests
+    worker_boot_timeout: float = 60.0  # Time a reloaded worker has to become ready
 
     # Database seeding
     seed_database_on_startup: bool = False
@@ -0,0 +1,154 @@
+"""Per route group concurrency limits with bounded waiting queues."""
+
+import asyncio
+from collections import Counter, deque
+from typing import Any
+
+from app.config import settings
+
+# Reasons a request is shed, as reported in stats and /metrics
+QUEUE_FULL = "queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+CLIENT_DISCONNECTED = "client_disconnected"
+
+
+class GroupLimiter:
+    """At most `limit` requests at once; up to `max_queue` more wait in order.
+
+    A finishing request hands its slot to the oldest waiter, so queued
+    requests are never overtaken by newer ones.
+    """
+
+    __slots__ = ("limit", "max_queue", "active", "waiters", "admitted", "shed")
+
+    def __init__(self, limit: int, max_queue: int) -> None:
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        self.admitted = 0
+        self.shed: Counter[str] = Counter()
+
+    def try_acquire(self) -> bool:
+        """Take a slot if one is free and nobody is waiting for it."""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        return False
+
+    async def acquire(self, timeout: float) -> str | None:
+        """Take a slot, waiting up to `timeout`; the shed reason if none came."""
+        if self.try_acquire():
+            return None
+        if len(self.waiters) >= self.max_queue:
+            self.shed[QUEUE_FULL] += 1
+            return QUEUE_FULL
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done():
+                # The slot was handed over as the wait ended
+                if isinstance(e, asyncio.CancelledError):
+                    self.release()
+                    raise
+            else:
+                waiter.cancel()
+                self.waiters.remove(waiter)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                self.shed[QUEUE_TIMEOUT] += 1
+                return QUEUE_TIMEOUT
+        self.admitted += 1
+        return None
+
+    def release(self) -> None:
+        """Hand the slot to the oldest waiter, or free it."""
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+
+class AdmissionControl:
+    """Limiters of the route groups that have a concurrency limit.
+
+    Limits are per process; groups without one, `/health` included, are
+    never queued or shed.
+    """
+
+    def __init__(self, limits: dict[str, int], queue_limits: dict[str, int]) -> None:
+        self.groups = {
+            group: GroupLimiter(limit, queue_limits.get(group, 0))
+            for group, limit in limits.items()
+            if limit > 0 and group != "health"
+        }
+
+    def limiter(self, group: str) -> GroupLimiter | None:
+        return self.groups.get(group)
+
+    def stats(self) -> dict[str, Any]:
+        return {group: limiter.stats() for group, limiter in self.groups.items()}
+
+    def render(self, stats: dict[str, Any] | None = None) -> str:
+        """Queue depth, active requests and shed counts, for Prometheus.
+
+        `stats` replaces this process's `stats()`, e.g. with the totals of
+        every worker.
+        """
+        items = sorted((self.stats() if stats is None else stats).items())
+        lines = [
+            "# HELP http_admission_active Requests admitted and running.",
+            "# TYPE http_admission_active gauge",
+        ]
+        for group, group_stats in items:
+            active = group_stats["active"]
+            lines.append(f'http_admission_active{{group="{group}"}} {active}')
+        lines += [
+            "# HELP http_admission_queue_depth Requests waiting for a slot.",
+            "# TYPE http_admission_queue_depth gauge",
+        ]
+        for group, group_stats in items:
+            depth = group_stats["queued"]
+            lines.append(f'http_admission_queue_depth{{group="{group}"}} {depth}')
+        lines += [
+            "# HELP http_requests_shed_total Requests answered 503 by reason.",
+            "# TYPE http_requests_shed_total counter",
+        ]
+        for group, group_stats in items:
+            for reason in (QUEUE_FULL, QUEUE_TIMEOUT):
+                lines.append(
+                    f'http_requests_shed_total{{group="{group}",reason="{reason}"}} '
+                    f"{group_stats['shed'].get(reason, 0)}"
+                )
+        lines += [
+            "# HELP http_admission_abandoned_total Requests whose client "
+            "disconnected while queued.",
+            "# TYPE http_admission_abandoned_total counter",
+        ]
+        for group, group_stats in items:
+            abandoned = group_stats["shed"].get(CLIENT_DISCONNECTED, 0)
+            lines.append(
+                f'http_admission_abandoned_total{{group="{group}"}} {abandoned}'
+            )
+        return "\n".join(lines) + "\n"
+
+
+admission_control = AdmissionControl(
+    settings.admission_limits, settings.admission_queue_limits
+)
@@ -1,38 +1,360 @@
-from collections.abc import AsyncGenerator
-from typing import Optional
+import asyncio
+import itertools
+import logging
+import time
+from collections.abc import AsyncGenerator, Awaitable, Callable, Sequence
+from contextvars import ContextVar
+from typing import Any, Optional, TypeVar
 
+from fastapi import Request, Response
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
+
+from app.config import settings
+from app.core.deadline import set_transaction_timeouts
+from app.core.metrics import Histogram
+from app.core.querystats import instrument_engine
+from app.core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Set after a write so the same client keeps reading from the primary
+STICKY_COOKIE = "db_primary_until"
+READ_ONLY_METHODS = frozenset({"GET", "HEAD"})
+
+# Endpoint attribute set by `read_only` on POST routes that never write
+READ_ONLY_ENDPOINT = "__db_read_only__"
+
+# Session.info key set on sessions bound to a read replica
+REPLICA_SESSION = "replica"
+# Session.info key set on primary sessions of reads kept there by STICKY_COOKIE
+STICKY_SESSION = "sticky"
+
+EndpointT = TypeVar("EndpointT", bound=Callable[..., Any])
+
+# Multiplier of Fibonacci hashing, spreads consecutive ids over shards
+_SHARD_HASH = 0x9E3779B97F4A7C15
+
+# Every transaction inherits the deadline of the request that opened it
+event.listen(Session, "after_begin", set_transaction_timeouts)
+
+
+# Set while a checkout is timed; QueuePool._do_get retries by recursing
+_checkout_in_progress: ContextVar[bool] = ContextVar(
+    "_checkout_in_progress", default=False
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait and how many time out."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.wait_seconds = Histogram()
+        self.timeouts = 0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        if _checkout_in_progress.get():
+            return super()._do_get()
+        token = _checkout_in_progress.set(True)
+        start = time.perf_counter()
+        try:
+            with span("db.pool.checkout"):
+                return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.wait_seconds.observe(time.perf_counter() - start)
+            _checkout_in_progress.reset(token)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": self.overflow(),
+            "timeouts": self.timeouts,
+            "wait_seconds": self.wait_seconds.snapshot(),
+        }
+
+
+def _create_engine(database_url: str, **connect_args: Any) -> AsyncEngine:
+    engine = create_async_engine(
+        database_url.replace("postgresql://", "postgresql+asyncpg://"),
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        connect_args={
+            # SQLAlchemy's prepared statement cache and asyncpg's own
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+            "command_timeout": settings.db_command_timeout,
+            "server_settings": settings.db_server_settings,
+            **connect_args,
+        },
+    )
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+def shard_index(patient_id: int, shard_count: int) -> int:
+    """Shard holding a patient and its notes; stable for a given shard count."""
+    return ((patient_id * _SHARD_HASH) & 0xFFFFFFFFFFFFFFFF) % shard_count
+
+
+def _pool(engine: AsyncEngine) -> InstrumentedPool:
+    pool = engine.pool
+    assert isinstance(pool, InstrumentedPool)
+    return pool
+
+
+def is_replica(session: AsyncSession) -> bool:
+    """Whether `session` reads from a replica, which may lag the primary."""
+    return bool(session.info.get(REPLICA_SESSION))
+
+
+def is_sticky(session: AsyncSession) -> bool:
+    """Whether `session` serves a client that must see its own recent writes."""
+    return bool(session.info.get(STICKY_SESSION))
+
+
+def read_only(endpoint: EndpointT) -> EndpointT:
+    """Mark an endpoint that only reads, so it is routed like a GET.
+
+    For POST routes that take their query in the body; they use replicas and
+    don't pin the client to the primary with STICKY_COOKIE.
+    """
+    setattr(endpoint, READ_ONLY_ENDPOINT, True)
+    return endpoint
+
+
+def is_read_only(request: Request) -> bool:
+    """Whether `request` cannot write: a GET/HEAD or a `read_only` endpoint."""
+    if request.method in READ_ONLY_METHODS:
+        return True
+    return bool(getattr(request.scope.get("endpoint"), READ_ONLY_ENDPOINT, False))
+
+
+class Replica:
+    """A read replica with its own pool and health state."""
+
+    def __init__(self, database_url: str) -> None:
+        self.engine = _create_engine(
+            database_url, timeout=settings.replica_connect_timeout
+        )
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            info={REPLICA_SESSION: True},
+        )
+        self.unhealthy_until = 0.0
+
+    @property
+    def checked_out(self) -> int:
+        return _pool(self.engine).checkedout()
 
 
 class PostgresBackend:
     def __init__(self) -> None:
         self.engine: Optional[AsyncEngine] = None
         self.AsyncSessionLocal: Optional[async_sessionmaker[AsyncSession]] = None
+        self.replicas: list[Replica] = []
+        self.shards: list[PostgresBackend] = []
+        self._round_robin = itertools.count()
 
-    async def init(self, database_url: str) -> None:
-        self.engine = create_async_engine(
-            database_url.replace("postgresql://", "postgresql+asyncpg://"),
-            echo=False,
-            pool_size=10,
-            max_overflow=20,
-            pool_pre_ping=True,
-            pool_recycle=3600,  # Recycle connections every hour
-        )
+    async def init(
+        self,
+        database_url: str,
+        replica_urls: Sequence[str] = (),
+        shard_urls: Sequence[str] = (),
+    ) -> None:
+        self.engine = _create_engine(database_url)
         self.AsyncSessionLocal = async_sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        self.replicas = [Replica(url) for url in replica_urls]
+        self.shards = []
+        for url in shard_urls:
+            shard = PostgresBackend()
+            await shard.init(url)
+            self.shards.append(shard)
 
     async def close(self) -> None:
         if self.engine:
             await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        for shard in self.shards:
+            await shard.close()
+
+    def shard_for(self, patient_id: int) -> "PostgresBackend":
+        """Backend of the shard holding `patient_id`."""
+        return self.shards[shard_index(patient_id, len(self.shards))]
 
-    async def get_conn(self) -> AsyncGenerator[AsyncSession, None]:
+    def shard_session(self, index: int) -> AsyncSession:
+        """A new session on shard `index`."""
+        session_factory = self.shards[index].AsyncSessionLocal
+        if session_factory is None:
+            raise RuntimeError("Database pool is not initialized.")
+        return session_factory()
+
+    async def prepare_shards(self) -> None:
+        """Interleave the note id sequences so note ids are unique globally.
+
+        Shard `i` of `n` draws ids congruent to `i + 1` modulo `n`, starting
+        above its current maximum. Patient ids come from the primary instead.
+        """
+        count = len(self.shards)
+        for index in range(count):
+            async with self.shard_session(index) as session:
+                max_id = await session.scalar(
+                    text("SELECT coalesce(max(id), 0) FROM patient_notes")
+                )
+                start = (max_id or 0) + 1
+                start += (index + 1 - start) % count
+                await session.execute(
+                    text(
+                        "ALTER SEQUENCE patient_notes_id_seq "
+                        f"INCREMENT BY {count} MINVALUE 1 RESTART WITH {start}"
+                    )
+                )
+                await session.commit()
+
+    async def warmup(
+        self,
+        connections: int,
+        prime: Callable[[AsyncSession], Awaitable[None]],
+    ) -> None:
+        """Open `connections` connections per engine and run `prime` on each.
+
+        asyncpg prepares statements per connection, so every warm connection
+        serves its first requests without connecting or preparing. An engine
+        that cannot be reached is logged and left cold.
+        """
+        factories: list[tuple[str, async_sessionmaker[AsyncSession]]] = []
+        if self.engine is not None and self.AsyncSessionLocal is not None:
+            factories.append((repr(self.engine.url), self.AsyncSessionLocal))
+        factories += [
+            (repr(replica.engine.url), replica.AsyncSessionLocal)
+            for replica in self.replicas
+        ]
+        for url, session_factory in factories:
+            sessions = [session_factory() for _ in range(connections)]
+            try:
+                # All checked out at once, so each one is a distinct connection
+                await asyncio.gather(*(session.connection() for session in sessions))
+                await asyncio.gather(*(prime(session) for session in sessions))
+            except (DBAPIError, OSError) as e:
+                logger.warning("Warmup of %s failed: %s", url, e)
+            finally:
+                await asyncio.gather(*(session.close() for session in sessions))
+        for shard in self.shards:
+            await shard.warmup(connections, prime)
+
+    def pool_stats(self) -> dict[str, Any]:
+        """Pool usage and checkout wait times of every engine."""
+        now = time.monotonic()
+        stats: dict[str, Any] = {
+            "primary": _pool(self.engine).stats() if self.engine else None,
+            "replicas": [
+                {
+                    "host": replica.engine.url.host,
+                    "healthy": replica.unhealthy_until <= now,
+                    **_pool(replica.engine).stats(),
+                }
+                for replica in self.replicas
+            ],
+        }
+        if self.shards:
+            stats["shards"] = [shard.pool_stats()["primary"] for shard in self.shards]
+        return stats
+
+    async def get_conn(
+        self, request: Request, response: Response
+    ) -> AsyncGenerator[AsyncSession, None]:
+        """Yield a session: replicas for reads, the primary for writes.
+
+        Reads go to the primary for `replica_sticky_seconds` after the same
+        client wrote, so it always sees its own changes. When sharded,
+        requests for one patient get a session on that patient's shard.
+        """
         if self.AsyncSessionLocal is None:
             raise RuntimeError("Database pool is not initialized.")
-        async with self.AsyncSessionLocal() as session:
+
+        if self.shards and "patient_id" in request.path_params:
+            try:
+                shard = self.shard_for(int(request.path_params["patient_id"]))
+            except ValueError:
+                pass  # rejected by path validation, no query will run
+            else:
+                async for session in shard.get_conn(request, response):
+                    yield session
+                return
+
+        info: dict[str, Any] = {}
+        if is_read_only(request):
+            if self.replicas and self._is_sticky(request):
+                info[STICKY_SESSION] = True
+            elif self.replicas:
+                replica_session = await self._replica_session()
+                if replica_session is not None:
+                    async with replica_session:
+                        yield replica_session
+                    return
+        elif self.replicas:
+            sticky_for = settings.replica_sticky_seconds
+            response.set_cookie(
+                STICKY_COOKIE,
+                f"{time.time() + sticky_for:.3f}",
+                max_age=max(1, round(sticky_for)),
+                httponly=True,
+                samesite="lax",
+            )
+
+        async with self.AsyncSessionLocal(info=info) as session:
             yield session
+
+    def _is_sticky(self, request: Request) -> bool:
+        try:
+            return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    async def _replica_session(self) -> AsyncSession | None:
+        """Connect to the least busy healthy replica, None if there is none.
+
+        Ties on checked-out connections are broken round-robin. A replica that
+        fails to connect is skipped for `replica_retry_seconds`.
+        """
+        now = time.monotonic()
+        healthy = [r for r in self.replicas if r.unhealthy_until <= now]
+        if not healthy:
+            return None
+        offset = next(self._round_robin) % len(healthy)
+        rotated = healthy[offset:] + healthy[:offset]
+        for replica in sorted(rotated, key=lambda r: r.checked_out):
+            session = replica.AsyncSessionLocal()
+            try:
+                await session.connection()
+            except (DBAPIError, OSError) as e:
+                await session.close()
+                replica.unhealthy_until = now + settings.replica_retry_seconds
+                logger.warning("Replica %r unavailable: %s", replica.engine.url, e)
+                continue
+            return session
+        return None
@@ -0,0 +1,126 @@
+"""Process-local in-memory caches."""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class AsyncLRUCache(Generic[K, V]):
+    """Size-bounded LRU cache with per-entry TTL, safe to share across tasks.
+
+    Writers that loaded a value before an invalidation happened pass the
+    `generation` they read up front to `set`, so a stale read can never
+    overwrite a fresher invalidation.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    async def get(self, key: K) -> V | None:
+        """Return the cached value for `key`, or None if missing or expired."""
+        if not self.enabled:
+            return None
+        async with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    async def get_many(self, keys: Iterable[K]) -> dict[K, V]:
+        """Return the fresh cached values among `keys`, taking the lock once."""
+        if not self.enabled:
+            return {}
+        found: dict[K, V] = {}
+        now = time.monotonic()
+        async with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None or entry[0] < now:
+                    if entry is not None:
+                        del self._data[key]
+                    self.misses += 1
+                    continue
+                self._data.move_to_end(key)
+                self.hits += 1
+                found[key] = entry[1]
+        return found
+
+    async def set(
+        self,
+        key: K,
+        value: V,
+        generation: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        """Store `value`, unless the cache was invalidated since `generation`."""
+        await self.set_many({key: value}, generation, ttl)
+
+    async def set_many(
+        self,
+        items: dict[K, V],
+        generation: int | None = None,
+        ttl: float | None = None,
+    ) -> None:
+        """Store all `items`, unless the cache was invalidated since `generation`.
+
+        `ttl` shortens the cache TTL for these entries; it never extends it.
+        """
+        if not self.enabled:
+            return
+        async with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+            expires = time.monotonic() + ttl
+            for key, value in items.items():
+                self._data[key] = (expires, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    async def invalidate(self, *keys: K) -> None:
+        """Drop `keys` from the cache."""
+        async with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        self._data.clear()
+        self.generation += 1
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Return size and hit-ratio counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
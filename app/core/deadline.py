@@ -0,0 +1,106 @@
+"""Per-request deadlines, propagated to database statements and LLM calls."""
+
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+
+from app.config import settings
+
+# Monotonic time by which the current request must be answered
+_deadline: ContextVar[float | None] = ContextVar("_deadline", default=None)
+
+# query_canceled (statement_timeout) and lock_not_available (lock_timeout)
+TIMEOUT_SQLSTATES = frozenset({"57014", "55P03"})
+
+SET_TIMEOUTS = text(
+    "SELECT set_config('statement_timeout', :statement_timeout, true), "
+    "set_config('lock_timeout', :lock_timeout, true)"
+)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when work would start after the request deadline has passed."""
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Run the block under a deadline `seconds` from now; None means no limit."""
+    at = None if seconds is None else time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and (at is None or current < at):
+        at = current  # a nested deadline can only shorten the outer one
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Run the block without the deadline of the request that started it.
+
+    For background work such as tasks created during a request: they copy
+    the request's context, deadline included, but outlive the response.
+    """
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """Seconds left before the deadline, None when there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def timeout(default: float | None = None) -> float | None:
+    """Timeout for an outgoing call: the time left, capped by `default`.
+
+    Raises DeadlineExceeded if the deadline has already passed.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left if default is None else min(left, default)
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Whether an error is a timeout, including statement and lock timeouts."""
+    if isinstance(error, DBAPIError):
+        return getattr(error.orig, "sqlstate", None) in TIMEOUT_SQLSTATES
+    return isinstance(error, TimeoutError)
+
+
+def set_transaction_timeouts(
+    session: Any, transaction: Any, connection: Connection
+) -> None:
+    """Session `after_begin` hook: bound the transaction by the deadline.
+
+    Postgres then cancels statements and lock waits itself once the request
+    is out of time, instead of leaving them running after we gave up.
+    """
+    statement_timeout = timeout()
+    if statement_timeout is None:
+        return
+    lock_timeout = statement_timeout
+    if settings.db_lock_timeout is not None:
+        lock_timeout = min(lock_timeout, settings.db_lock_timeout)
+    connection.execute(
+        SET_TIMEOUTS,
+        {
+            # 0 would disable the timeout altogether
+            "statement_timeout": str(max(1, round(statement_timeout * 1000))),
+            "lock_timeout": str(max(1, round(lock_timeout * 1000))),
+        },
+    )
@@ -0,0 +1,30 @@
+"""Helpers for conditional GET requests (ETag / If-None-Match)."""
+
+import hashlib
+from typing import Any
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the values a representation depends on."""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Check an If-None-Match header against `etag` (weak comparison)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Response | None:
+    """Tag `response` with `etag` and return a 304 if the client already has it."""
+    response.headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -1,18 +1,99 @@
+import atexit
+import copy
 import logging
+import queue
 import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+
+import orjson
 
 from app.config import settings
 
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = frozenset(
+    logging.LogRecord("", 0, "", 0, "", None, None).__dict__
+) | {"message", "asctime", "taskName"}
+
+_listener: QueueListener | None = None
+_handler: QueueHandler | None = None
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with the `extra=` fields as keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _QueueHandler(QueueHandler):
+    """Queue records with their message and traceback already rendered.
+
+    Unlike the stdlib version it keeps the `extra=` fields and leaves the
+    final formatting to the writer thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 def setup_logging() -> None:
-    """Set up logging configuration for the application."""
-    log_format = "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
+    """Set up logging configuration for the application.
+
+    Records are put on a queue and written to stdout by a background thread,
+    so a slow stdout never blocks the event loop.
+    """
+    global _listener, _handler
+    stop_logging()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if settings.log_format == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(
+            logging.Formatter("%(asctime)s | %(name)s | %(levelname)s | %(message)s")
+        )
 
-    logging.basicConfig(
-        level=logging.DEBUG if settings.debug else logging.INFO,
-        format=log_format,
-        handlers=[logging.StreamHandler(sys.stdout)],
-    )
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    _handler = _QueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG if settings.debug else logging.INFO)
+    root.addHandler(_handler)
 
     logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
+
+
+@atexit.register
+def stop_logging() -> None:
+    """Write out the queued records and stop the writer thread."""
+    global _listener, _handler
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,191 @@
+"""In-process metric primitives."""
+
+import bisect
+import itertools
+from collections import Counter
+from collections.abc import Sequence
+from typing import Any
+
+from app.config import settings
+
+# Upper bounds in seconds, from sub-millisecond pool checkouts to slow requests
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram with cumulative (`le`) bucket counts."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def dump(self) -> dict[str, Any]:
+        """Raw per-bucket counts and the sum, as taken by `add`."""
+        return {"counts": list(self._counts), "sum": self.sum}
+
+    def add(self, dump: dict[str, Any]) -> None:
+        """Add the observations of another histogram's `dump`."""
+        for index, count in enumerate(dump["counts"]):
+            self._counts[index] += count
+        self.count += sum(dump["counts"])
+        self.sum += dump["sum"]
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return cumulative bucket counts keyed by upper bound, plus totals."""
+        cumulative = itertools.accumulate(self._counts)
+        bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+        return {
+            "buckets": dict(zip(bounds, cumulative)),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+STATUS_CLASSES = ("other", "1xx", "2xx", "3xx", "4xx", "5xx")
+
+# Upper bounds in bytes of response bodies
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class RouteMetrics:
+    """Requests of one method and route template."""
+
+    __slots__ = ("statuses", "duration", "response_size")
+
+    def __init__(
+        self, latency_buckets: Sequence[float], size_buckets: Sequence[float]
+    ) -> None:
+        # Indexed by status // 100, i.e. 1xx to 5xx (0 for invalid codes)
+        self.statuses = [0] * 6
+        self.duration = Histogram(latency_buckets)
+        self.response_size = Histogram(size_buckets)
+
+
+class RequestMetrics:
+    """RED metrics per route: request rate by status class, duration, size.
+
+    Routes are keyed by their template, e.g. `/patients/{patient_id}`, so
+    ids never multiply the series. In-flight requests are counted per route
+    group, since the route is only known once routing is done.
+    """
+
+    def __init__(
+        self,
+        latency_buckets: Sequence[float] = LATENCY_BUCKETS,
+        size_buckets: Sequence[float] = SIZE_BUCKETS,
+    ) -> None:
+        self.latency_buckets = latency_buckets
+        self.size_buckets = size_buckets
+        self.routes: dict[tuple[str, str], RouteMetrics] = {}
+        self.in_flight: Counter[str] = Counter()
+
+    def _route(self, method: str, route: str) -> RouteMetrics:
+        metrics = self.routes.get((method, route))
+        if metrics is None:
+            metrics = self.routes[method, route] = RouteMetrics(
+                self.latency_buckets, self.size_buckets
+            )
+        return metrics
+
+    def observe(
+        self, method: str, route: str, status: int, seconds: float, size: int
+    ) -> None:
+        metrics = self._route(method, route)
+        metrics.statuses[status // 100 if 100 <= status < 600 else 0] += 1
+        metrics.duration.observe(seconds)
+        metrics.response_size.observe(size)
+
+    def dump(self) -> dict[str, Any]:
+        """JSON-ready counters, as taken by `add`."""
+        return {
+            "routes": [
+                [
+                    method,
+                    route,
+                    metrics.statuses,
+                    metrics.duration.dump(),
+                    metrics.response_size.dump(),
+                ]
+                for (method, route), metrics in self.routes.items()
+            ],
+            "in_flight": dict(self.in_flight),
+        }
+
+    def add(self, dump: dict[str, Any], gauges: bool = True) -> None:
+        """Add the counters of another `dump`, and its gauges if `gauges`."""
+        for method, route, statuses, duration, response_size in dump["routes"]:
+            metrics = self._route(method, route)
+            for index, count in enumerate(statuses):
+                metrics.statuses[index] += count
+            metrics.duration.add(duration)
+            metrics.response_size.add(response_size)
+        if gauges:
+            self.in_flight.update(dump["in_flight"])
+
+    def render(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP http_requests_total Requests by route and status class.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route), metrics in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{_escape(route)}"'
+            for status, count in zip(STATUS_CLASSES, metrics.statuses):
+                if count:
+                    lines.append(
+                        f'http_requests_total{{{labels},status="{status}"}} {count}'
+                    )
+        for name, help_text, attribute in (
+            (
+                "http_request_duration_seconds",
+                "Time until the response is sent.",
+                "duration",
+            ),
+            ("http_response_size_bytes", "Size of response bodies.", "response_size"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (method, route), metrics in sorted(self.routes.items()):
+                labels = f'method="{method}",route="{_escape(route)}"'
+                snapshot = getattr(metrics, attribute).snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {snapshot['sum']}")
+                lines.append(f"{name}_count{{{labels}}} {snapshot['count']}")
+        lines += [
+            "# HELP http_requests_in_flight Requests being handled, by route group.",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        for group, count in sorted(self.in_flight.items()):
+            lines.append(f'http_requests_in_flight{{group="{group}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+request_metrics = RequestMetrics(
+    settings.metrics_latency_buckets or LATENCY_BUCKETS,
+    settings.metrics_size_buckets or SIZE_BUCKETS,
+)
@@ -0,0 +1,86 @@
+"""Pagination helpers with a configurable strategy for computing totals."""
+
+from collections.abc import Callable, Sequence
+from typing import Any
+
+import orjson
+from fastapi_pagination import Params, resolve_params
+from fastapi_pagination.ext.sqlalchemy import apaginate
+from sqlalchemy import BigInteger, Select, cast, column, func, literal, select, table
+from sqlalchemy.dialects.postgresql import REGCLASS
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.compiler import SQLCompiler
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.schemas.pagination import Page, TotalMode
+
+
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON)` of a query, keeping its bound parameters."""
+
+    inherit_cache = False
+
+    def __init__(self, query: Select) -> None:
+        self.query = query
+
+
+@compiles(Explain)  # type: ignore[no-untyped-call]
+def _compile_explain(element: Explain, compiler: SQLCompiler, **kw: Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.query, **kw)
+
+
+async def estimate_count(db: AsyncSession, query: Select) -> int:
+    """The planner's row estimate for `query`, without running it.
+
+    Unfiltered queries read `pg_class.reltuples`; filtered ones are
+    explained with their parameters bound, never rendered into the SQL.
+    """
+    if query.whereclause is None:
+        froms = query.get_final_froms()
+        if len(froms) == 1 and hasattr(froms[0], "name"):
+            reltuples = (
+                select(func.greatest(cast(column("reltuples"), BigInteger), 0))
+                .select_from(table("pg_class"))
+                .where(column("oid") == cast(literal(froms[0].name), REGCLASS))
+            )
+            return await db.scalar(reltuples) or 0
+
+    plan = await db.scalar(Explain(query.order_by(None)))
+    if isinstance(plan, (str, bytes)):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    total_mode: TotalMode = TotalMode.exact,
+    transformer: Callable[[Sequence[Any]], Sequence[Any]] | None = None,
+) -> Any:
+    """Paginate `query` with the current request params.
+
+    `exact` keeps the COUNT(*) done by `apaginate`, `estimate` replaces it
+    with a planner estimate and `none` skips it; both fetch one extra row to
+    tell whether a next page exists. `transformer` maps the page's rows.
+    """
+    if total_mode == TotalMode.exact:
+        return await apaginate(db, query, transformer=transformer)
+
+    total = None
+    if total_mode == TotalMode.estimate:
+        total = await estimate_count(db, query)
+
+    params: Params = resolve_params()
+    raw_params = params.to_raw_params().as_limit_offset()
+    limit = raw_params.limit or 0
+    result = await db.execute(query.limit(limit + 1).offset(raw_params.offset))
+    if len(query.column_descriptions) == 1:
+        items: list[Any] = list(result.scalars().all())
+    else:
+        items = list(result.all())
+    has_next = len(items) > limit
+    items = items[:limit]
+    if transformer is not None:
+        items = list(transformer(items))
+    return Page.create(items, params, total=total, has_next=has_next)
@@ -0,0 +1,138 @@
+"""Per-request SQL statistics, slow query log and N+1 detection."""
+
+import logging
+import re
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExceptionContext
+
+from app.config import settings
+from app.core.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r"\$\d+(?:\s*,\s*\$\d+)+")
+
+
+class QueryStats:
+    """Statements run on behalf of one request."""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """Statements run at least `threshold` times, most frequent first."""
+        return [
+            (statement, times)
+            for statement, times in self.statements.most_common()
+            if times >= threshold
+        ]
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("_query_stats", default=None)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect the statements run in this context, tasks it spawns included."""
+    stats = QueryStats()
+    token = _query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _query_stats.reset(token)
+
+
+def normalize_sql(statement: str) -> str:
+    """One-line SQL with literals and placeholder lists collapsed."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _PLACEHOLDER_LISTS.sub("$n, ...", statement)
+    return _LITERALS.sub("?", statement)
+
+
+def params_shape(parameters: Any, executemany: bool = False) -> str:
+    """Types of the bound parameters; values may hold patient data."""
+    if executemany:
+        rows = list(parameters)
+        first = params_shape(rows[0]) if rows else "()"
+        return f"{len(rows)} x {first}"
+    if isinstance(parameters, dict):
+        items = ", ".join(f"{k}: {type(v).__name__}" for k, v in parameters.items())
+        return f"{{{items}}}"
+    if isinstance(parameters, (list, tuple)):
+        return f"({', '.join(type(value).__name__ for value in parameters)})"
+    return type(parameters).__name__
+
+
+def _before_cursor_execute(
+    conn: Connection, cursor: Any, statement: str, *args: Any
+) -> None:
+    current = start_span("db.query")
+    if current is not None:
+        current.attributes["db.statement"] = normalize_sql(statement)
+    conn.info.setdefault("query_spans", []).append(current)
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    current = conn.info["query_spans"].pop()
+    if current is not None:
+        current.finish()
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        if settings.debug:
+            stats.statements[statement] += 1
+    if (
+        settings.slow_query_seconds
+        and elapsed >= settings.slow_query_seconds
+        # Normalizing is only worth it when the record is written
+        and logger.isEnabledFor(logging.WARNING)
+    ):
+        logger.warning(
+            "Slow query (%.3fs): %s params=%s",
+            elapsed,
+            normalize_sql(statement),
+            params_shape(parameters, executemany),
+        )
+
+
+def _handle_error(context: ExceptionContext) -> None:
+    if context.connection is not None:
+        starts = context.connection.info.get("query_start")
+        if starts:
+            starts.pop()
+        spans = context.connection.info.get("query_spans")
+        if spans:
+            current = spans.pop()
+            if current is not None:
+                current.set_error(context.original_exception)
+                current.finish()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement run on `engine`."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,140 @@
+"""Token bucket rate limits per client and route group."""
+
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import NamedTuple
+
+from app.config import settings
+
+
+class Decision(NamedTuple):
+    """Outcome of taking a token, in the terms of the `RateLimit-*` headers."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # Seconds until the bucket is full again
+    retry_after: int  # Seconds until the next token, 0 when allowed
+
+
+class RateLimitStore(ABC):
+    """Token buckets by key.
+
+    The default store is per process; a store shared by all workers, such as
+    one backed by Redis, implements the same methods atomically.
+    """
+
+    @abstractmethod
+    async def take(self, key: str, capacity: int, per_second: float) -> Decision:
+        """Take one token from the bucket of `key`, refilled at `per_second`."""
+
+    @abstractmethod
+    async def refund(self, key: str, capacity: int) -> None:
+        """Put back a token taken from the bucket of `key`."""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Forget every bucket."""
+
+
+class MemoryStore(RateLimitStore):
+    """In-process buckets; the least recently used go beyond `maxsize` keys."""
+
+    def __init__(self, maxsize: int = 100_000) -> None:
+        self.maxsize = maxsize
+        # key -> (tokens, time they were counted)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: int, per_second: float) -> Decision:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (float(capacity), now))
+        tokens = min(capacity, tokens + (now - updated) * per_second)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return Decision(
+            allowed=allowed,
+            limit=capacity,
+            remaining=int(tokens),
+            reset=math.ceil((capacity - tokens) / per_second),
+            retry_after=0 if allowed else math.ceil((1 - tokens) / per_second),
+        )
+
+    async def refund(self, key: str, capacity: int) -> None:
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            tokens, updated = bucket
+            self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    async def clear(self) -> None:
+        self._buckets.clear()
+
+
+class RateLimiter:
+    """Budgets of `limits[group]` requests per `window` seconds per client.
+
+    A client may spend its whole budget at once; it then gets tokens back
+    evenly over the window. Groups without a budget are not limited. A
+    client's `ip`, when it is told apart by something else, has a budget
+    `keys_per_ip` times larger shared by all the clients behind it.
+    """
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        limits: dict[str, int],
+        window: float,
+        keys_per_ip: int = 1,
+    ) -> None:
+        self.store = store
+        self.limits = {group: limit for group, limit in limits.items() if limit > 0}
+        self.window = window
+        self.keys_per_ip = keys_per_ip
+
+    async def check(
+        self, group: str, client: str, ip: str | None = None
+    ) -> Decision | None:
+        """Spend a token of `client` in `group`; None if the group is unlimited.
+
+        The `ip` bucket is charged first, so a client rejected there does not
+        get a bucket of its own, and refunded when the client's own bucket is
+        empty. Decisions always describe the client's budget; only the wait
+        of a rejection by the `ip` bucket comes from that bucket.
+        """
+        limit = self.limits.get(group)
+        if limit is None:
+            return None
+        if ip is None or ip == client:
+            return await self.store.take(
+                f"{group}:{client}", limit, limit / self.window
+            )
+
+        ip_key, ip_capacity = f"{group}:{ip}", limit * self.keys_per_ip
+        shared = await self.store.take(ip_key, ip_capacity, ip_capacity / self.window)
+        if not shared.allowed:
+            return Decision(
+                allowed=False,
+                limit=limit,
+                remaining=0,
+                reset=shared.retry_after,
+                retry_after=shared.retry_after,
+            )
+        decision = await self.store.take(
+            f"{group}:{client}", limit, limit / self.window
+        )
+        if not decision.allowed:
+            await self.store.refund(ip_key, ip_capacity)
+        return decision
+
+
+rate_limiter = RateLimiter(
+    MemoryStore(),
+    settings.rate_limits,
+    settings.rate_limit_window,
+    settings.rate_limit_keys_per_ip,
+)
@@ -0,0 +1,21 @@
+"""Classify requests into route groups before routing has happened."""
+
+from app.core.backends.postgres import READ_ONLY_METHODS
+
+ROUTE_GROUPS = ("health", "summary", "upload", "search", "write", "read")
+
+
+def route_group(method: str, path: str) -> str:
+    """Group a request by cost profile, for per-group limits and metrics."""
+    path = path.rstrip("/")
+    if path == "/health" or path.startswith("/health/"):
+        return "health"
+    if path.endswith("/summary"):
+        return "summary"
+    if path.endswith("/notes/upload"):
+        return "upload"
+    if path.endswith("/search"):
+        return "search"
+    if method not in READ_ONLY_METHODS:
+        return "write"
+    return "read"
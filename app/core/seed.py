@@ -1,17 +1,29 @@
 """Database seeding utilities for development/demo environments."""
 
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.core.backends.postgres import PostgresBackend
 from app.models.notes import PatientNote
 from app.models.patients import Patient
 
 logger = logging.getLogger(__name__)
 
 
+async def seed_on_startup(backend: PostgresBackend) -> None:
+    """Seed if `seed_database_on_startup` is set; the seed does not know shards."""
+    if not settings.seed_database_on_startup or backend.shards:
+        return
+    if backend.AsyncSessionLocal is None:
+        raise RuntimeError("Database pool is not initialized.")
+    async with backend.AsyncSessionLocal() as session:
+        await seed_database(session, force=settings.force_reseed)
+
+
 async def seed_database(session: AsyncSession, force: bool = False) -> None:
     """Seed the database with sample data.
 
@@ -29,9 +41,7 @@ async def seed_database(session: AsyncSession, force: bool = False) -> None:
 
     if force and existing_patients:
         logger.warning("Force flag set. Deleting existing data...")
-        for patient in existing_patients:
-            await session.delete(patient)
-        await session.commit()
+        await clear_database(session)
 
     logger.info("Seeding database with sample data...")
 
@@ -39,23 +49,23 @@ async def seed_database(session: AsyncSession, force: bool = False) -> None:
     patients_data = [
         {
             "name": "John Doe",
-            "date_of_birth": "1985-03-15",
+            "date_of_birth": date(1985, 3, 15),
         },
         {
             "name": "Jane Smith",
-            "date_of_birth": "1990-07-22",
+            "date_of_birth": date(1990, 7, 22),
         },
         {
             "name": "Robert Johnson",
-            "date_of_birth": "1978-11-30",
+            "date_of_birth": date(1978, 11, 30),
         },
         {
             "name": "Maria Garcia",
-            "date_of_birth": "1995-05-18",
+            "date_of_birth": date(1995, 5, 18),
         },
         {
             "name": "Michael Brown",
-            "date_of_birth": "1982-09-08",
+            "date_of_birth": date(1982, 9, 8),
         },
     ]
 
@@ -202,17 +212,8 @@ async def clear_database(session: AsyncSession) -> None:
     """
     logger.warning("Clearing all data from database...")
 
-    # Delete all notes first (due to foreign key)
-    result = await session.execute(select(PatientNote))
-    notes = list(result.scalars().all())
-    for note in notes:
-        await session.delete(note)
-
-    # Delete all patients
-    result = await session.execute(select(Patient))
-    patients_list: list[Patient] = list(result.scalars().all())
-    for patient in patients_list:
-        await session.delete(patient)
-
+    # Set-based deletes; notes first so the cascade has nothing left to do
+    await session.execute(delete(PatientNote))
+    await session.execute(delete(Patient))
     await session.commit()
     logger.info("Database cleared successfully!")
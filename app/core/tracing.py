@@ -0,0 +1,259 @@
+"""Lightweight request tracing: spans, W3C trace context and local exporters.
+
+A trace is started per request by `TracingMiddleware`; code below it opens
+child spans with `span()`. The current span lives in a context variable, so
+tasks created with `asyncio.create_task` or `gather` nest under the span that
+created them. Unsampled traces still carry a context, so child spans cost a
+single lookup.
+"""
+
+import atexit
+import logging
+import queue
+import random
+import re
+import secrets
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueListener
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from app.config import settings
+
+# version-trace_id-parent_id-flags, e.g. 00-4bf9...4736-00f0...02b7-01
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "sampled",
+        "attributes",
+        "status",
+        "start_ns",
+        "end_ns",
+        "_start",
+        "duration",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None = None,
+        sampled: bool = True,
+        attributes: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.attributes = attributes or {}
+        self.status = "ok"
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    @property
+    def traceparent(self) -> str:
+        """W3C `traceparent` header value naming this span as the parent."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set_error(self, error: BaseException) -> None:
+        self.status = "error"
+        self.attributes["error.type"] = type(error).__name__
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.end_ns = self.start_ns + int(self.duration * 1e9)
+        if self.sampled and exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class SpanExporter(ABC):
+    """Receives every finished, sampled span."""
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        """Hand off `span`; called on the request path, so it must not block."""
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemoryExporter(SpanExporter):
+    """Keeps finished spans in `spans`, for tests and debugging."""
+
+    def __init__(self) -> None:
+        self.spans: list[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+    def clear(self) -> None:
+        self.spans.clear()
+
+
+class StreamExporter(SpanExporter):
+    """Writes spans as JSON lines to a handler from a background thread."""
+
+    def __init__(self, handler: logging.Handler) -> None:
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+
+    def export(self, span: Span) -> None:
+        line = orjson.dumps(span.to_dict(), default=str).decode()
+        self._queue.put(logging.makeLogRecord({"msg": line}))
+
+    def shutdown(self) -> None:
+        self._listener.stop()
+
+
+exporter: SpanExporter | None = None
+
+
+def build_exporter(name: str | None) -> SpanExporter | None:
+    """Exporter for a `TRACE_EXPORTER` value; None turns tracing off."""
+    if not name:
+        return None
+    if name == "console":
+        return StreamExporter(logging.StreamHandler(sys.stderr))
+    if name == "file":
+        return StreamExporter(logging.FileHandler(settings.trace_file))
+    if name == "memory":
+        return InMemoryExporter()
+    raise ValueError(f"Unknown trace exporter: {name}")
+
+
+def configure_tracing(name: str | None) -> None:
+    """Export finished spans with the named exporter, replacing the current one."""
+    global exporter
+    stop_tracing()
+    exporter = build_exporter(name)
+
+
+def tracing_enabled() -> bool:
+    return exporter is not None
+
+
+@atexit.register
+def stop_tracing() -> None:
+    """Write out the queued spans and stop the exporter."""
+    global exporter
+    if exporter is not None:
+        exporter.shutdown()
+        exporter = None
+
+
+_current_span: ContextVar[Span | None] = ContextVar("_current_span", default=None)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def parse_traceparent(header: str | None) -> tuple[str, str, bool] | None:
+    """(trace_id, parent span id, sampled) of a valid `traceparent` header."""
+    match = _TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+@contextmanager
+def start_trace(
+    name: str, traceparent: str | None = None, **attributes: Any
+) -> Iterator[Span]:
+    """Root span of a unit of work such as a request.
+
+    A valid `traceparent` continues the caller's trace and follows its
+    sampling decision; otherwise a new trace is sampled at
+    `trace_sample_ratio`.
+    """
+    parent = parse_traceparent(traceparent)
+    if parent is not None:
+        trace_id, parent_id, sampled = parent
+        root = Span(name, trace_id, parent_id, sampled, attributes)
+    else:
+        sampled = random.random() < settings.trace_sample_ratio
+        root = Span(name, secrets.token_hex(16), None, sampled, attributes)
+    with _activate(root):
+        yield root
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Child span of the current one; None outside a sampled trace."""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        yield None
+        return
+    with _activate(Span(name, parent.trace_id, parent.span_id, True, attributes)) as s:
+        yield s
+
+
+def start_span(name: str, **attributes: Any) -> Span | None:
+    """A child span finished by the caller, for callback pairs such as
+    SQLAlchemy's before/after execute events. It never becomes current."""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, True, attributes)
+
+
+@contextmanager
+def _activate(current: Span) -> Iterator[Span]:
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.finish()
+
+
+class TracedORJSONResponse(ORJSONResponse):
+    """`ORJSONResponse` whose rendering to bytes is a span of the request."""
+
+    def render(self, content: Any) -> bytes:
+        with span("serialize") as current:
+            body = super().render(content)
+            if current is not None:
+                current.attributes["bytes"] = len(body)
+            return body
@@ -0,0 +1,122 @@
+"""Metrics of every worker of `python -m app.server`, served by any of them.
+
+Each worker writes its counters to `METRICS_DIR/<pid>.json` every
+`metrics_flush_interval` seconds, when it stops and right before it answers
+`/metrics`, which adds up the files. A scrape landing on any worker thus
+sees the totals of the whole server. Counters of workers that exited are
+kept, so totals never go back; their gauges are dropped.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any
+
+from app.config import settings
+from app.core.admission import admission_control
+from app.core.metrics import RequestMetrics, request_metrics
+
+logger = logging.getLogger(__name__)
+
+# Snapshots are numbered on the event loop and written from threads; an
+# older snapshot must never replace a newer one
+_sequence = itertools.count()
+_write_lock = threading.Lock()
+_last_written = -1
+
+
+def _snapshot() -> tuple[int, dict[str, Any]]:
+    return next(_sequence), {
+        "requests": request_metrics.dump(),
+        "admission": admission_control.stats(),
+    }
+
+
+def _write(sequence: int, snapshot: dict[str, Any]) -> None:
+    global _last_written
+    assert settings.metrics_dir is not None
+    with _write_lock:
+        if sequence < _last_written:
+            return
+        with tempfile.NamedTemporaryFile(
+            "w", dir=settings.metrics_dir, suffix=".tmp", delete=False
+        ) as file:
+            json.dump(snapshot, file)
+        # Readers see the previous file or this one, never a partial write
+        os.replace(file.name, Path(settings.metrics_dir) / f"{os.getpid()}.json")
+        _last_written = sequence
+
+
+def write_metrics() -> None:
+    """Write this worker's counters, if metrics are shared between workers."""
+    if settings.metrics_dir:
+        _write(*_snapshot())
+
+
+async def _flush_periodically() -> None:
+    while True:
+        await asyncio.sleep(settings.metrics_flush_interval)
+        await asyncio.to_thread(_write, *_snapshot())
+
+
+def start_metrics_flush() -> "asyncio.Task[None] | None":
+    """Write this worker's counters periodically, when shared at all."""
+    if not settings.metrics_dir:
+        return None
+    return asyncio.create_task(_flush_periodically(), name="flush_metrics")
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by someone else
+    return True
+
+
+def _add_admission(totals: dict[str, Any], stats: dict[str, Any], gauges: bool) -> None:
+    for group, group_stats in stats.items():
+        total = totals.setdefault(
+            group, {"active": 0, "queued": 0, "admitted": 0, "shed": {}}
+        )
+        if gauges:
+            total["active"] += group_stats["active"]
+            total["queued"] += group_stats["queued"]
+        total["admitted"] += group_stats["admitted"]
+        for reason, count in group_stats["shed"].items():
+            total["shed"][reason] = total["shed"].get(reason, 0) + count
+
+
+def _render_all(sequence: int, snapshot: dict[str, Any]) -> str:
+    assert settings.metrics_dir is not None
+    # This worker's counters are read back from its file like the others',
+    # so consecutive scrapes of different workers never see a total drop
+    _write(sequence, snapshot)
+    requests = RequestMetrics(
+        request_metrics.latency_buckets, request_metrics.size_buckets
+    )
+    admission: dict[str, Any] = {}
+    for path in Path(settings.metrics_dir).glob("*.json"):
+        try:
+            worker = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping worker metrics %s: %s", path.name, e)
+            continue
+        alive = _is_alive(int(path.stem))
+        requests.add(worker["requests"], gauges=alive)
+        _add_admission(admission, worker["admission"], gauges=alive)
+    return requests.render() + admission_control.render(admission)
+
+
+async def render_metrics() -> str:
+    """Prometheus text of every worker's metrics, else of this process's."""
+    if not settings.metrics_dir:
+        return request_metrics.render() + admission_control.render()
+    return await asyncio.to_thread(_render_all, *_snapshot())
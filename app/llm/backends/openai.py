@@ -1,10 +1,13 @@
 import logging
-
-from openai import OpenAI
+from typing import TYPE_CHECKING
 
 from app.config import settings
+from app.core.deadline import timeout
 from app.llm.backends.base import LLMProvider
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 logger = logging.getLogger(__name__)
 
 
@@ -14,12 +17,17 @@ class OpenAIProvider(LLMProvider):
     def __init__(self) -> None:
         if not settings.openai_api_key:
             raise ValueError("OPENAI_API_KEY not configured")
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        # The SDK is about 40% of the app's import time; load it on first use
+        from openai import AsyncOpenAI
+
+        self.client: "AsyncOpenAI" = AsyncOpenAI(api_key=settings.openai_api_key)
 
     async def generate_summary(self, prompt: str) -> str:
         """Generate summary using OpenAI API."""
+        from openai import APITimeoutError
+
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=settings.llm_model,
                 messages=[
                     {
@@ -28,8 +36,12 @@ class OpenAIProvider(LLMProvider):
                     },
                     {"role": "user", "content": prompt},
                 ],
+                timeout=timeout(settings.llm_timeout),
             )
             return response.choices[0].message.content or ""
+        except APITimeoutError as e:
+            logger.error("OpenAI API timeout: %s", e)
+            raise TimeoutError("LLM request timed out") from e
         except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
+            logger.error("OpenAI API error: %s", e)
             raise
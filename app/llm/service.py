@@ -1,7 +1,8 @@
 import logging
-from datetime import datetime
+from datetime import date
 
 from app.config import settings
+from app.core.tracing import span
 from app.llm.backends.base import LLMProvider
 from app.llm.backends.openai import OpenAIProvider
 from app.llm.exceptions import SummaryGenerationError
@@ -25,19 +26,17 @@ class LLMService:
             raise ValueError(f"Unknown LLM provider: {settings.llm_provider}")
         return backend()
 
-    def _calculate_age(self, date_of_birth: str) -> int:
-        """Calculate age from date of birth string (YYYY-MM-DD)."""
-        try:
-            birth_date = datetime.strptime(date_of_birth, "%Y-%m-%d")
-            today = datetime.now()
-            age = today.year - birth_date.year
-            return age
-        except Exception:
-            logger.warning(f"Invalid date_of_birth value: {date_of_birth}")
-            return 0
+    def _calculate_age(self, date_of_birth: date) -> int:
+        """Calculate age in whole years from the date of birth."""
+        today = date.today()
+        had_birthday = (today.month, today.day) >= (
+            date_of_birth.month,
+            date_of_birth.day,
+        )
+        return today.year - date_of_birth.year - (not had_birthday)
 
     def _build_prompt(
-        self, patient_name: str, date_of_birth: str, notes: list[dict]
+        self, patient_name: str, date_of_birth: date, notes: list[dict]
     ) -> str:
         """Build the prompt for LLM."""
         age = self._calculate_age(date_of_birth)
@@ -59,18 +58,28 @@ class LLMService:
         return prompt
 
     async def generate_patient_summary(
-        self, patient_name: str, date_of_birth: str, notes: list[dict]
+        self, patient_name: str, date_of_birth: date, notes: list[dict]
     ) -> str:
         """Generate a patient summary from notes."""
         if not notes:
             return "No medical notes available for this patient."
 
-        prompt = self._build_prompt(patient_name, date_of_birth, notes)
-        logger.debug(f"Generating summary for patient: {patient_name}")
+        with span("llm.prompt", notes=len(notes)):
+            prompt = self._build_prompt(patient_name, date_of_birth, notes)
+        logger.debug("Generating summary for patient: %s", patient_name)
 
         try:
-            summary = await self.provider.generate_summary(prompt)
+            with span(
+                "llm.generate",
+                **{
+                    "llm.provider": settings.llm_provider,
+                    "llm.model": settings.llm_model,
+                },
+            ):
+                summary = await self.provider.generate_summary(prompt)
             logger.debug("Summary generated successfully")
             return summary
+        except TimeoutError:
+            raise
         except Exception as e:
             raise SummaryGenerationError("Failed to generate patient summary") from e
@@ -1,34 +1,77 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
+from typing import Any
 
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi_pagination import add_pagination
 
 from app.config import settings
+from app.core.admission import admission_control
 from app.core.db import postgres_db
 from app.core.logging import setup_logging
-from app.core.seed import seed_database
-from app.middlewares import LoggingMiddleware
-from app.routes import notes, patients, summary
+from app.core.seed import seed_on_startup
+from app.core.tracing import TracedORJSONResponse, configure_tracing
+from app.core.worker_metrics import render_metrics, start_metrics_flush, write_metrics
+from app.middlewares import (
+    AdmissionMiddleware,
+    DeadlineMiddleware,
+    LoggingMiddleware,
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    TracingMiddleware,
+)
+from app.routes import notes, patients, search, summary
+from app.services.patients import patient_cache
+from app.services.purge import start_purge
+from app.services.warmup import prime_statements
 
 setup_logging()
+configure_tracing(settings.trace_exporter)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    await postgres_db.init(settings.database_url)
+    await postgres_db.init(
+        settings.database_url,
+        settings.database_replica_urls,
+        settings.database_shard_urls,
+    )
 
-    # Seed database if enabled
-    if settings.seed_database_on_startup and postgres_db.AsyncSessionLocal is not None:
-        async with postgres_db.AsyncSessionLocal() as session:
-            await seed_database(session, force=settings.force_reseed)
+    # python -m app.server seeds once before its workers start and turns
+    # this off for them
+    await seed_on_startup(postgres_db)
+
+    # Connect and prepare the hot statements before accepting requests
+    await postgres_db.warmup(settings.db_pool_min_size, prime_statements)
+
+    # Resume purges interrupted by a restart
+    purge_task = start_purge()
+    metrics_task = start_metrics_flush()
 
     yield
+    purge_task.cancel()
+    if metrics_task is not None:
+        metrics_task.cancel()
+        write_metrics()
     await postgres_db.close()
 
 
-app = FastAPI(lifespan=lifespan, title=settings.app_name, debug=settings.debug)
+# orjson renders the response models' JSON-ready data several times faster
+app = FastAPI(
+    lifespan=lifespan,
+    title=settings.app_name,
+    debug=settings.debug,
+    default_response_class=TracedORJSONResponse,
+)
+app.add_middleware(DeadlineMiddleware)
+# Queued time does not count against the deadline; shed requests are logged
+app.add_middleware(AdmissionMiddleware)
+# Over-budget clients are rejected before they take an admission slot
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(LoggingMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 add_pagination(app)
 
 
@@ -38,6 +81,31 @@ def health_check() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/health/db")
+def database_pool_stats() -> dict[str, Any]:
+    """Connection pool usage and checkout wait times for this process."""
+    return postgres_db.pool_stats()
+
+
+@app.get("/health/cache")
+def cache_stats() -> dict[str, Any]:
+    """Patient cache size and hit-ratio counters for this process."""
+    return patient_cache.stats()
+
+
+@app.get("/health/admission")
+def admission_stats() -> dict[str, Any]:
+    """Running, queued and shed requests per route group for this process."""
+    return admission_control.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Request rate, errors and durations per route, for Prometheus."""
+    return await render_metrics()
+
+
 app.include_router(patients.router)
 app.include_router(notes.router)
 app.include_router(summary.router)
+app.include_router(search.router)
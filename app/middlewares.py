@@ -1,41 +1,543 @@
+import asyncio
 import logging
+import random
 import time
-from typing import Any, Callable
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.admission import (
+    CLIENT_DISCONNECTED,
+    AdmissionControl,
+    GroupLimiter,
+    admission_control,
+)
+from app.core.deadline import deadline, is_timeout
+from app.core.metrics import RequestMetrics, request_metrics
+from app.core.querystats import QueryStats, normalize_sql, track_queries
+from app.core.ratelimit import RateLimiter, rate_limiter
+from app.core.routing import route_group
+from app.core.tracing import start_trace, tracing_enabled
+
+TIMEOUT_HEADER = "x-request-timeout"
+TRACEPARENT_HEADER = "traceparent"
+# Route label of requests no route matched, e.g. 404s
+UNMATCHED_ROUTE = "unmatched"
+# Method label of anything else, so clients cannot add label values at will
+OTHER_METHOD = "OTHER"
+HTTP_METHODS = frozenset(
+    {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS", "TRACE", "CONNECT"}
+)
 
 logger = logging.getLogger(__name__)
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response | Any:
-        start_time = time.time()
+class LoggingMiddleware:
+    """Log each request and its outcome, and add timing headers.
+
+    Written against raw ASGI rather than `BaseHTTPMiddleware`, so responses
+    are passed through as they are sent: no extra task or body stream per
+    request, and streaming responses are not buffered. Timing headers are
+    added when the response starts; the access log line is written once it
+    ends, for errors, slow requests and a sample of the others.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        client = scope.get("client")
+        host = client[0] if client else "unknown"
+        method, path = scope["method"], scope["path"]
+        status_code = 500
+
+        logger.debug("Request: (%s) %s %s", host, method, path)
+
+        with track_queries() as queries:
+
+            async def send_wrapper(message: Message) -> None:
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    process_time = time.perf_counter() - start_time
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Process-Time"] = str(process_time)
+                    headers["X-DB-Query-Count"] = str(queries.count)
+                    headers["X-DB-Time"] = str(queries.seconds)
+                    headers.append(
+                        "Server-Timing", server_timing(process_time, queries)
+                    )
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except Exception as e:
+                process_time = time.perf_counter() - start_time
+                logger.error(
+                    "Error: (%s) %s %s Exception: %s Duration: %.4fs",
+                    host,
+                    method,
+                    path,
+                    e,
+                    process_time,
+                )
+                raise
+
+        process_time = time.perf_counter() - start_time
+
+        if (
+            status_code >= 400
+            or process_time >= settings.slow_request_seconds
+            or random.random() < settings.access_log_sample_rate
+        ):
+            logger.log(
+                logging.WARNING if status_code >= 500 else logging.INFO,
+                "Response: (%s) %s %s Status: %d Duration: %.4fs Queries: %d (%.4fs)",
+                host,
+                method,
+                path,
+                status_code,
+                process_time,
+                queries.count,
+                queries.seconds,
+                extra={
+                    "client": host,
+                    "method": method,
+                    "path": path,
+                    "status": status_code,
+                    "duration": process_time,
+                    "queries": queries.count,
+                    "db_seconds": queries.seconds,
+                },
+            )
+        if settings.debug:
+            for statement, times in queries.repeated(settings.n_plus_one_threshold):
+                logger.warning(
+                    "Possible N+1: %s %s ran %d times: %s",
+                    method,
+                    path,
+                    times,
+                    normalize_sql(statement),
+                )
+
+
+def server_timing(process_time: float, queries: QueryStats) -> str:
+    """`Server-Timing` value splitting the time so far into database and app."""
+    db_ms = queries.seconds * 1000
+    total_ms = process_time * 1000
+    return (
+        f'db;dur={db_ms:.2f};desc="{queries.count} queries", '
+        f"app;dur={max(total_ms - db_ms, 0):.2f}, "
+        f"total;dur={total_ms:.2f}"
+    )
+
+
+class MetricsMiddleware:
+    """Record rate, errors and duration of every request in `request_metrics`.
+
+    Requests are keyed by the template of the route that handled them,
+    which the router leaves in the scope; unmatched paths share one key.
+    The duration ends with the last body message, before background tasks.
+    """
+
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics) -> None:
+        self.app = app
+        self.metrics = metrics
 
-        host = request.client.host if request.client else "unknown"
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # Log request
-        logger.info(f"Request: ({host}) {request.method} {request.url.path}")
+        start_time = time.perf_counter()
+        group = route_group(scope["method"], scope["path"])
+        in_flight = self.metrics.in_flight
+        in_flight[group] += 1
+        status_code = 500
+        size = 0
+        end_time: float | None = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, size, end_time
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if not message.get("more_body", False):
+                    end_time = time.perf_counter()
+            await send(message)
 
         try:
-            response = await call_next(request)
-            process_time = time.time() - start_time
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight[group] -= 1
+            route = scope.get("route")
+            method = scope["method"]
+            self.metrics.observe(
+                method if method in HTTP_METHODS else OTHER_METHOD,
+                getattr(route, "path_format", UNMATCHED_ROUTE),
+                status_code,
+                (end_time or time.perf_counter()) - start_time,
+                size,
+            )
+
+
+class TracingMiddleware:
+    """Run each request in a trace, continuing the caller's `traceparent`.
+
+    The root span is named after the route template once the router has
+    matched one, so spans of the same endpoint group together. Spans opened
+    below it, in the handler task included, become its children.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracing_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        traceparent = Headers(scope=scope).get(TRACEPARENT_HEADER)
+        with start_trace(
+            f"{method} {scope['path']}",
+            traceparent,
+            **{"http.method": method, "http.path": scope["path"]},
+        ) as root:
+
+            async def send_wrapper(message: Message) -> None:
+                if message["type"] == "http.response.start":
+                    root.attributes["http.status_code"] = message["status"]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path_format", UNMATCHED_ROUTE)
+                root.name = f"{method} {route}"
+                root.attributes["http.route"] = route
 
-            # Log response
+
+class AdmissionMiddleware:
+    """Shed load per route group before it queues behind slower work.
+
+    Each group with a limit runs at most that many requests at once and
+    lets a bounded number wait, for `admission_queue_timeout` at most.
+    Anything beyond gets an immediate 503 with `Retry-After`, so an LLM or
+    upload backlog cannot starve cheap reads, and `/health` is never held.
+    A client that disconnects while queued leaves the queue.
+    """
+
+    def __init__(
+        self, app: ASGIApp, control: AdmissionControl = admission_control
+    ) -> None:
+        self.app = app
+        self.control = control
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = route_group(scope["method"], scope["path"])
+        limiter = self.control.limiter(group)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Messages read while queued, handed to the app before any others
+        pending: list[Message] = []
+        reason = None
+        if not limiter.try_acquire():
+            reason = await self.wait(limiter, receive, pending)
+        if reason == CLIENT_DISCONNECTED:
             logger.info(
-                f"Response: ({host}) {request.method} {request.url.path} "
-                f"Status: {response.status_code} "
-                f"Duration: {process_time:.4f}s"
+                "Client disconnected while queued: %s %s",
+                scope["method"],
+                scope["path"],
             )
+            return
+        if reason is not None:
+            logger.warning(
+                "Shed %s %s: %s group %s",
+                scope["method"],
+                scope["path"],
+                group,
+                reason,
+            )
+            response = JSONResponse(
+                {"detail": "Server is overloaded, retry later"},
+                status_code=503,
+                headers={"Retry-After": str(settings.admission_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def replay() -> Message:
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        try:
+            await self.app(scope, replay if pending else receive, send)
+        finally:
+            limiter.release()
+
+    @staticmethod
+    async def wait(
+        limiter: GroupLimiter, receive: Receive, pending: list[Message]
+    ) -> str | None:
+        """Queue for a slot while watching `receive` for a disconnect.
+
+        At most one body chunk is read ahead: a bodyless request is watched
+        until it is admitted, an upload only until its first chunk arrives.
+        """
+        if len(limiter.waiters) >= limiter.max_queue:
+            # Shed at once, nothing to watch
+            return await limiter.acquire(settings.admission_queue_timeout)
+        acquiring = asyncio.create_task(
+            limiter.acquire(settings.admission_queue_timeout)
+        )
 
-            response.headers["X-Process-Time"] = str(process_time)
-            return response
+        async def watch() -> None:
+            while True:
+                message = await receive()
+                pending.append(message)
+                if message["type"] == "http.disconnect" or message.get(
+                    "more_body", False
+                ):
+                    return
 
-        except Exception as e:
-            process_time = time.time() - start_time
-            logger.error(
-                f"Error: ({host}) {request.method} {request.url.path} "
-                f"Exception: {str(e)} "
-                f"Duration: {process_time:.4f}s"
+        async def give_up() -> None:
+            acquiring.cancel()
+            await asyncio.wait({acquiring})
+            # A slot handed over just before the cancellation is given back
+            if not acquiring.cancelled() and acquiring.result() is None:
+                limiter.release()
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await asyncio.wait(
+                {acquiring, watcher}, return_when=asyncio.FIRST_COMPLETED
             )
+            if acquiring.done() or pending[-1]["type"] != "http.disconnect":
+                return await acquiring
+        except asyncio.CancelledError:
+            await give_up()
             raise
+        finally:
+            watcher.cancel()
+        await give_up()
+        limiter.shed[CLIENT_DISCONNECTED] += 1
+        return CLIENT_DISCONNECTED
+
+
+def client_ip(scope: Scope) -> str:
+    """Rate limit key of the address a request came from."""
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+def rate_limit_key(scope: Scope) -> str:
+    """The client a request is counted against: its key header, else its IP."""
+    if settings.rate_limit_key_header:
+        value = Headers(scope=scope).get(settings.rate_limit_key_header)
+        if value:
+            return f"key:{value}"
+    return client_ip(scope)
+
+
+class RateLimitMiddleware:
+    """Token bucket rate limits per client and route group.
+
+    Requests over budget are answered 429 with `Retry-After` before any
+    route, dependency or database session runs. Requests with a key header
+    also spend from their IP's larger budget. Responses of limited
+    groups carry the `RateLimit-Policy`, `RateLimit-Limit`,
+    `RateLimit-Remaining` and `RateLimit-Reset` headers.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter = rate_limiter) -> None:
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = route_group(scope["method"], scope["path"])
+        decision = await self.limiter.check(
+            group, rate_limit_key(scope), client_ip(scope)
+        )
+        if decision is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            "RateLimit-Policy": f"{decision.limit};w={self.limiter.window:g}",
+            "RateLimit-Limit": str(decision.limit),
+            "RateLimit-Remaining": str(decision.remaining),
+            "RateLimit-Reset": str(decision.reset),
+        }
+        if not decision.allowed:
+            logger.warning(
+                "Rate limited %s %s: %s group", scope["method"], scope["path"], group
+            )
+            response = JSONResponse(
+                {"detail": "Rate limit exceeded"},
+                status_code=429,
+                headers={**headers, "Retry-After": str(decision.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def has_body(scope: Scope) -> bool:
+    """Whether a request announces a body, by length or chunked encoding."""
+    headers = Headers(scope=scope)
+    if "transfer-encoding" in headers:
+        return True
+    return headers.get("content-length", "0") not in ("", "0")
+
+
+def request_deadline(scope: Scope) -> float | None:
+    """Deadline of a request: its route group's, or less if the client asks."""
+    seconds = settings.request_deadlines.get(
+        route_group(scope["method"], scope["path"])
+    )
+    try:
+        requested = float(Headers(scope=scope)[TIMEOUT_HEADER])
+    except (KeyError, ValueError):
+        return seconds
+    if requested <= 0:
+        return seconds
+    return requested if seconds is None else min(requested, seconds)
+
+
+class DeadlineMiddleware:
+    """Answer 504 once a request's deadline passes and stop work nobody awaits.
+
+    The handler runs in its own task under `deadline()`, so queries and LLM
+    calls inherit the time left. This middleware is the only reader of
+    `receive`: body chunks are read one at a time as the handler asks for
+    them, and once the body is complete `receive` is watched for a
+    disconnect. When the client disconnects before the response is
+    complete, the handler task is cancelled, which also cancels its running
+    query.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        seconds = request_deadline(scope)
+        # Holds at most the one body chunk the handler asked for, or the
+        # messages read once the body is complete
+        messages: asyncio.Queue[Message] = asyncio.Queue()
+        wanted = asyncio.Event()
+        body_complete = asyncio.Event()
+        if not has_body(scope):
+            body_complete.set()
+        response_started = False
+        response_complete = asyncio.Event()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                response_complete.set()
+            await send(message)
+
+        disconnected = False
+
+        async def receive_wrapper() -> Message:
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            wanted.set()
+            return await messages.get()
+
+        async def run() -> None:
+            with deadline(seconds):
+                await self.app(scope, receive_wrapper, send_wrapper)
+
+        handler = asyncio.create_task(run())
+
+        async def listen() -> None:
+            nonlocal disconnected
+            while True:
+                if not body_complete.is_set():
+                    # No read-ahead: the body flows at the handler's pace
+                    await wanted.wait()
+                    wanted.clear()
+                message = await receive()
+                if message["type"] == "http.request" and not message.get(
+                    "more_body", False
+                ):
+                    body_complete.set()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    # Background tasks run after the response; let them be
+                    if not response_complete.is_set():
+                        disconnected = True
+                        handler.cancel()
+                    return
+
+        listener = asyncio.create_task(listen())
+        completed = asyncio.create_task(response_complete.wait())
+        try:
+            done, _ = await asyncio.wait(
+                {handler, completed},
+                timeout=seconds,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            timed_out = not done
+            if timed_out:
+                handler.cancel()
+            try:
+                await handler
+            except asyncio.CancelledError:
+                if not (timed_out or disconnected):
+                    raise
+            except Exception as e:
+                if not is_timeout(e) or response_started:
+                    raise
+                timed_out = True
+            if disconnected:
+                logger.info(
+                    "Client disconnected: %s %s", scope["method"], scope["path"]
+                )
+            elif timed_out and not response_started:
+                logger.warning(
+                    "Deadline of %ss exceeded: %s %s",
+                    seconds,
+                    scope["method"],
+                    scope["path"],
+                )
+                response = JSONResponse(
+                    {"detail": "Request deadline exceeded"}, status_code=504
+                )
+                await response(scope, receive, send)
+        finally:
+            for task in (handler, listener, completed):
+                task.cancel()
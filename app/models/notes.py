@@ -3,7 +3,8 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING
 
-from sqlalchemy import DateTime, ForeignKey, Text
+from sqlalchemy import Computed, DateTime, ForeignKey, Index, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
@@ -11,9 +12,18 @@ from app.core.db import Base
 if TYPE_CHECKING:
     from app.models.patients import Patient
 
+# Text search configuration used for the stored tsvector and for parsing queries
+NOTE_SEARCH_CONFIG = "english"
+
 
 class PatientNote(Base):
     __tablename__ = "patient_notes"
+    __table_args__ = (
+        Index(
+            "ix_patient_notes_content_search", "content_search", postgresql_using="gin"
+        ),
+        Index("ix_patient_notes_patient_id_timestamp", "patient_id", "timestamp"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     patient_id: Mapped[int] = mapped_column(
@@ -24,6 +34,14 @@ class PatientNote(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=datetime.now(timezone.utc)
     )
+    # Generated by Postgres from `content`; deferred so regular reads skip it
+    content_search: Mapped[str | None] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"to_tsvector('{NOTE_SEARCH_CONFIG}'::regconfig, content)", persisted=True
+        ),
+        deferred=True,
+    )
 
     # Relationship back to patient
     patient: Mapped[Patient] = relationship("Patient", back_populates="notes")
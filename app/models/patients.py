@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+from datetime import date, datetime
 from typing import TYPE_CHECKING, List
 
-from sqlalchemy import DateTime, String, func
+from sqlalchemy import Date, DateTime, Index, Integer, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.core.db import Base
@@ -15,15 +16,53 @@ class Patient(Base):
     __tablename__ = "patients"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
-    date_of_birth: Mapped[str] = mapped_column(String(10), nullable=False)
+    date_of_birth: Mapped[date] = mapped_column(Date, nullable=False, index=True)
+    # Identifier in the source system, used to upsert bulk imports
+    external_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
     created_at: Mapped[str] = mapped_column(
         DateTime, server_default=func.now(), nullable=False
     )
     updated_at: Mapped[str] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
     )
+    # Maintained by triggers on patient_notes, never written by the app
+    notes_count: Mapped[int] = mapped_column(
+        Integer, server_default="0", nullable=False, index=True
+    )
+    first_note_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_note_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    # Set on patients too large to delete inline, until the purge removes them
+    deleted_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     # Relationship to notes
+    # Notes are removed by the FK's ON DELETE CASCADE, never loaded to delete
     notes: Mapped[List[PatientNote]] = relationship(
-        "PatientNote", back_populates="patient", cascade="all, delete-orphan"
+        "PatientNote",
+        back_populates="patient",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
+
+
+# Serves "most recently active first" without sorting
+Index("ix_patients_last_note_at", Patient.last_note_at.desc().nulls_last())
+
+Index(
+    "ix_patients_deleted_at",
+    Patient.deleted_at,
+    postgresql_where=Patient.deleted_at.is_not(None),
+)
+
+# Unique among live patients: one waiting to be purged frees its external_id
+Index(
+    "ix_patients_external_id",
+    Patient.external_id,
+    unique=True,
+    postgresql_where=Patient.deleted_at.is_(None),
+)
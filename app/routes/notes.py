@@ -2,14 +2,26 @@ import logging
 from datetime import datetime
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
-from fastapi_pagination import Page
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.core.db import postgres_db
-from app.schemas.notes import NoteRead
+from app.core.etag import make_etag, not_modified
+from app.schemas.notes import NoteRead, NoteSearchPage
+from app.schemas.pagination import Page, TotalMode
 from app.services.notes import NoteService
+from app.services.sharded import ShardedNoteService
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/patients/{patient_id}/notes", tags=["notes"])
@@ -19,6 +31,8 @@ def get_note_service(
     db: AsyncSession = Depends(postgres_db.get_conn),
 ) -> NoteService:
     """Dependency to get note service."""
+    if postgres_db.shards:
+        return ShardedNoteService(db, postgres_db)
     return NoteService(db)
 
 
@@ -70,11 +84,42 @@ async def create_note_file(
 @router.get("/", response_model=Page[NoteRead])
 async def list_patient_notes(
     patient_id: int,
+    request: Request,
+    response: Response,
     sort_by: str | None = None,
+    total: TotalMode = Query(
+        TotalMode.exact, description="How to compute the total: exact, estimate, none"
+    ),
     service: NoteService = Depends(get_note_service),
 ) -> Page[NoteRead] | Any:
     """Get all notes for a specific patient."""
-    return await service.get_patient_notes(patient_id, sort_by)
+    # Notes are immutable, so their count and newest id identify every page;
+    # a cheap version query settles a 304 before paginating
+    notes_version = await service.get_notes_version(patient_id)
+    etag = make_etag("notes", patient_id, *notes_version, request.url.query)
+    cached = not_modified(request, response, etag)
+    if cached is not None:
+        return cached
+    return await service.get_patient_notes(patient_id, sort_by, total)
+
+
+@router.get("/search", response_model=NoteSearchPage)
+async def search_patient_notes(
+    patient_id: int,
+    q: str = Query(..., min_length=1, max_length=200, description="Search terms"),
+    start: datetime | None = Query(None, description="Only notes taken at or after"),
+    end: datetime | None = Query(None, description="Only notes taken before"),
+    cursor: str | None = Query(None, description="Cursor from a previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    service: NoteService = Depends(get_note_service),
+) -> dict[str, Any]:
+    """Full-text search over the notes of a specific patient."""
+    try:
+        return await service.search_notes(
+            q, patient_id=patient_id, start=start, end=end, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{note_id}", response_model=NoteRead)
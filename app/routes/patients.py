@@ -1,53 +1,302 @@
+from collections.abc import AsyncIterator
+from datetime import date
 from typing import Any, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from fastapi_pagination import Page
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.core.backends.postgres import read_only
 from app.core.db import postgres_db
+from app.core.etag import make_etag, not_modified
 from app.models.patients import Patient
-from app.schemas.patients import PatientCreate, PatientRead, PatientUpdate
-from app.services.patients import PatientService
+from app.schemas.pagination import Page, TotalMode
+from app.schemas.patients import (
+    MAX_PATIENT_ID,
+    PatientBatch,
+    PatientBatchRequest,
+    PatientBulkResult,
+    PatientCreate,
+    PatientRead,
+    PatientUpdate,
+    PatientWithNotes,
+)
+from app.services.patients import (
+    PatientDeletion,
+    PatientService,
+    is_duplicate_external_id,
+)
+from app.services.purge import purge_deleted_patients
+from app.services.sharded import ShardedPatientService
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
+bulk_patients_adapter = TypeAdapter(list[PatientCreate])
+
 
 async def get_patient_service(
+    request: Request,
     db: AsyncSession = Depends(postgres_db.get_conn),
 ) -> PatientService:
-    return PatientService(db)
+    # `Cache-Control: no-cache` skips the patient cache, for debugging
+    use_cache = "no-cache" not in request.headers.get("cache-control", "")
+    if postgres_db.shards:
+        return ShardedPatientService(db, postgres_db, use_cache=use_cache)
+    return PatientService(db, use_cache=use_cache)
+
+
+def _too_many_patients() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Too many patients. Maximum is {settings.max_bulk_patients}",
+    )
+
+
+async def _bulk_body_chunks(request: Request) -> AsyncIterator[bytes]:
+    """The request body, refused with 413 as soon as it outgrows the cap."""
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Body too large. Maximum is {settings.max_bulk_body_size} bytes",
+    )
+    try:
+        declared = int(request.headers.get("content-length", 0))
+    except ValueError:
+        declared = 0
+    if declared > settings.max_bulk_body_size:
+        raise too_large
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > settings.max_bulk_body_size:
+            raise too_large
+        yield chunk
+
+
+async def validate_bulk_patients(request: Request) -> list[PatientCreate]:
+    """Validate a JSON array or NDJSON stream of patients as it is read.
+
+    NDJSON lines are validated as they arrive and the upload stops at the
+    first patient past `max_bulk_patients`; a JSON array is validated once
+    read. Either way no more than `max_bulk_body_size` bytes are read.
+    """
+    errors: list[Any] = []
+    patients: list[PatientCreate] = []
+
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        line_number = 0
+        records = 0
+        pending = b""
 
+        def validate_line(line: bytes) -> None:
+            nonlocal line_number, records
+            index = line_number
+            line_number += 1
+            if not line.strip():
+                return
+            records += 1
+            if records > settings.max_bulk_patients:
+                raise _too_many_patients()
+            try:
+                patients.append(PatientCreate.model_validate_json(line))
+            except ValidationError as e:
+                errors.extend(
+                    {**error, "loc": ("body", index, *error["loc"])}
+                    for error in e.errors(include_url=False)
+                )
 
-@router.get("/", response_model=Page[PatientRead])
+        async for chunk in _bulk_body_chunks(request):
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                validate_line(line)
+        validate_line(pending)
+    else:
+        body = b"".join([chunk async for chunk in _bulk_body_chunks(request)])
+        try:
+            patients = bulk_patients_adapter.validate_json(body)
+        except ValidationError as e:
+            errors.extend(
+                {**error, "loc": ("body", *error["loc"])}
+                for error in e.errors(include_url=False)
+            )
+    if errors:
+        raise RequestValidationError(errors)
+
+    if len(patients) > settings.max_bulk_patients:
+        raise _too_many_patients()
+    external_ids = [p.external_id for p in patients if p.external_id is not None]
+    if len(external_ids) != len(set(external_ids)):
+        raise HTTPException(status_code=422, detail="Duplicate external_id in request")
+    return patients
+
+
+def get_notes_limit(
+    include: Optional[str] = Query(
+        None, description="Related data to embed", examples=["notes"]
+    ),
+    notes_limit: int = Query(
+        5, ge=1, le=50, description="Notes to embed per patient with include=notes"
+    ),
+) -> int | None:
+    """Dependency returning how many notes to embed, None when not requested."""
+    if include is None:
+        return None
+    unknown = set(include.split(",")) - {"notes"}
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Cannot include: {', '.join(sorted(unknown))}"
+        )
+    return notes_limit
+
+
+@router.get("/", response_model=Page[PatientWithNotes | PatientRead])
 async def read_patients(
     service: PatientService = Depends(get_patient_service),
     sort: Optional[str] = Query(
         None, description="Sort by field", examples=["name", "-name"]
     ),
     name: Optional[str] = Query(None, description="Filter by patient name"),
+    total: TotalMode = Query(
+        TotalMode.exact, description="How to compute the total: exact, estimate, none"
+    ),
+    notes_limit: int | None = Depends(get_notes_limit),
+    born_from: Optional[date] = Query(
+        None, description="Earliest date of birth (YYYY-MM-DD), inclusive"
+    ),
+    born_to: Optional[date] = Query(
+        None, description="Latest date of birth (YYYY-MM-DD), inclusive"
+    ),
+    min_age: Optional[int] = Query(None, ge=0, le=150, description="Minimum age"),
+    max_age: Optional[int] = Query(None, ge=0, le=150, description="Maximum age"),
 ) -> Page[Patient] | Any:
-    patients = await service.list_patients(sort_by=sort, name_filter=name)
+    if min_age is not None and max_age is not None and min_age > max_age:
+        raise HTTPException(
+            status_code=400, detail="min_age cannot be greater than max_age"
+        )
+    patients = await service.list_patients(
+        sort_by=sort,
+        name_filter=name,
+        total_mode=total,
+        notes_limit=notes_limit,
+        born_from=born_from,
+        born_to=born_to,
+        min_age=min_age,
+        max_age=max_age,
+    )
     return patients
 
 
-@router.get("/{patient_id}", response_model=PatientRead)
+def _check_batch_size(ids: list[int]) -> None:
+    if len(ids) > settings.max_batch_patients:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many ids. Maximum is {settings.max_batch_patients}",
+        )
+
+
+@router.get("/batch", response_model=PatientBatch)
+async def get_patients_batch(
+    ids: list[str] = Query(
+        ..., description="Patient ids, comma-separated or repeated", examples=["1,2,3"]
+    ),
+    service: PatientService = Depends(get_patient_service),
+) -> dict[str, Any]:
+    """Fetch many patients by id in one round trip."""
+    try:
+        patient_ids = [int(i) for value in ids for i in value.split(",") if i.strip()]
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be integers")
+    if not patient_ids:
+        raise HTTPException(status_code=422, detail="ids cannot be empty")
+    if not all(1 <= i <= MAX_PATIENT_ID for i in patient_ids):
+        raise HTTPException(
+            status_code=422, detail=f"ids must be between 1 and {MAX_PATIENT_ID}"
+        )
+    _check_batch_size(patient_ids)
+    return await service.get_patients(patient_ids)
+
+
+@router.post("/batch", response_model=PatientBatch)
+@read_only
+async def post_patients_batch(
+    request: PatientBatchRequest,
+    service: PatientService = Depends(get_patient_service),
+) -> dict[str, Any]:
+    """Fetch many patients by id; same as GET /batch, for long id lists."""
+    _check_batch_size(request.ids)
+    return await service.get_patients(request.ids)
+
+
+@router.get("/{patient_id}", response_model=PatientWithNotes | PatientRead)
 async def get_patient(
-    patient_id: int, service: PatientService = Depends(get_patient_service)
-) -> Patient:
-    patient = await service.get_patient(patient_id)
+    patient_id: int,
+    request: Request,
+    response: Response,
+    notes_limit: int | None = Depends(get_notes_limit),
+    service: PatientService = Depends(get_patient_service),
+) -> PatientRead | Response:
+    if notes_limit:
+        patient: PatientRead | None = await service.get_patient_with_notes(
+            patient_id, notes_limit
+        )
+    else:
+        patient = await service.get_patient(patient_id)
     if patient is None:
         raise HTTPException(status_code=404, detail="Patient not found")
-    return patient
+
+    etag_parts: list[Any] = ["patient", patient.id, patient.updated_at]
+    if isinstance(patient, PatientWithNotes):
+        # Notes are never edited in place, so their ids identify the content
+        etag_parts += [notes_limit, *(note.id for note in patient.notes)]
+    return not_modified(request, response, make_etag(*etag_parts)) or patient
 
 
 @router.post("/", status_code=201, response_model=PatientRead)
 async def create_patient(
     patient: PatientCreate, service: PatientService = Depends(get_patient_service)
 ) -> Patient:
-    db_patient = await service.create_patient(patient.model_dump())
+    try:
+        db_patient = await service.create_patient(
+            patient.model_dump(exclude_unset=True)
+        )
+    except IntegrityError as e:
+        if not is_duplicate_external_id(e):
+            raise
+        raise HTTPException(
+            status_code=409, detail="A patient with this external_id already exists"
+        )
     return db_patient
 
 
+@router.post("/bulk", status_code=201, response_model=PatientBulkResult)
+async def bulk_create_patients(
+    patients: list[PatientCreate] = Depends(validate_bulk_patients),
+    upsert: bool = Query(False, description="Update patients matched by external_id"),
+    service: PatientService = Depends(get_patient_service),
+) -> dict[str, Any]:
+    """Create many patients from a JSON array or an NDJSON body."""
+    try:
+        return await service.bulk_create_patients(
+            [patient.model_dump() for patient in patients], upsert=upsert
+        )
+    except IntegrityError as e:
+        if not is_duplicate_external_id(e):
+            raise
+        raise HTTPException(
+            status_code=409, detail="A patient with this external_id already exists"
+        )
+
+
 @router.put("/{patient_id}", response_model=PatientRead)
 async def update_patient(
     patient_id: int,
@@ -64,9 +313,13 @@ async def update_patient(
 
 @router.delete("/{patient_id}", status_code=204, response_model=None)
 async def delete_patient(
-    patient_id: int, service: PatientService = Depends(get_patient_service)
+    patient_id: int,
+    background_tasks: BackgroundTasks,
+    service: PatientService = Depends(get_patient_service),
 ) -> None:
-    success = await service.delete_patient(patient_id)
-    if not success:
+    deletion = await service.delete_patient(patient_id)
+    if not deletion:
         raise HTTPException(status_code=404, detail="Patient not found")
+    if deletion == PatientDeletion.soft:
+        background_tasks.add_task(purge_deleted_patients)
     return None
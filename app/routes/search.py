@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.routes.notes import get_note_service
+from app.schemas.notes import NoteSearchPage
+from app.services.notes import NoteService
+
+router = APIRouter(prefix="/notes", tags=["search"])
+
+
+@router.get("/search", response_model=NoteSearchPage)
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=200, description="Search terms"),
+    start: datetime | None = Query(None, description="Only notes taken at or after"),
+    end: datetime | None = Query(None, description="Only notes taken before"),
+    cursor: str | None = Query(None, description="Cursor from a previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    service: NoteService = Depends(get_note_service),
+) -> dict[str, Any]:
+    """Full-text search over the notes of all patients."""
+    try:
+        return await service.search_notes(
+            q, start=start, end=end, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
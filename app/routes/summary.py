@@ -1,9 +1,11 @@
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.db import postgres_db
+from app.core.deadline import is_timeout
+from app.core.etag import make_etag, not_modified
 from app.llm.service import LLMService
 from app.schemas.summary import PatientSummary
 from app.services.summary import PatientSummaryService
@@ -24,10 +26,19 @@ async def get_llm_service() -> LLMService:
 @router.get("/summary", response_model=PatientSummary)
 async def get_patient_summary(
     patient_id: int,
+    request: Request,
+    response: Response,
     summary_service: PatientSummaryService = Depends(get_summary_service),
     llm_service: LLMService = Depends(get_llm_service),
-) -> dict[str, Any]:
+) -> dict[str, Any] | Response:
     """Generate a comprehensive patient summary using AI."""
+    version = await summary_service.get_summary_version(patient_id)
+    if version is not None:
+        cached = not_modified(
+            request, response, make_etag("summary", patient_id, *version)
+        )
+        if cached:
+            return cached
     try:
         summary = await summary_service.generate_summary(
             patient_id=patient_id, llm_service=llm_service
@@ -36,6 +47,8 @@ async def get_patient_summary(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        if is_timeout(e):
+            raise  # answered with a 504 by DeadlineMiddleware
         raise HTTPException(
             status_code=500, detail=f"Failed to generate summary: {str(e)}"
         )
@@ -32,3 +32,19 @@ class NoteRead(NoteBase):
     id: int
     patient_id: int
     created_at: datetime
+
+
+class NoteSearchHit(NoteRead):
+    """Schema for a single full-text search match."""
+
+    rank: float = Field(description="Relevance score from ts_rank")
+    snippet: str = Field(description="Matching fragments with highlighted terms")
+
+
+class NoteSearchPage(BaseModel):
+    """Keyset-paginated page of full-text search matches."""
+
+    items: list[NoteSearchHit]
+    next_cursor: Optional[str] = Field(
+        default=None, description="Cursor for the next page, null on the last page"
+    )
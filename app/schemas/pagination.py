@@ -0,0 +1,59 @@
+from enum import Enum
+from math import ceil
+from typing import Any, Generic, Optional, Sequence, TypeVar
+
+from fastapi_pagination import Params
+from fastapi_pagination.bases import AbstractParams, BasePage
+from fastapi_pagination.types import GreaterEqualOne, GreaterEqualZero
+from pydantic import Field
+
+T = TypeVar("T")
+
+
+class TotalMode(str, Enum):
+    """How the `total` of a paginated response is computed."""
+
+    exact = "exact"  # COUNT(*) over the filtered query
+    estimate = "estimate"  # Planner estimate, no scan
+    none = "none"  # No total; `has_next` found by fetching one extra row
+
+
+class Page(BasePage[T], Generic[T]):
+    """Page with an optional total and an explicit has-next flag."""
+
+    total: Optional[GreaterEqualZero] = None  # type: ignore[assignment]
+    page: GreaterEqualOne
+    size: GreaterEqualOne
+    pages: Optional[GreaterEqualZero] = None
+    has_next: Optional[bool] = Field(
+        default=None, description="Whether a following page exists"
+    )
+
+    __params_type__ = Params
+
+    @classmethod
+    def create(
+        cls,
+        items: Sequence[T],
+        params: AbstractParams,
+        *,
+        total: int | None = None,
+        has_next: bool | None = None,
+        **kwargs: Any,
+    ) -> "Page[T]":
+        if not isinstance(params, Params):
+            raise TypeError("Page should be used with Params")
+
+        pages = ceil(total / params.size) if total is not None else None
+        if has_next is None and total is not None:
+            has_next = params.page * params.size < total
+
+        return cls(
+            items=items,
+            total=total,
+            page=params.page,
+            size=params.size,
+            pages=pages,
+            has_next=has_next,
+            **kwargs,
+        )
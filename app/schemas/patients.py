@@ -1,7 +1,18 @@
-from datetime import datetime
+import re
+from datetime import date, datetime
+from typing import Annotated, Any
 
 from pydantic import BaseModel, ConfigDict, Field, field_validator
 
+from app.schemas.notes import NoteRead
+
+# The API keeps exchanging dates of birth as YYYY-MM-DD strings
+DATE_OF_BIRTH_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# patients.id is an int4; larger ids cannot be bound to a query
+MAX_PATIENT_ID = 2**31 - 1
+PatientId = Annotated[int, Field(ge=1, le=MAX_PATIENT_ID)]
+
 
 class PatientRead(BaseModel):
     """Pydantic model for reading patient data."""
@@ -10,17 +21,33 @@ class PatientRead(BaseModel):
 
     id: int
     name: str
-    date_of_birth: str
+    date_of_birth: date
+    external_id: str | None = None
+    updated_at: datetime | None = None
+    notes_count: int = 0
+    first_note_at: datetime | None = None
+    last_note_at: datetime | None = None
+
+
+class PatientWithNotes(PatientRead):
+    """Patient with its most recent notes embedded."""
+
+    # Built explicitly by the service, never read off ORM objects
+    model_config = ConfigDict(from_attributes=False)
+
+    notes: list[NoteRead] = Field(description="Most recent notes, newest first")
 
 
 class PatientBase(BaseModel):
     """Base model with shared validators."""
 
-    @field_validator("date_of_birth", check_fields=False)
+    @field_validator("date_of_birth", mode="before", check_fields=False)
     @classmethod
-    def validate_date_of_birth(cls, value: str | None) -> str | None:
-        if value is None:
+    def validate_date_of_birth(cls, value: Any) -> Any:
+        if value is None or isinstance(value, date):
             return value
+        if not isinstance(value, str) or not DATE_OF_BIRTH_PATTERN.match(value):
+            raise ValueError("Date of birth must be in YYYY-MM-DD format")
         year, month, day = map(int, value.split("-"))
         current_year = datetime.now().year
         if not (1 <= month <= 12):
@@ -45,13 +72,39 @@ class PatientCreate(PatientBase):
     """Pydantic model for creating a new patient."""
 
     name: str = Field(min_length=1, max_length=100)
-    date_of_birth: str = Field(pattern=r"^\d{4}-\d{2}-\d{2}$")  # YYYY-MM-DD format
+    date_of_birth: date = Field(description="Date of birth (YYYY-MM-DD)")
+    external_id: str | None = Field(
+        default=None, min_length=1, max_length=64, description="Source system id"
+    )
 
 
 class PatientUpdate(PatientBase):
     """Pydantic model for updating patient data."""
 
     name: str | None = Field(default=None, min_length=1, max_length=100)
-    date_of_birth: str | None = Field(
-        default=None, pattern=r"^\d{4}-\d{2}-\d{2}$"
-    )  # YYYY-MM-DD format
+    date_of_birth: date | None = Field(
+        default=None, description="Date of birth (YYYY-MM-DD)"
+    )
+
+
+class PatientBatchRequest(BaseModel):
+    """Ids of the patients to fetch in one request."""
+
+    ids: list[PatientId] = Field(
+        min_length=1, description="Patient ids, in response order"
+    )
+
+
+class PatientBatch(BaseModel):
+    """Patients fetched by id, in request order."""
+
+    items: list[PatientRead] = Field(description="Found patients, in request order")
+    missing: list[int] = Field(description="Requested ids that do not exist")
+
+
+class PatientBulkResult(BaseModel):
+    """Result of a bulk create/upsert, ids are in input order."""
+
+    ids: list[int] = Field(description="Patient ids, in the order of the input")
+    created: int = Field(description="Number of patients inserted")
+    updated: int = Field(description="Number of existing patients updated")
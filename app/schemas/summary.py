@@ -1,3 +1,5 @@
+from datetime import date, datetime
+
 from pydantic import BaseModel, Field
 
 
@@ -6,8 +8,14 @@ class PatientHeading(BaseModel):
 
     patient_id: int = Field(description="Patient's unique identifier")
     name: str = Field(description="Patient's full name")
-    date_of_birth: str = Field(description="Patient's date of birth (YYYY-MM-DD)")
+    date_of_birth: date = Field(description="Patient's date of birth (YYYY-MM-DD)")
     total_notes: int = Field(description="Total number of notes for this patient")
+    first_note_at: datetime | None = Field(
+        default=None, description="Timestamp of the patient's first note"
+    )
+    last_note_at: datetime | None = Field(
+        default=None, description="Timestamp of the patient's latest note"
+    )
 
 
 class PatientSummary(BaseModel):
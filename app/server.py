@@ -0,0 +1,190 @@
+"""Production entry point: `python -m app.server`.
+
+Runs `WEB_CONCURRENCY` uvicorn workers (uvloop, httptools) on one shared
+socket. The supervisor replaces workers that die, and on SIGHUP restarts
+them one at a time: each new worker warms up before an old one is stopped,
+so a reload never drops requests. SIGTERM and SIGINT stop the workers
+gracefully, letting in-flight requests finish within `GRACEFUL_TIMEOUT`.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from multiprocessing.context import SpawnProcess
+from multiprocessing.synchronize import Event
+from socket import socket
+from types import FrameType
+from typing import Optional
+
+import uvicorn
+
+from app.config import settings
+from app.core.backends.postgres import PostgresBackend
+from app.core.seed import seed_on_startup
+
+logger = logging.getLogger("uvicorn.error")
+
+APP = "app.main:app"
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def worker_count() -> int:
+    """Configured worker count, else the CPUs this process may run on."""
+    if settings.web_concurrency:
+        return settings.web_concurrency
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+class Worker(uvicorn.Server):
+    """A uvicorn server that sets `ready` once its lifespan startup is done."""
+
+    def __init__(self, config: uvicorn.Config, ready: Event) -> None:
+        super().__init__(config)
+        self.ready = ready
+
+    async def startup(self, sockets: Optional[list[socket]] = None) -> None:
+        await super().startup(sockets=sockets)
+        if not self.should_exit:
+            self.ready.set()
+
+
+def run_worker(config: uvicorn.Config, ready: Event, sockets: list[socket]) -> None:
+    """Worker process entry point, serving on the supervisor's sockets."""
+    config.configure_logging()
+    try:
+        Worker(config, ready).run(sockets=sockets)
+    except KeyboardInterrupt:
+        pass  # the supervisor handles Ctrl-C
+
+
+class Supervisor:
+    """Keeps `workers` worker processes running on the config's socket."""
+
+    def __init__(self, config: uvicorn.Config, workers: int) -> None:
+        self.config = config
+        self.workers = workers
+        self.sockets = [config.bind_socket()]
+        # The ready events are kept: a collected one breaks its worker's start
+        self.processes: list[tuple[SpawnProcess, Event]] = []
+        self.should_exit = threading.Event()
+        self.should_reload = threading.Event()
+
+    def spawn(self) -> tuple[SpawnProcess, Event]:
+        ready = spawn.Event()
+        process = spawn.Process(
+            target=run_worker,
+            kwargs={"config": self.config, "ready": ready, "sockets": self.sockets},
+        )
+        process.start()
+        return process, ready
+
+    def handle_exit(self, sig: int, frame: FrameType | None) -> None:
+        self.should_exit.set()
+
+    def handle_reload(self, sig: int, frame: FrameType | None) -> None:
+        self.should_reload.set()
+
+    def run(self) -> None:
+        signal.signal(signal.SIGINT, self.handle_exit)
+        signal.signal(signal.SIGTERM, self.handle_exit)
+        signal.signal(signal.SIGHUP, self.handle_reload)
+        logger.info("Starting %d workers [%d]", self.workers, os.getpid())
+        self.processes = [self.spawn() for _ in range(self.workers)]
+
+        while not self.should_exit.wait(0.5):
+            if self.should_reload.is_set():
+                self.should_reload.clear()
+                self.reload()
+            for index, (process, _) in enumerate(self.processes):
+                if not process.is_alive() and not self.should_exit.is_set():
+                    logger.warning(
+                        "Worker %d exited with %s, restarting",
+                        process.pid,
+                        process.exitcode,
+                    )
+                    self.processes[index] = self.spawn()
+
+        self.stop([process for process, _ in self.processes])
+        logger.info("Stopped [%d]", os.getpid())
+
+    def reload(self) -> None:
+        """Replace the workers one by one, each once its successor is ready."""
+        logger.info("Reloading %d workers", len(self.processes))
+        for index, (old, _) in enumerate(self.processes):
+            new, ready = self.spawn()
+            if not ready.wait(settings.worker_boot_timeout):
+                # Keep serving with the old code rather than with fewer workers
+                logger.error("New worker %d did not start, reload aborted", new.pid)
+                self.stop([new])
+                return
+            self.processes[index] = (new, ready)
+            self.stop([old])
+            if self.should_exit.is_set():
+                return
+
+    def stop(self, processes: list[SpawnProcess]) -> None:
+        """SIGTERM, then SIGKILL what is still running after the grace period."""
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(settings.graceful_timeout + 5)
+            if process.is_alive():
+                logger.warning("Worker %d did not stop, killing it", process.pid)
+                process.kill()
+                process.join()
+
+
+async def seed_once() -> None:
+    """Seed the database before the workers start, rather than in each one."""
+    backend = PostgresBackend()
+    await backend.init(settings.database_url, shard_urls=settings.database_shard_urls)
+    try:
+        await seed_on_startup(backend)
+    finally:
+        await backend.close()
+
+
+def main() -> None:
+    if settings.seed_database_on_startup:
+        asyncio.run(seed_once())
+        # Workers inherit the environment: neither they nor their restarts
+        # seed again, which with FORCE_RESEED would wipe each other's data
+        os.environ["SEED_DATABASE_ON_STARTUP"] = "false"
+    workers = worker_count()
+    # Workers read it to size what they keep per process, e.g. the cache TTL
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    # Workers add up each other's metrics there, see app/core/worker_metrics.py
+    metrics_dir = None
+    if not settings.metrics_dir:
+        metrics_dir = tempfile.mkdtemp(prefix="metrics-")
+        os.environ["METRICS_DIR"] = metrics_dir
+    config = uvicorn.Config(
+        APP,
+        host=settings.host,
+        port=settings.port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        proxy_headers=True,
+        # LoggingMiddleware writes the access log
+        access_log=False,
+        timeout_graceful_shutdown=int(settings.graceful_timeout),
+    )
+    try:
+        Supervisor(config, workers).run()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,43 @@
+import base64
+import binascii
 import logging
 from datetime import datetime
 from typing import Any, Sequence
 
-from fastapi_pagination.ext.sqlalchemy import apaginate
-from sqlalchemy import delete, select
+from sqlalchemy import Float, cast, delete, exists, func, literal, select, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.models.notes import PatientNote
+from app.core.pagination import paginate
+from app.models.notes import NOTE_SEARCH_CONFIG, PatientNote
 from app.models.patients import Patient
+from app.schemas.pagination import TotalMode
+from app.services.patients import (
+    NOTE_READ_COLUMNS,
+    PatientService,
+    note_reads,
+    patient_cache,
+)
 
 logger = logging.getLogger(__name__)
 
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=25, MinWords=10"
+
+
+def encode_search_cursor(rank: float, note_id: int) -> str:
+    """Encode the last (rank, id) pair of a page as an opaque cursor."""
+    return base64.urlsafe_b64encode(f"{rank!r}:{note_id}".encode()).decode()
+
+
+def decode_search_cursor(cursor: str) -> tuple[float, int]:
+    """Decode a cursor produced by `encode_search_cursor`."""
+    try:
+        rank, note_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(rank), int(note_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid search cursor")
+
 
 class NoteService:
     def __init__(self, db_session: AsyncSession) -> None:
@@ -20,27 +47,35 @@ class NoteService:
         self, patient_id: int, content: str, timestamp: datetime
     ) -> PatientNote:
         """Create a new note for a patient."""
-        logger.info(f"Creating note for patient {patient_id}")
+        logger.info("Creating note for patient %s", patient_id)
 
-        # Verify patient exists
-        result = await self._db.execute(
-            select(Patient).filter(Patient.id == patient_id)
-        )
-        patient = result.scalar_one_or_none()
-        if not patient:
+        # Verify patient exists; the cache of this process may not have seen a
+        # delete made through another worker
+        patients = PatientService(self._db, use_cache=False)
+        if await patients.get_patient(patient_id) is None:
             raise ValueError(f"Patient with id {patient_id} not found")
 
         note = PatientNote(patient_id=patient_id, content=content, timestamp=timestamp)
         self._db.add(note)
-        await self._db.commit()
+        try:
+            await self._db.commit()
+        except IntegrityError:
+            # The patient was purged since the check above
+            await self._db.rollback()
+            raise ValueError(f"Patient with id {patient_id} not found")
+        # Triggers updated the patient's note statistics
+        await patient_cache.invalidate(patient_id)
         await self._db.refresh(note)
         return note
 
     async def get_patient_notes(
-        self, patient_id: int, sort_by: str | None = None
+        self,
+        patient_id: int,
+        sort_by: str | None = None,
+        total_mode: TotalMode = TotalMode.exact,
     ) -> Any:
         """Get all notes for a specific patient with pagination."""
-        logger.debug(f"Fetching notes for patient {patient_id}")
+        logger.debug("Fetching notes for patient %s", patient_id)
 
         sort_field = PatientNote.timestamp.desc()  # Default: newest first
 
@@ -52,16 +87,108 @@ class NoteService:
                 sort_field = getattr(PatientNote, field_name)
                 sort_field = sort_field if is_ascending else sort_field.desc()
 
-        return await apaginate(
+        # A soft-deleted patient's notes are gone as far as clients can tell
+        deleted = exists().where(
+            Patient.id == patient_id, Patient.deleted_at.is_not(None)
+        )
+        return await paginate(
             self._db,
-            select(PatientNote)
-            .filter(PatientNote.patient_id == patient_id)
+            select(*NOTE_READ_COLUMNS)
+            .filter(PatientNote.patient_id == patient_id, ~deleted)
             .order_by(sort_field),
+            total_mode,
+            transformer=note_reads,
+        )
+
+    async def search_notes(
+        self,
+        query: str,
+        patient_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> dict[str, Any]:
+        """Full-text search over note contents, ranked and keyset-paginated.
+
+        Matching and ranking only touch the GIN-indexed `content_search`
+        column; highlighted snippets are built for the returned page only.
+        """
+        logger.debug("Searching notes (patient=%s) for %r", patient_id, query)
+        config = cast(literal(NOTE_SEARCH_CONFIG), REGCONFIG)
+        ts_query = func.websearch_to_tsquery(config, query)
+        rank = func.ts_rank(PatientNote.content_search, ts_query, type_=Float)
+
+        # Notes of soft-deleted patients stay hidden until they are purged
+        deleted_patients = select(Patient.id).where(Patient.deleted_at.is_not(None))
+        matches = select(PatientNote.id, rank.label("rank")).where(
+            PatientNote.content_search.op("@@")(ts_query),
+            PatientNote.patient_id.not_in(deleted_patients),
+        )
+        if patient_id is not None:
+            matches = matches.where(PatientNote.patient_id == patient_id)
+        if start is not None:
+            matches = matches.where(PatientNote.timestamp >= start)
+        if end is not None:
+            matches = matches.where(PatientNote.timestamp < end)
+        if cursor:
+            last_rank, last_id = decode_search_cursor(cursor)
+            matches = matches.where(
+                tuple_(rank, PatientNote.id)
+                < tuple_(literal(last_rank, Float), literal(last_id))
+            )
+        page = (
+            matches.order_by(rank.desc(), PatientNote.id.desc())
+            .limit(limit + 1)
+            .subquery()
+        )
+
+        snippet = func.ts_headline(
+            config, PatientNote.content, ts_query, SEARCH_HEADLINE_OPTIONS
+        )
+        result = await self._db.execute(
+            select(PatientNote, page.c.rank, snippet.label("snippet"))
+            .join(page, PatientNote.id == page.c.id)
+            .order_by(page.c.rank.desc(), PatientNote.id.desc())
+        )
+        rows = result.all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last_note, last_rank = rows[-1][0], rows[-1][1]
+            next_cursor = encode_search_cursor(last_rank, last_note.id)
+
+        items = [
+            {
+                "id": note.id,
+                "patient_id": note.patient_id,
+                "content": note.content,
+                "timestamp": note.timestamp,
+                "created_at": note.created_at,
+                "rank": note_rank,
+                "snippet": note_snippet,
+            }
+            for note, note_rank, note_snippet in rows
+        ]
+        return {"items": items, "next_cursor": next_cursor}
+
+    async def get_notes_version(self, patient_id: int) -> tuple[int, int | None]:
+        """Return (count, max id) of a patient's notes, to tag cached copies."""
+        deleted = exists().where(
+            Patient.id == patient_id, Patient.deleted_at.is_not(None)
+        )
+        result = await self._db.execute(
+            select(func.count(), func.max(PatientNote.id)).where(
+                PatientNote.patient_id == patient_id, ~deleted
+            )
         )
+        count, max_id = result.one()
+        return count, max_id
 
     async def get_latests_patient_notes(self, patient_id: int) -> Sequence[PatientNote]:
         """Get all notes for a specific patient without pagination."""
-        logger.debug(f"Fetching all notes for patient {patient_id}")
+        logger.debug("Fetching all notes for patient %s", patient_id)
         result = await self._db.execute(
             select(PatientNote)
             .filter(PatientNote.patient_id == patient_id)
@@ -72,7 +199,7 @@ class NoteService:
 
     async def get_note(self, note_id: int) -> PatientNote | None:
         """Get a specific note by ID."""
-        logger.debug(f"Fetching note with ID {note_id}")
+        logger.debug("Fetching note with ID %s", note_id)
         result = await self._db.execute(
             select(PatientNote).filter(PatientNote.id == note_id)
         )
@@ -80,19 +207,21 @@ class NoteService:
 
     async def delete_note(self, note_id: int) -> bool:
         """Delete a note."""
-        logger.info(f"Deleting note with ID {note_id}")
+        logger.info("Deleting note with ID %s", note_id)
         note = await self.get_note(note_id)
         if not note:
             return False
         await self._db.delete(note)
         await self._db.commit()
+        await patient_cache.invalidate(note.patient_id)
         return True
 
     async def delete_patient_notes(self, patient_id: int) -> int:
         """Delete all notes for a patient."""
-        logger.info(f"Deleting all notes for patient {patient_id}")
+        logger.info("Deleting all notes for patient %s", patient_id)
         result = await self._db.execute(
             delete(PatientNote).where(PatientNote.patient_id == patient_id)
         )
         await self._db.commit()
+        await patient_cache.invalidate(patient_id)
         return result.rowcount
@@ -1,79 +1,468 @@
 import logging
-from typing import Any
+from collections import defaultdict
+from datetime import date
+from enum import Enum
+from typing import Any, Iterable, Sequence
 
-from fastapi_pagination.ext.sqlalchemy import apaginate
-from sqlalchemy import func, select
+from sqlalchemy import (
+    Date,
+    Integer,
+    Select,
+    String,
+    any_,
+    bindparam,
+    column,
+    delete,
+    exists,
+    func,
+    literal_column,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import ColumnClause
 
+from app.config import settings
+from app.core.backends.postgres import is_replica, is_sticky
+from app.core.cache import AsyncLRUCache
+from app.core.pagination import paginate
+from app.models.notes import PatientNote
 from app.models.patients import Patient
+from app.schemas.notes import NoteRead
+from app.schemas.pagination import TotalMode
+from app.schemas.patients import PatientRead, PatientWithNotes
 
 logger = logging.getLogger(__name__)
 
+BULK_INSERT_CHUNK_SIZE = 5000
+
+# SQLSTATE of unique_violation, and the index keeping external_id unique
+UNIQUE_VIOLATION = "23505"
+EXTERNAL_ID_INDEX = "ix_patients_external_id"
+
+
+def is_duplicate_external_id(error: IntegrityError) -> bool:
+    """Whether `error` is the external_id unique index refusing a patient."""
+    # asyncpg's own exception, with the constraint name, is the DBAPI
+    # error's cause
+    orig = error.orig
+    if getattr(orig, "sqlstate", None) != UNIQUE_VIOLATION:
+        return False
+    return any(
+        getattr(source, "constraint_name", None) == EXTERNAL_ID_INDEX
+        for source in (orig, getattr(orig, "__cause__", None))
+    )
+
+
+def patient_cache_ttl() -> float:
+    """Cache TTL, capped when other workers may change patients unseen."""
+    if (settings.web_concurrency or 1) > 1:
+        return min(settings.patient_cache_ttl, settings.patient_cache_worker_ttl)
+    return settings.patient_cache_ttl
+
+
+patient_cache: AsyncLRUCache[int, PatientRead] = AsyncLRUCache(
+    maxsize=settings.patient_cache_size, ttl=patient_cache_ttl()
+)
+
+# Read paths select these columns and skip ORM entities and the identity map
+PATIENT_READ_COLUMNS = [getattr(Patient, name) for name in PatientRead.model_fields]
+NOTE_READ_COLUMNS = [getattr(PatientNote, name) for name in NoteRead.model_fields]
+
+
+# Validating the row mappings runs in pydantic-core and is cheaper than the
+# pure-Python model_construct for our schemas.
+def patient_reads(rows: Iterable[Any]) -> list[PatientRead]:
+    """Read models from rows of PATIENT_READ_COLUMNS."""
+    return [PatientRead.model_validate(row._mapping) for row in rows]
+
+
+def note_reads(rows: Iterable[Any]) -> list[NoteRead]:
+    """Read models from rows of NOTE_READ_COLUMNS."""
+    return [NoteRead.model_validate(row._mapping) for row in rows]
+
+
+class PatientDeletion(str, Enum):
+    """How a patient was deleted."""
+
+    hard = "hard"  # Removed with its notes in one statement
+    soft = "soft"  # Hidden now, notes purged in the background
+
+
+def _years_ago(years: int, today: date | None = None) -> date:
+    """Return the date `years` years before `today`, Feb 29 becoming Feb 28."""
+    today = today or date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        return today.replace(year=today.year - years, day=28)
+
 
 class PatientService:
 
-    def __init__(self, db_session: AsyncSession) -> None:
+    def __init__(self, db_session: AsyncSession, use_cache: bool = True) -> None:
         self._db = db_session
+        # Replica reads can refill the cache with rows older than a write
+        # this process just made, so reads that must see their own writes
+        # skip it, and replica rows expire once the replica has caught up
+        self._use_cache = use_cache and not is_sticky(db_session)
+        self._fill_ttl = (
+            settings.replica_sticky_seconds if is_replica(db_session) else None
+        )
 
     async def list_patients(
-        self, sort_by: str | None = None, name_filter: str | None = None
+        self,
+        sort_by: str | None = None,
+        name_filter: str | None = None,
+        total_mode: TotalMode = TotalMode.exact,
+        notes_limit: int | None = None,
+        born_from: date | None = None,
+        born_to: date | None = None,
+        min_age: int | None = None,
+        max_age: int | None = None,
     ) -> Any:
         logger.debug("Listing patients from database")
-        sort_field: Any = Patient.id
+        query = self._filtered_query(
+            name_filter, born_from, born_to, min_age, max_age
+        ).order_by(*self._order_by(*self._parse_sort(sort_by)))
+        page = await paginate(self._db, query, total_mode, transformer=patient_reads)
+        if notes_limit:
+            page.items = await self.with_latest_notes(page.items, notes_limit)
+        return page
+
+    @staticmethod
+    def _parse_sort(sort_by: str | None) -> tuple[str, bool]:
+        """Return the patient column to sort by and whether it is ascending."""
+        is_ascending = not (sort_by or "").startswith("-")
+        field_name = (sort_by or "").lstrip("-")
+        if field_name not in Patient.__table__.columns:
+            return "id", True
+        return field_name, is_ascending
 
-        # Check if sorting is ascending or descending
-        is_ascending = True if sort_by and not sort_by.startswith("-") else False
-        if not is_ascending and sort_by:
-            sort_by = sort_by[1:]
+    @staticmethod
+    def _order_by(
+        field_name: str, is_ascending: bool, collation: str | None = None
+    ) -> list[Any]:
+        """ORDER BY clauses for a sort, with the id as tie-breaker."""
+        column = Patient.__table__.columns[field_name]
+        sort_field: Any = getattr(Patient, field_name)
+        if collation is not None and isinstance(column.type, String):
+            sort_field = sort_field.collate(collation)
+        if is_ascending:
+            return [sort_field, Patient.id]
+        sort_field = sort_field.desc()
+        if column.nullable:
+            # e.g. patients without notes last on -last_note_at
+            sort_field = sort_field.nulls_last()
+        return [sort_field, Patient.id.desc()]
 
-        if getattr(Patient, sort_by or "", None) is not None:
-            sort_field = getattr(Patient, sort_by)  # type: ignore
-            sort_field = sort_field if is_ascending else sort_field.desc()
+    @staticmethod
+    def _filtered_query(
+        name_filter: str | None = None,
+        born_from: date | None = None,
+        born_to: date | None = None,
+        min_age: int | None = None,
+        max_age: int | None = None,
+    ) -> Select:
+        query = select(*PATIENT_READ_COLUMNS).where(Patient.deleted_at.is_(None))
         if name_filter:
-            logger.debug(
-                f"Applying name filter: {name_filter} and sorting by {sort_by}"
+            logger.debug("Applying name filter: %r", name_filter)
+            query = query.where(func.similarity(Patient.name, name_filter) > 0.1)
+
+        # Ages are turned into date_of_birth bounds so the filter stays a
+        # range scan on ix_patients_date_of_birth.
+        if min_age is not None:
+            query = query.where(Patient.date_of_birth <= _years_ago(min_age))
+        if max_age is not None:
+            query = query.where(Patient.date_of_birth > _years_ago(max_age + 1))
+        if born_from is not None:
+            query = query.where(Patient.date_of_birth >= born_from)
+        if born_to is not None:
+            query = query.where(Patient.date_of_birth <= born_to)
+        return query
+
+    async def get_patient(self, patient_id: int) -> PatientRead | None:
+        """Get a patient read model, served from the process cache when fresh."""
+        if self._use_cache:
+            cached = await patient_cache.get(patient_id)
+            if cached is not None:
+                return cached
+
+        generation = patient_cache.generation
+        result = await self._db.execute(
+            select(*PATIENT_READ_COLUMNS).where(
+                Patient.id == patient_id, Patient.deleted_at.is_(None)
             )
-            return await apaginate(
-                self._db,
-                select(Patient)
-                .where(func.similarity(Patient.name, name_filter) > 0.1)
-                .order_by(sort_field),
+        )
+        found = patient_reads(result)
+        if not found:
+            return None
+        await patient_cache.set(patient_id, found[0], generation, self._fill_ttl)
+        return found[0]
+
+    async def get_patients(self, patient_ids: Sequence[int]) -> dict[str, Any]:
+        """Get many patients, one cache pass and one query for the misses.
+
+        Duplicate ids are collapsed; `items` follows the request order and
+        `missing` lists the ids that do not exist.
+        """
+        ids = list(dict.fromkeys(patient_ids))
+        found: dict[int, PatientRead] = {}
+        if self._use_cache:
+            found = await patient_cache.get_many(ids)
+
+        misses = [patient_id for patient_id in ids if patient_id not in found]
+        if misses:
+            generation = patient_cache.generation
+            result = await self._db.execute(
+                select(*PATIENT_READ_COLUMNS).where(
+                    Patient.id == any_(bindparam("ids", misses, ARRAY(Integer))),
+                    Patient.deleted_at.is_(None),
+                )
             )
-        return await apaginate(self._db, select(Patient).order_by(sort_field))
+            loaded = {patient.id: patient for patient in patient_reads(result)}
+            await patient_cache.set_many(loaded, generation, self._fill_ttl)
+            found.update(loaded)
+
+        return {
+            "items": [found[i] for i in ids if i in found],
+            "missing": [i for i in ids if i not in found],
+        }
 
-    async def get_patient(self, patient_id: int) -> Patient | None:
-        logger.debug(f"Fetching patient with ID {patient_id}")
+    async def get_patient_with_notes(
+        self, patient_id: int, notes_limit: int
+    ) -> PatientWithNotes | None:
+        """Get a patient with its `notes_limit` most recent notes."""
+        patient = await self.get_patient(patient_id)
+        if patient is None:
+            return None
+        (patient_with_notes,) = await self.with_latest_notes([patient], notes_limit)
+        return patient_with_notes
+
+    async def with_latest_notes(
+        self, patients: Sequence[Patient | PatientRead], notes_limit: int
+    ) -> list[PatientWithNotes]:
+        """Embed the latest notes of every patient using a single query.
+
+        A LATERAL subquery fetches the top `notes_limit` notes per patient
+        off the (patient_id, timestamp) index, whatever the page size.
+        """
+        notes_by_patient: dict[int, list[NoteRead]] = defaultdict(list)
+        if patients:
+            parents = (
+                select(Patient.id)
+                .where(Patient.id.in_([patient.id for patient in patients]))
+                .subquery("parents")
+            )
+            latest = (
+                select(*NOTE_READ_COLUMNS)
+                .where(PatientNote.patient_id == parents.c.id)
+                .order_by(PatientNote.timestamp.desc())
+                .limit(notes_limit)
+                .lateral("latest_notes")
+            )
+            result = await self._db.execute(
+                select(*latest.c)
+                .select_from(parents)
+                .join(latest, true())
+                # The LATERAL order does not carry over to the outer select
+                .order_by(latest.c.patient_id, latest.c.timestamp.desc())
+            )
+            for note in note_reads(result):
+                notes_by_patient[note.patient_id].append(note)
+
+        return [
+            PatientWithNotes.model_construct(
+                **dict(PatientRead.model_validate(patient)),
+                notes=notes_by_patient[patient.id],
+            )
+            for patient in patients
+        ]
+
+    async def _get_patient_model(self, patient_id: int) -> Patient | None:
+        logger.debug("Fetching patient with ID %s", patient_id)
+        # Refresh identity-mapped rows: note triggers update the stats columns
         result = await self._db.execute(
-            select(Patient).filter(Patient.id == patient_id)
+            select(Patient)
+            .filter(Patient.id == patient_id, Patient.deleted_at.is_(None))
+            .execution_options(populate_existing=True)
         )
         return result.scalar_one_or_none()
 
     async def create_patient(self, patient_data: dict) -> Patient:
-        logger.debug(f"Creating new patient with data {patient_data}")
+        # Field names only: the values are patient data
+        logger.debug("Creating new patient with fields %s", sorted(patient_data))
         patient = Patient(**patient_data)
         self._db.add(patient)
         await self._db.commit()
         await self._db.refresh(patient)
         return patient
 
+    async def bulk_create_patients(
+        self, patients_data: list[dict], upsert: bool = False
+    ) -> dict[str, Any]:
+        """Insert many patients with set-based INSERTs in one transaction.
+
+        With `upsert`, rows whose `external_id` already exists update that
+        patient instead. Returned ids follow the order of `patients_data`.
+        """
+        logger.info("Bulk creating %d patients (upsert=%s)", len(patients_data), upsert)
+        inserted_ids: list[int] = []
+        updated_ids: dict[str, int] = {}
+        for start in range(0, len(patients_data), BULK_INSERT_CHUNK_SIZE):
+            chunk = patients_data[start : start + BULK_INSERT_CHUNK_SIZE]
+            result = await self._db.execute(self._bulk_insert_statement(chunk, upsert))
+            for row in result.all():
+                if row.created:
+                    inserted_ids.append(row.id)
+                else:
+                    updated_ids[row.external_id] = row.id
+        await self._db.commit()
+        if updated_ids:
+            await patient_cache.invalidate(*updated_ids.values())
+
+        # Ids of inserted rows are drawn from the sequence in input order
+        inserted = iter(sorted(inserted_ids))
+        ids = [
+            updated_ids.get(data.get("external_id") or "") or next(inserted)
+            for data in patients_data
+        ]
+        return {"ids": ids, "created": len(inserted_ids), "updated": len(updated_ids)}
+
+    def _bulk_insert_statement(self, chunk: list[dict], upsert: bool) -> Any:
+        # One INSERT ... SELECT FROM unnest(...) per chunk: one array
+        # parameter per column whatever the chunk size, inserted in input
+        # order. Ids are only given when allocated elsewhere (sharding).
+        names = ["name", "date_of_birth", "external_id"]
+        arrays = [
+            bindparam("names", [data["name"] for data in chunk], ARRAY(String)),
+            bindparam("dates", [data["date_of_birth"] for data in chunk], ARRAY(Date)),
+            bindparam(
+                "external_ids",
+                [data.get("external_id") for data in chunk],
+                ARRAY(String),
+            ),
+        ]
+        columns: list[ColumnClause[Any]] = [
+            column("name", String),
+            column("date_of_birth", Date),
+            column("external_id", String),
+        ]
+        if "id" in chunk[0]:
+            names.append("id")
+            arrays.append(
+                bindparam("ids", [data["id"] for data in chunk], ARRAY(Integer))
+            )
+            columns.append(column("id", Integer))
+        source = (
+            func.unnest(*arrays)
+            .table_valued(*columns, with_ordinality="ordinality")
+            .render_derived(name="bulk_source")
+        )
+        stmt = insert(Patient).from_select(
+            names,
+            select(*(source.c[name] for name in names)).order_by(source.c.ordinality),
+        )
+        if upsert:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Patient.external_id],
+                # Matches ix_patients_external_id, which skips deleted patients
+                index_where=Patient.deleted_at.is_(None),
+                set_={
+                    "name": stmt.excluded.name,
+                    "date_of_birth": stmt.excluded.date_of_birth,
+                    "updated_at": func.now(),
+                },
+            )
+        # xmax is 0 only for freshly inserted rows
+        return stmt.returning(
+            Patient.id,
+            Patient.external_id,
+            literal_column("xmax = 0").label("created"),
+        )
+
     async def update_patient(
         self, patient_id: int, patient_data: dict
     ) -> Patient | None:
-        logger.info(f"Updating patient with ID {patient_id} with data {patient_data}")
-        patient = await self.get_patient(patient_id)
+        logger.info(
+            "Updating patient with ID %s, fields %s", patient_id, sorted(patient_data)
+        )
+        patient = await self._get_patient_model(patient_id)
         if not patient:
             return None
         for key, value in patient_data.items():
             setattr(patient, key, value)
         await self._db.commit()
+        await patient_cache.invalidate(patient_id)
         await self._db.refresh(patient)
         return patient
 
-    async def delete_patient(self, patient_id: int) -> bool:
-        logger.info(f"Deleting patient with ID {patient_id}")
-        patient = await self.get_patient(patient_id)
-        if not patient:
-            return False
-        await self._db.delete(patient)
+    async def delete_patient(self, patient_id: int) -> PatientDeletion | None:
+        """Delete a patient, returning None if it does not exist.
+
+        Notes go with it through the FK's ON DELETE CASCADE. Patients with
+        more than `patient_purge_threshold` notes are only marked deleted;
+        `purge_deleted_patients` then removes them in bounded batches.
+        """
+        logger.info("Deleting patient with ID %s", patient_id)
+        live = (Patient.id == patient_id) & Patient.deleted_at.is_(None)
+        result = await self._db.execute(
+            update(Patient)
+            .where(live, Patient.notes_count > settings.patient_purge_threshold)
+            .values(deleted_at=func.now())
+            .returning(Patient.id)
+        )
+        if result.scalar_one_or_none() is not None:
+            deletion = PatientDeletion.soft
+        else:
+            result = await self._db.execute(
+                delete(Patient).where(live).returning(Patient.id)
+            )
+            if result.scalar_one_or_none() is None:
+                return None
+            deletion = PatientDeletion.hard
         await self._db.commit()
-        return True
+        await patient_cache.invalidate(patient_id)
+        return deletion
+
+    async def purge_deleted_patients(self, batch_size: int | None = None) -> list[int]:
+        """Remove soft-deleted patients, committing every `batch_size` notes.
+
+        Short transactions keep row locks and WAL bursts bounded. Batches are
+        claimed with SKIP LOCKED so concurrent purges never wait on each other.
+        """
+        batch_size = batch_size or settings.patient_purge_batch_size
+        result = await self._db.execute(
+            select(Patient.id).where(Patient.deleted_at.is_not(None))
+        )
+        patient_ids = list(result.scalars())
+        for patient_id in patient_ids:
+            logger.info("Purging notes of deleted patient %s", patient_id)
+            while True:
+                # Materialized so the LIMIT is applied once, not on every rescan
+                batch = (
+                    select(PatientNote.id)
+                    .where(PatientNote.patient_id == patient_id)
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                    .cte("purge_batch")
+                    .prefix_with("MATERIALIZED")
+                )
+                result = await self._db.execute(
+                    delete(PatientNote).where(PatientNote.id.in_(select(batch.c.id)))
+                )
+                await self._db.commit()
+                # A short batch can still leave rows locked by another purge
+                if result.rowcount == 0:
+                    break
+            # Notes still there are being purged concurrently; that purge
+            # deletes the patient, never a cascade over all its notes here
+            remaining = exists().where(PatientNote.patient_id == patient_id)
+            await self._db.execute(
+                delete(Patient).where(Patient.id == patient_id, ~remaining)
+            )
+            await self._db.commit()
+        return patient_ids
@@ -0,0 +1,41 @@
+"""Background purge of soft-deleted patients."""
+
+import asyncio
+import logging
+
+from app.core.db import postgres_db
+from app.core.deadline import no_deadline
+from app.services.patients import PatientService
+from app.services.sharded import ShardedPatientService
+
+logger = logging.getLogger(__name__)
+
+
+async def purge_deleted_patients() -> None:
+    """Purge soft-deleted patients in a session of their own.
+
+    Runs after the response of the request that scheduled it, so it does not
+    inherit that request's deadline.
+    """
+    if postgres_db.AsyncSessionLocal is None:
+        return
+    with no_deadline():
+        async with postgres_db.AsyncSessionLocal() as session:
+            if postgres_db.shards:
+                await ShardedPatientService(
+                    session, postgres_db
+                ).purge_deleted_patients()
+            else:
+                await PatientService(session).purge_deleted_patients()
+
+
+def start_purge() -> "asyncio.Task[None]":
+    """Run `purge_deleted_patients` as a task that logs how it failed."""
+    task = asyncio.create_task(purge_deleted_patients(), name="purge_deleted_patients")
+    task.add_done_callback(_log_failure)
+    return task
+
+
+def _log_failure(task: "asyncio.Task[None]") -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Purge of deleted patients failed", exc_info=task.exception())
@@ -0,0 +1,333 @@
+"""Services spanning every shard when patients are spread by patient_id.
+
+Requests for one patient already get a session on that patient's shard
+(see `PostgresBackend.get_conn`), so the inherited per-patient methods run
+unchanged. The methods here scatter to the shards and gather the results.
+"""
+
+import asyncio
+import heapq
+import logging
+from collections import defaultdict
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Sequence, TypeVar
+
+from fastapi_pagination import Params, resolve_params
+from sqlalchemy import String, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.backends.postgres import PostgresBackend, shard_index
+from app.core.pagination import estimate_count
+from app.models.patients import Patient
+from app.schemas.pagination import Page, TotalMode
+from app.schemas.patients import PatientRead
+from app.services.notes import NoteService, encode_search_cursor
+from app.services.patients import (
+    EXTERNAL_ID_INDEX,
+    UNIQUE_VIOLATION,
+    PatientService,
+    patient_reads,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def gather_shards(
+    backend: PostgresBackend, calls: dict[int, Callable[[AsyncSession], Awaitable[T]]]
+) -> dict[int, T]:
+    """Run each call on a new session of its shard, all concurrently."""
+
+    async def run(index: int, call: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        async with backend.shard_session(index) as session:
+            return await call(session)
+
+    results = await asyncio.gather(*(run(i, call) for i, call in calls.items()))
+    return dict(zip(calls, results))
+
+
+def _merge_key(field_name: str, is_ascending: bool) -> Callable[[Any], tuple]:
+    """Python sort key matching `PatientService._order_by`, nulls last."""
+    if is_ascending:
+        return lambda p: (getattr(p, field_name) is None, getattr(p, field_name), p.id)
+    return lambda p: (getattr(p, field_name) is not None, getattr(p, field_name), p.id)
+
+
+class ShardedPatientService(PatientService):
+    """PatientService over patients hash-partitioned across shards.
+
+    Ids are drawn from `patients_id_seq` on the primary database, the
+    global allocator, and decide the shard of a new patient.
+    """
+
+    def __init__(
+        self, db_session: AsyncSession, backend: PostgresBackend, use_cache: bool = True
+    ) -> None:
+        super().__init__(db_session, use_cache=use_cache)
+        self._backend = backend
+
+    def _shard(self, patient_id: int) -> int:
+        return shard_index(patient_id, len(self._backend.shards))
+
+    def _group_by_shard(
+        self, items: Sequence[T], ids: Sequence[int]
+    ) -> dict[int, list[T]]:
+        groups: dict[int, list[T]] = defaultdict(list)
+        for item, patient_id in zip(items, ids):
+            groups[self._shard(patient_id)].append(item)
+        return groups
+
+    async def list_patients(
+        self,
+        sort_by: str | None = None,
+        name_filter: str | None = None,
+        total_mode: TotalMode = TotalMode.exact,
+        notes_limit: int | None = None,
+        born_from: date | None = None,
+        born_to: date | None = None,
+        min_age: int | None = None,
+        max_age: int | None = None,
+    ) -> Any:
+        """List patients of all shards, merge-sorted and paginated.
+
+        Every shard returns its first `offset + limit` matches, so deep
+        pages cost more; totals are the sum of the shard totals.
+        """
+        params: Params = resolve_params()
+        raw_params = params.to_raw_params().as_limit_offset()
+        limit, offset = raw_params.limit or 0, raw_params.offset or 0
+        field_name, is_ascending = self._parse_sort(sort_by)
+        filtered = self._filtered_query(
+            name_filter, born_from, born_to, min_age, max_age
+        )
+        # Byte order on the shards is the code point order of the merge below
+        query = filtered.order_by(
+            *self._order_by(field_name, is_ascending, collation="C")
+        ).limit(offset + limit + 1)
+
+        async def fetch(session: AsyncSession) -> tuple[list[PatientRead], int]:
+            items = patient_reads(await session.execute(query))
+            total: int | None = 0
+            if total_mode == TotalMode.exact:
+                total = await session.scalar(
+                    select(func.count()).select_from(filtered.subquery())
+                )
+            elif total_mode == TotalMode.estimate:
+                total = await estimate_count(session, filtered)
+            return items, total or 0
+
+        shards = await gather_shards(
+            self._backend, {i: fetch for i in range(len(self._backend.shards))}
+        )
+        merged = list(
+            heapq.merge(
+                *(items for items, _ in shards.values()),
+                key=_merge_key(field_name, is_ascending),
+                reverse=not is_ascending,
+            )
+        )
+        items: list[Any] = merged[offset : offset + limit]
+        if notes_limit:
+            items = await self.with_latest_notes(items, notes_limit)
+        total = None
+        if total_mode != TotalMode.none:
+            total = sum(shard_total for _, shard_total in shards.values())
+        return Page.create(
+            items, params, total=total, has_next=len(merged) > offset + limit
+        )
+
+    async def with_latest_notes(
+        self, patients: Sequence[Patient | PatientRead], notes_limit: int
+    ) -> list[Any]:
+        """Embed the latest notes, one query on each shard of the patients."""
+        groups = self._group_by_shard(patients, [p.id for p in patients])
+
+        def embed(group: list[Patient | PatientRead]) -> Callable[..., Awaitable]:
+            return lambda session: PatientService(session).with_latest_notes(
+                group, notes_limit
+            )
+
+        shards = await gather_shards(
+            self._backend, {index: embed(group) for index, group in groups.items()}
+        )
+        by_id = {p.id: p for result in shards.values() for p in result}
+        return [by_id[patient.id] for patient in patients]
+
+    async def get_patients(self, patient_ids: Sequence[int]) -> dict[str, Any]:
+        """Get many patients, one query on each shard holding some of them."""
+        ids = list(dict.fromkeys(patient_ids))
+        groups = self._group_by_shard(ids, ids)
+
+        def fetch(group: list[int]) -> Callable[..., Awaitable]:
+            return lambda session: PatientService(
+                session, use_cache=self._use_cache
+            ).get_patients(group)
+
+        shards = await gather_shards(
+            self._backend, {index: fetch(group) for index, group in groups.items()}
+        )
+        found = {p.id: p for result in shards.values() for p in result["items"]}
+        return {
+            "items": [found[i] for i in ids if i in found],
+            "missing": [i for i in ids if i not in found],
+        }
+
+    async def create_patient(self, patient_data: dict) -> Patient:
+        external_id = patient_data.get("external_id")
+        if external_id and await self._find_external_ids([external_id]):
+            raise _duplicate_external_id([external_id])
+        (patient_id,) = await self._allocate_ids(1)
+        logger.debug(
+            "Creating patient %s on shard %s", patient_id, self._shard(patient_id)
+        )
+        async with self._backend.shard_session(self._shard(patient_id)) as session:
+            return await PatientService(session).create_patient(
+                {**patient_data, "id": patient_id}
+            )
+
+    async def bulk_create_patients(
+        self, patients_data: list[dict], upsert: bool = False
+    ) -> dict[str, Any]:
+        """Insert many patients, one set-based INSERT per shard and chunk.
+
+        `external_id` is only unique per database, so existing ones are
+        looked up on every shard first. Shards commit independently.
+        """
+        external_ids = [d["external_id"] for d in patients_data if d.get("external_id")]
+        existing = await self._find_external_ids(external_ids)
+        if existing and not upsert:
+            raise _duplicate_external_id(list(existing))
+
+        new_ids = iter(await self._allocate_ids(len(patients_data) - len(existing)))
+        rows = [
+            {**data, "id": existing.get(data.get("external_id") or "") or next(new_ids)}
+            for data in patients_data
+        ]
+        groups = self._group_by_shard(rows, [row["id"] for row in rows])
+
+        def insert(group: list[dict]) -> Callable[..., Awaitable]:
+            return lambda session: PatientService(session).bulk_create_patients(
+                group, upsert=upsert
+            )
+
+        shards = await gather_shards(
+            self._backend, {index: insert(group) for index, group in groups.items()}
+        )
+        return {
+            "ids": [row["id"] for row in rows],
+            "created": sum(result["created"] for result in shards.values()),
+            "updated": sum(result["updated"] for result in shards.values()),
+        }
+
+    async def purge_deleted_patients(self, batch_size: int | None = None) -> list[int]:
+        shards = await gather_shards(
+            self._backend,
+            {
+                index: lambda session: PatientService(session).purge_deleted_patients(
+                    batch_size
+                )
+                for index in range(len(self._backend.shards))
+            },
+        )
+        return [patient_id for purged in shards.values() for patient_id in purged]
+
+    async def _allocate_ids(self, count: int) -> list[int]:
+        """Draw `count` patient ids from the primary's sequence."""
+        if count == 0:
+            return []
+        result = await self._db.execute(
+            select(func.nextval("patients_id_seq")).select_from(
+                func.generate_series(1, count)
+            )
+        )
+        ids = sorted(result.scalars())
+        await self._db.commit()
+        return ids
+
+    async def _find_external_ids(self, external_ids: list[str]) -> dict[str, int]:
+        """Map the given external ids that already exist to their patient."""
+        if not external_ids:
+            return {}
+        query = select(Patient.external_id, Patient.id).where(
+            Patient.external_id
+            == any_(bindparam("external_ids", external_ids, ARRAY(String))),
+            Patient.deleted_at.is_(None),
+        )
+
+        async def find(session: AsyncSession) -> dict[str, int]:
+            result = await session.execute(query)
+            return {row.external_id: row.id for row in result}
+
+        shards = await gather_shards(
+            self._backend, {i: find for i in range(len(self._backend.shards))}
+        )
+        return {k: v for found in shards.values() for k, v in found.items()}
+
+
+class DuplicateExternalIdError(ValueError):
+    """What the unique index raises when everything lives in one database."""
+
+    sqlstate = UNIQUE_VIOLATION
+    constraint_name = EXTERNAL_ID_INDEX
+
+
+def _duplicate_external_id(external_ids: list[str]) -> IntegrityError:
+    return IntegrityError(
+        None,
+        None,
+        DuplicateExternalIdError(f"external_id already exists: {external_ids}"),
+    )
+
+
+class ShardedNoteService(NoteService):
+    """NoteService whose search over all patients scatters to every shard.
+
+    Note ids are unique across shards (see `PostgresBackend.prepare_shards`),
+    so the (rank, id) search cursor stays valid on every shard.
+    """
+
+    def __init__(self, db_session: AsyncSession, backend: PostgresBackend) -> None:
+        super().__init__(db_session)
+        self._backend = backend
+
+    async def search_notes(
+        self,
+        query: str,
+        patient_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cursor: str | None = None,
+        limit: int = 20,
+    ) -> dict[str, Any]:
+        if patient_id is not None:
+            return await super().search_notes(
+                query, patient_id, start, end, cursor, limit
+            )
+
+        async def search(session: AsyncSession) -> dict[str, Any]:
+            return await NoteService(session).search_notes(
+                query, start=start, end=end, cursor=cursor, limit=limit
+            )
+
+        shards = await gather_shards(
+            self._backend, {i: search for i in range(len(self._backend.shards))}
+        )
+        merged = heapq.merge(
+            *(page["items"] for page in shards.values()),
+            key=lambda item: (item["rank"], item["id"]),
+            reverse=True,
+        )
+        items = list(islice(merged, limit + 1))
+        has_next = len(items) > limit or any(
+            page["next_cursor"] for page in shards.values()
+        )
+        items = items[:limit]
+        next_cursor = None
+        if has_next and items:
+            next_cursor = encode_search_cursor(items[-1]["rank"], items[-1]["id"])
+        return {"items": items, "next_cursor": next_cursor}
@@ -4,6 +4,7 @@ from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.tracing import span
 from app.llm.service import LLMService
 from app.services.notes import NoteService
 from app.services.patients import PatientService
@@ -26,16 +27,27 @@ class PatientSummaryService:
         service = cls(patients_service, notes_service)
         return service
 
+    async def get_summary_version(self, patient_id: int) -> tuple[Any, ...] | None:
+        """Return the values a patient's summary depends on, None if missing."""
+        patient = await self.patients_service.get_patient(patient_id)
+        if not patient:
+            return None
+        notes_version = await self.notes_service.get_notes_version(patient_id)
+        return (patient.updated_at, *notes_version)
+
     async def generate_summary(
         self, patient_id: int, llm_service: LLMService
     ) -> dict[str, Any]:
         """Generate a comprehensive patient summary."""
         # Get patient and notes
-        patient = await self.patients_service.get_patient(patient_id)
-        if not patient:
-            raise ValueError(f"Patient with id {patient_id} not found")
+        with span("summary.load", patient_id=patient_id):
+            patient = await self.patients_service.get_patient(patient_id)
+            if not patient:
+                raise ValueError(f"Patient with id {patient_id} not found")
 
-        patient_notes = await self.notes_service.get_latests_patient_notes(patient_id)
+            patient_notes = await self.notes_service.get_latests_patient_notes(
+                patient_id
+            )
 
         notes_data = [
             {"timestamp": note.timestamp.isoformat(), "content": note.content}
@@ -54,7 +66,9 @@ class PatientSummaryService:
                 "patient_id": patient.id,
                 "name": patient.name,
                 "date_of_birth": patient.date_of_birth,
-                "total_notes": len(patient_notes),
+                "total_notes": patient.notes_count,
+                "first_note_at": patient.first_note_at,
+                "last_note_at": patient.last_note_at,
             },
             "summary": summary_text,
             "generated_at": datetime.now().isoformat(),
@@ -0,0 +1,26 @@
+"""Statements run on fresh connections before a worker starts serving."""
+
+from typing import Any
+
+from fastapi_pagination import Params, set_page, set_params
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.schemas.pagination import Page
+from app.services.notes import NoteService
+from app.services.patients import PatientService
+
+
+async def prime_statements(session: AsyncSession) -> None:
+    """Run the hot read queries once, matching no rows.
+
+    This compiles their SQL and prepares them on the session's connection,
+    so the first real requests skip both steps.
+    """
+    patients = PatientService(session, use_cache=False)
+    notes = NoteService(session)
+    with set_params(Params()), set_page(Page[Any]):
+        await patients.list_patients()
+        await notes.get_patient_notes(0)
+    await patients.get_patient(0)
+    await patients.get_patients([0])
+    await notes.get_notes_version(0)
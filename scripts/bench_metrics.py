@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Benchmark the CPU cost of MetricsMiddleware relative to whole requests.
+
+End-to-end A/B runs cannot resolve a few microseconds against the noise of
+millisecond requests, so the cost is measured in two parts:
+1. the middleware alone, wrapping a minimal ASGI app, against that app
+   called directly (best of several rounds);
+2. the CPU time per request of /health and the list endpoints through the
+   full app, driven in process through httpx (median of batches).
+The cost column is the first as a share of the second. Uses DATABASE_URL,
+which needs at least one patient (SEED_DATABASE_ON_STARTUP=true seeds an
+empty database).
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core.metrics import RequestMetrics
+from app.main import app
+from app.middlewares import MetricsMiddleware
+
+
+async def minimal_app(scope: Scope, receive: Receive, send: Send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b'{"status":"ok"}'})
+
+
+async def middleware_cost(calls: int, rounds: int) -> float:
+    """Microseconds MetricsMiddleware adds to one request."""
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: Message) -> None:
+        pass
+
+    wrapped = MetricsMiddleware(minimal_app, RequestMetrics())
+    best = {minimal_app: float("inf"), wrapped: float("inf")}
+    for _ in range(rounds):
+        for target in best:
+            start = time.process_time()
+            for _ in range(calls):
+                scope = {"type": "http", "method": "GET", "path": "/patients/1"}
+                await target(scope, receive, send)
+            best[target] = min(best[target], time.process_time() - start)
+    return (best[wrapped] - best[minimal_app]) * 1_000_000 / calls
+
+
+async def cpu_per_request(
+    client: httpx.AsyncClient, path: str, batch: int, batches: int
+) -> float:
+    """Median CPU microseconds per request over `batches` batches."""
+    results = []
+    for index in range(batches + 1):
+        start = time.process_time()
+        for _ in range(batch):
+            response = await client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+        if index:  # the first batch only warms up
+            results.append((time.process_time() - start) * 1_000_000 / batch)
+    return statistics.median(results)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=200, help="Requests per batch")
+    parser.add_argument("--batches", type=int, default=10)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    cost = await middleware_cost(args.calls, args.rounds)
+    print(f"MetricsMiddleware: {cost:.2f} us per request")
+
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://bench") as client,
+    ):
+        patients = (await client.get("/patients/?size=1")).json()["items"]
+        assert patients, "DATABASE_URL has no patients"
+        paths = [
+            "/health",
+            "/patients/?size=50",
+            f"/patients/{patients[0]['id']}/notes/?size=50",
+        ]
+        print(f"{'path':<32} {'us/request':>11} {'cost':>6}")
+        for path in paths:
+            request = await cpu_per_request(client, path, args.batch, args.batches)
+            print(f"{path:<32} {request:>11.0f} {cost / request:>6.2%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
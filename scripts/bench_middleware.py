@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Benchmark request throughput with the old and new LoggingMiddleware.
+
+Drives the app in process through httpx with a fixed number of concurrent
+clients, once with the pure ASGI `LoggingMiddleware` and once with the
+`BaseHTTPMiddleware` version it replaced, on /health and the list endpoints.
+Uses DATABASE_URL, which needs at least one patient
+(SEED_DATABASE_ON_STARTUP=true seeds an empty database). Middlewares alternate
+over several rounds and the best round is reported.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Callable
+
+import httpx
+from fastapi import Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.querystats import track_queries
+from app.main import app
+from app.middlewares import LoggingMiddleware
+
+logger = logging.getLogger("app.middlewares")
+
+
+class BaseHTTPLoggingMiddleware(BaseHTTPMiddleware):
+    """The previous implementation, kept here as the baseline."""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response | Any:
+        start_time = time.time()
+        host = request.client.host if request.client else "unknown"
+        logger.info(f"Request: ({host}) {request.method} {request.url.path}")
+        with track_queries() as queries:
+            response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(
+            f"Response: ({host}) {request.method} {request.url.path} "
+            f"Status: {response.status_code} "
+            f"Duration: {process_time:.4f}s "
+            f"Queries: {queries.count} ({queries.seconds:.4f}s)"
+        )
+        response.headers["X-Process-Time"] = str(process_time)
+        response.headers["X-DB-Query-Count"] = str(queries.count)
+        response.headers["X-DB-Time"] = str(queries.seconds)
+        return response
+
+
+def use_logging_middleware(cls: type) -> None:
+    for middleware in app.user_middleware:
+        if middleware.cls in (LoggingMiddleware, BaseHTTPLoggingMiddleware):
+            middleware.cls = cls
+    app.middleware_stack = None  # rebuilt on the next request
+
+
+async def throughput(
+    client: httpx.AsyncClient, path: str, requests: int, concurrency: int
+) -> float:
+    """Requests per second over `requests` requests."""
+    remaining = iter(range(requests))
+
+    async def worker() -> None:
+        for _ in remaining:
+            response = await client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)  # keep the log calls, skip the output
+
+    transport = httpx.ASGITransport(app=app)
+    async with (
+        app.router.lifespan_context(app),
+        httpx.AsyncClient(transport=transport, base_url="http://bench") as client,
+    ):
+        patients = (await client.get("/patients/?size=1")).json()["items"]
+        assert patients, "DATABASE_URL has no patients"
+        paths = [
+            "/health",
+            "/patients/?size=50",
+            f"/patients/{patients[0]['id']}/notes/?size=50",
+        ]
+
+        print(f"{'path':<32} {'BaseHTTP req/s':>15} {'ASGI req/s':>11} {'gain':>6}")
+        for path in paths:
+            results: dict[type, list[float]] = {
+                BaseHTTPLoggingMiddleware: [],
+                LoggingMiddleware: [],
+            }
+            for _ in range(args.rounds):
+                for cls, runs in results.items():
+                    use_logging_middleware(cls)
+                    await throughput(client, path, 50, args.concurrency)  # warm up
+                    runs.append(
+                        await throughput(client, path, args.requests, args.concurrency)
+                    )
+            old, new = max(results[BaseHTTPLoggingMiddleware]), max(
+                results[LoggingMiddleware]
+            )
+            print(f"{path:<32} {old:>15.0f} {new:>11.0f} {new / old - 1:>6.0%}")
+        use_logging_middleware(LoggingMiddleware)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
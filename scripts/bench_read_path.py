@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Benchmark CPU time per request of ORM and Core read paths on 100-row pages.
+
+Inserts 100 patients and 100 notes into DATABASE_URL, runs each path
+repeatedly in a fresh session like a request would, then removes the rows.
+Paths alternate over several rounds and the best round is reported.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from datetime import date, datetime, timezone
+from typing import Any
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.db import postgres_db
+from app.models.notes import PatientNote
+from app.models.patients import Patient
+from app.schemas.notes import NoteRead
+from app.schemas.patients import PatientRead
+from app.services.patients import (
+    NOTE_READ_COLUMNS,
+    PATIENT_READ_COLUMNS,
+    note_reads,
+    patient_reads,
+)
+
+PAGE_SIZE = 100
+
+
+async def orm_patients(session: AsyncSession, prefix: str) -> list[Any]:
+    result = await session.execute(
+        select(Patient)
+        .where(Patient.name.startswith(prefix))
+        .order_by(Patient.id)
+        .limit(PAGE_SIZE)
+    )
+    return [PatientRead.model_validate(patient) for patient in result.scalars()]
+
+
+async def core_patients(session: AsyncSession, prefix: str) -> list[Any]:
+    result = await session.execute(
+        select(*PATIENT_READ_COLUMNS)
+        .where(Patient.name.startswith(prefix))
+        .order_by(Patient.id)
+        .limit(PAGE_SIZE)
+    )
+    return patient_reads(result)
+
+
+async def orm_notes(session: AsyncSession, patient_id: int) -> list[Any]:
+    result = await session.execute(
+        select(PatientNote)
+        .where(PatientNote.patient_id == patient_id)
+        .order_by(PatientNote.timestamp.desc())
+        .limit(PAGE_SIZE)
+    )
+    return [NoteRead.model_validate(note) for note in result.scalars()]
+
+
+async def core_notes(session: AsyncSession, patient_id: int) -> list[Any]:
+    result = await session.execute(
+        select(*NOTE_READ_COLUMNS)
+        .where(PatientNote.patient_id == patient_id)
+        .order_by(PatientNote.timestamp.desc())
+        .limit(PAGE_SIZE)
+    )
+    return note_reads(result)
+
+
+async def measure(
+    read: Callable[[AsyncSession, Any], Awaitable[list[Any]]],
+    argument: Any,
+    iterations: int,
+) -> tuple[float, float]:
+    """Return (CPU, wall) milliseconds per request."""
+    assert postgres_db.AsyncSessionLocal is not None
+    for _ in range(10):  # warm up the statement caches
+        async with postgres_db.AsyncSessionLocal() as session:
+            assert len(await read(session, argument)) == PAGE_SIZE
+    cpu, wall = time.process_time(), time.perf_counter()
+    for _ in range(iterations):
+        async with postgres_db.AsyncSessionLocal() as session:
+            await read(session, argument)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    return cpu * 1000 / iterations, wall * 1000 / iterations
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    await postgres_db.init(settings.database_url)
+    assert postgres_db.AsyncSessionLocal is not None
+    prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+    async with postgres_db.AsyncSessionLocal() as session:
+        result = await session.execute(
+            insert(Patient).returning(Patient.id),
+            [
+                {"name": f"{prefix}{i}", "date_of_birth": date(1980, 1, 1)}
+                for i in range(PAGE_SIZE)
+            ],
+        )
+        patient_id = min(result.scalars())
+        await session.execute(
+            insert(PatientNote),
+            [
+                {
+                    "patient_id": patient_id,
+                    "content": "Follow-up visit. " * 50,
+                    "timestamp": datetime.now(timezone.utc),
+                }
+                for _ in range(PAGE_SIZE)
+            ],
+        )
+        await session.commit()
+
+    try:
+        print(f"{'page of 100':<12} {'path':<5} {'CPU ms/req':>11} {'wall ms/req':>12}")
+        for name, orm, core, argument in [
+            ("patients", orm_patients, core_patients, prefix),
+            ("notes", orm_notes, core_notes, patient_id),
+        ]:
+            orm_runs, core_runs = [], []
+            for _ in range(args.rounds):
+                orm_runs.append(await measure(orm, argument, args.iterations))
+                core_runs.append(await measure(core, argument, args.iterations))
+            (orm_cpu, orm_wall), (core_cpu, core_wall) = min(orm_runs), min(core_runs)
+            print(f"{name:<12} {'orm':<5} {orm_cpu:>11.3f} {orm_wall:>12.3f}")
+            print(f"{name:<12} {'core':<5} {core_cpu:>11.3f} {core_wall:>12.3f}")
+            print(f"{name:<12} CPU saved: {1 - core_cpu / orm_cpu:.0%}")
+    finally:
+        async with postgres_db.AsyncSessionLocal() as session:
+            await session.execute(
+                delete(PatientNote).where(PatientNote.patient_id == patient_id)
+            )
+            await session.execute(
+                delete(Patient).where(Patient.name.startswith(prefix))
+            )
+            await session.commit()
+        await postgres_db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
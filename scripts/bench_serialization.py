@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Benchmark rendering a large notes page with stdlib json and with orjson.
+
+Builds a Page[NoteRead] of notes with long contents and runs the steps
+FastAPI takes for a route with a response model: validate, serialize to
+JSON-compatible data, then render the body with each response class.
+"""
+
+import argparse
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi_pagination import Params
+from pydantic import TypeAdapter
+
+from app.schemas.notes import NoteRead
+from app.schemas.pagination import Page
+
+
+def build_page(size: int, content_size: int) -> Page[NoteRead]:
+    now = datetime.now(timezone.utc)
+    content = ("Patient reports intermittent chest pain, é ü. " * content_size)[
+        :content_size
+    ]
+    notes = [
+        NoteRead(id=i, patient_id=1, content=content, timestamp=now, created_at=now)
+        for i in range(size)
+    ]
+    return Page[NoteRead].create(notes, Params(page=1, size=size), total=size)
+
+
+def per_call_ms(fn: Any, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) * 1000 / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=100, help="Notes per page")
+    parser.add_argument("--content", type=int, default=5000, help="Chars per note")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    page = build_page(args.size, args.content)
+    adapter: TypeAdapter[Page[NoteRead]] = TypeAdapter(Page[NoteRead])
+    data = adapter.dump_python(adapter.validate_python(page), mode="json")
+    assert JSONResponse(data).body == ORJSONResponse(data).body
+
+    serialize = per_call_ms(
+        lambda: adapter.dump_python(adapter.validate_python(page), mode="json"),
+        args.iterations,
+    )
+    print(f"{args.size} notes of {args.content} chars")
+    print(f"{'validate + serialize':<22} {serialize:>8.3f} ms")
+    for response_class in (JSONResponse, ORJSONResponse):
+        render = per_call_ms(lambda: response_class(data), args.iterations)
+        print(
+            f"{response_class.__name__ + ' render':<22} {render:>8.3f} ms"
+            f"   total {serialize + render:.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
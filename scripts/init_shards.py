@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""CLI script to migrate every shard and interleave their note id sequences."""
+
+import asyncio
+import sys
+from argparse import Namespace
+
+from alembic import command
+from alembic.config import Config
+from app.config import settings
+from app.core.db import postgres_db
+
+
+async def main() -> None:
+    """Main function to prepare the shards listed in DATABASE_SHARD_URLS."""
+    if not settings.database_shard_urls:
+        print("✗ DATABASE_SHARD_URLS is not set", file=sys.stderr)
+        sys.exit(1)
+
+    for url in settings.database_shard_urls:
+        alembic_cfg = Config("alembic.ini", cmd_opts=Namespace(x=[f"url={url}"]))
+        await asyncio.to_thread(command.upgrade, alembic_cfg, "head")
+
+    await postgres_db.init(
+        settings.database_url, shard_urls=settings.database_shard_urls
+    )
+    try:
+        await postgres_db.prepare_shards()
+        print(f"✓ {len(settings.database_shard_urls)} shards ready")
+    finally:
+        await postgres_db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""Load test `python -m app.server` at several worker counts.
+
+For each count, starts the server on a free port with WEB_CONCURRENCY set,
+drives it for a fixed time from several client processes, then stops it,
+and reports throughput and the scaling efficiency relative to one worker.
+Uses DATABASE_URL for the database-backed path. Clients compete with the
+server for CPUs, so keep --clients modest or leave cores free for them.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+async def drive(url: str, duration: float, concurrency: int) -> tuple[int, int]:
+    """(ok, failed) responses over `duration` seconds."""
+    ok = failed = 0
+    stop_at = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal ok, failed
+        while time.monotonic() < stop_at:
+            try:
+                response = await client.get(url)
+            except httpx.HTTPError:
+                failed += 1
+                continue
+            if response.status_code == 200:
+                ok += 1
+            else:
+                failed += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return ok, failed
+
+
+def client_process(args: tuple[str, float, int]) -> tuple[int, int]:
+    return asyncio.run(drive(*args))
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen[bytes]:
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(port),
+        "HOST": "127.0.0.1",
+        "ACCESS_LOG_SAMPLE_RATE": "0",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.server"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health").status_code == 200:
+                time.sleep(2)  # let the other workers finish their warmup
+                return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"Server with {workers} workers did not start")
+
+
+def default_worker_counts() -> str:
+    cpus = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 < cpus:
+        counts.append(counts[-1] * 2)
+    if cpus > 1:
+        counts.append(cpus)
+    return ",".join(map(str, counts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--workers",
+        default=default_worker_counts(),
+        help="Comma separated worker counts (default: powers of 2 up to the CPUs)",
+    )
+    parser.add_argument("--path", default="/patients/batch?ids=1,2,3")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=4, help="Client processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Per client")
+    args = parser.parse_args()
+
+    print(f"{args.path}, {args.clients}x{args.concurrency} concurrent clients")
+    print(f"{'workers':>7} {'req/s':>9} {'failed':>7} {'efficiency':>11}")
+    baseline = None
+    for workers in [int(count) for count in args.workers.split(",")]:
+        port = free_port()
+        server = start_server(workers, port)
+        try:
+            url = f"http://127.0.0.1:{port}{args.path}"
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.map(
+                    client_process,
+                    [(url, args.duration, args.concurrency)] * args.clients,
+                )
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        ok = sum(result[0] for result in results)
+        failed = sum(result[1] for result in results)
+        rate = ok / args.duration
+        if baseline is None:
+            baseline = rate / workers
+        print(
+            f"{workers:>7} {rate:>9.0f} {failed:>7} "
+            f"{rate / (baseline * workers):>11.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
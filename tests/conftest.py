@@ -12,12 +12,14 @@ import alembic
 from alembic.config import Config
 from app.config import settings
 from app.core.db import postgres_db
+from app.core.ratelimit import rate_limiter
 from app.main import app
 from app.models.notes import PatientNote
 from app.models.patients import Patient
 from app.routes.notes import get_note_service
 from app.routes.patients import get_patient_service
 from app.routes.summary import get_llm_service, get_summary_service
+from app.services.patients import patient_cache
 
 TEST_DATABASE_URL = f"{settings.database_url}_test"
 settings.database_url = TEST_DATABASE_URL
@@ -58,6 +60,9 @@ async def cleanup_database() -> AsyncGenerator[None, None]:
     """Clean up database after each test - runs for ALL tests."""
     yield
 
+    patient_cache.clear()
+    await rate_limiter.store.clear()
+
     # Clean up all data after test completes
     if postgres_db.AsyncSessionLocal is None:
         return
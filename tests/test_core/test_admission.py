@@ -0,0 +1,229 @@
+import asyncio
+from typing import Any
+
+import pytest
+from starlette.types import Message, Receive, Scope, Send
+
+from app.core.admission import (
+    CLIENT_DISCONNECTED,
+    QUEUE_FULL,
+    QUEUE_TIMEOUT,
+    AdmissionControl,
+    GroupLimiter,
+)
+from app.middlewares import AdmissionMiddleware
+
+
+@pytest.mark.asyncio
+class TestGroupLimiter:
+    async def test_admits_up_to_the_limit_then_queues(self) -> None:
+        limiter = GroupLimiter(limit=1, max_queue=1)
+        assert await limiter.acquire(1.0) is None
+
+        waiting = asyncio.create_task(limiter.acquire(1.0))
+        await asyncio.sleep(0)
+        assert len(limiter.waiters) == 1
+        assert await limiter.acquire(1.0) == QUEUE_FULL
+
+        limiter.release()
+        assert await waiting is None
+        assert limiter.active == 1
+        assert limiter.stats()["admitted"] == 2
+        assert limiter.stats()["shed"] == {QUEUE_FULL: 1}
+
+    async def test_queue_timeout(self) -> None:
+        limiter = GroupLimiter(limit=1, max_queue=5)
+        await limiter.acquire(1.0)
+
+        assert await limiter.acquire(0.01) == QUEUE_TIMEOUT
+        assert not limiter.waiters
+        limiter.release()
+        assert limiter.active == 0
+
+    async def test_cancelled_waiter_leaves_the_queue(self) -> None:
+        limiter = GroupLimiter(limit=1, max_queue=5)
+        await limiter.acquire(1.0)
+        waiting = asyncio.create_task(limiter.acquire(1.0))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert not limiter.waiters
+        limiter.release()
+        assert limiter.active == 0
+
+    async def test_slots_go_to_waiters_in_order(self) -> None:
+        limiter = GroupLimiter(limit=1, max_queue=5)
+        await limiter.acquire(1.0)
+        order: list[int] = []
+
+        async def wait(index: int) -> None:
+            await limiter.acquire(1.0)
+            order.append(index)
+            limiter.release()
+
+        tasks = [asyncio.create_task(wait(index)) for index in range(3)]
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*tasks)
+
+        assert order == [0, 1, 2]
+        assert limiter.active == 0
+
+
+class TestAdmissionControl:
+    def test_health_and_unlimited_groups_have_no_limiter(self) -> None:
+        control = AdmissionControl({"health": 1, "read": 0, "summary": 2}, {})
+        assert control.limiter("health") is None
+        assert control.limiter("read") is None
+        assert control.limiter("write") is None
+        summary = control.limiter("summary")
+        assert summary is not None and summary.max_queue == 0
+
+    def test_render(self) -> None:
+        control = AdmissionControl({"summary": 2}, {"summary": 1})
+        control.groups["summary"].shed[QUEUE_FULL] += 3
+        control.groups["summary"].shed[CLIENT_DISCONNECTED] += 1
+
+        lines = control.render().splitlines()
+
+        assert 'http_admission_active{group="summary"} 0' in lines
+        assert 'http_admission_queue_depth{group="summary"} 0' in lines
+        assert 'http_requests_shed_total{group="summary",reason="queue_full"} 3' in (
+            lines
+        )
+        assert 'http_admission_abandoned_total{group="summary"} 1' in lines
+
+
+def make_scope(path: str) -> Any:
+    return {"type": "http", "method": "GET", "path": path, "headers": []}
+
+
+async def receive() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+@pytest.mark.asyncio
+async def test_middleware_sheds_with_retry_after() -> None:
+    started = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def slow_app(scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["path"].endswith("/summary"):
+            started.set()
+            await finish.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    control = AdmissionControl({"summary": 1}, {"summary": 0})
+    middleware = AdmissionMiddleware(slow_app, control)
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    running = asyncio.create_task(
+        middleware(make_scope("/patients/1/summary"), receive, send)
+    )
+    await started.wait()
+    await middleware(make_scope("/patients/2/summary"), receive, send)
+
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+
+    # Health checks and other groups are not held back by a full group
+    await middleware(make_scope("/health"), receive, send)
+    await middleware(make_scope("/patients/1"), receive, send)
+    assert [m["status"] for m in sent if "status" in m] == [503, 200, 200]
+
+    finish.set()
+    await running
+    assert control.groups["summary"].active == 0
+    assert control.groups["summary"].shed == {QUEUE_FULL: 1}
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_leaves_the_queue() -> None:
+    started = asyncio.Event()
+    finish = asyncio.Event()
+
+    async def slow_app(scope: Scope, receive: Receive, send: Send) -> None:
+        started.set()
+        await finish.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    control = AdmissionControl({"summary": 1}, {"summary": 5})
+    limiter = control.groups["summary"]
+    middleware = AdmissionMiddleware(slow_app, control)
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    running = asyncio.create_task(
+        middleware(make_scope("/patients/1/summary"), receive, send)
+    )
+    await started.wait()
+
+    leave = asyncio.Event()
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def leaving_receive() -> Message:
+        if messages:
+            return messages.pop()
+        await leave.wait()
+        return {"type": "http.disconnect"}
+
+    queued = asyncio.create_task(
+        middleware(make_scope("/patients/2/summary"), leaving_receive, send)
+    )
+    await asyncio.sleep(0.01)
+    assert len(limiter.waiters) == 1
+
+    leave.set()
+    await asyncio.wait_for(queued, 1)
+    assert not limiter.waiters
+    assert limiter.shed == {CLIENT_DISCONNECTED: 1}
+    assert sent == []
+
+    finish.set()
+    await running
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admitted_request_gets_the_messages_read_while_queued() -> None:
+    finish = asyncio.Event()
+    received: list[Message] = []
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        received.append(await receive())
+        if scope["path"] == "/patients/1/summary":
+            await finish.wait()
+
+    control = AdmissionControl({"summary": 1}, {"summary": 5})
+    middleware = AdmissionMiddleware(app, control)
+
+    async def send(message: Message) -> None:
+        pass
+
+    chunk = {"type": "http.request", "body": b"first", "more_body": True}
+
+    async def upload_receive() -> Message:
+        return chunk
+
+    running = asyncio.create_task(
+        middleware(make_scope("/patients/1/summary"), receive, send)
+    )
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(
+        middleware(make_scope("/patients/2/summary"), upload_receive, send)
+    )
+    await asyncio.sleep(0.01)
+    finish.set()
+    await asyncio.gather(running, queued)
+
+    assert received[1] is chunk
+    assert control.groups["summary"].active == 0
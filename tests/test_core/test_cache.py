@@ -0,0 +1,68 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.core.cache import AsyncLRUCache
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestAsyncLRUCache:
+    async def test_get_set(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=10, ttl=60)
+        assert await cache.get(1) is None
+        await cache.set(1, "one")
+        assert await cache.get(1) == "one"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_ratio"] == 0.5
+
+    async def test_get_set_many(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=10, ttl=60)
+        await cache.set_many({1: "one", 2: "two"})
+        assert await cache.get_many([1, 2, 3]) == {1: "one", 2: "two"}
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+        generation = cache.generation
+        await cache.invalidate(1)
+        await cache.set_many({1: "stale"}, generation)
+        assert await cache.get_many([1]) == {}
+
+    async def test_evicts_least_recently_used(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=2, ttl=60)
+        await cache.set(1, "one")
+        await cache.set(2, "two")
+        await cache.get(1)
+        await cache.set(3, "three")
+        assert await cache.get(2) is None
+        assert await cache.get(1) == "one"
+        assert cache.stats()["evictions"] == 1
+
+    async def test_expires_entries(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=2, ttl=10)
+        await cache.set(1, "one")
+        with patch("app.core.cache.time.monotonic", return_value=time.monotonic() + 11):
+            assert await cache.get(1) is None
+        assert cache.stats()["size"] == 0
+
+    async def test_set_with_shorter_ttl(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=10, ttl=10)
+        await cache.set(1, "one", ttl=2)
+        await cache.set_many({2: "two"}, ttl=60)
+        with patch("app.core.cache.time.monotonic", return_value=time.monotonic() + 3):
+            assert await cache.get(1) is None
+            assert await cache.get(2) == "two"
+
+    async def test_invalidate_discards_stale_set(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=10, ttl=60)
+        generation = cache.generation
+        await cache.invalidate(1)
+        await cache.set(1, "stale", generation)
+        assert await cache.get(1) is None
+
+    async def test_disabled(self) -> None:
+        cache: AsyncLRUCache[int, str] = AsyncLRUCache(maxsize=0, ttl=60)
+        await cache.set(1, "one")
+        assert await cache.get(1) is None
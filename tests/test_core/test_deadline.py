@@ -0,0 +1,171 @@
+import asyncio
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from starlette.types import Message
+
+from app.config import settings
+from app.core.db import postgres_db
+from app.core.deadline import DeadlineExceeded, deadline, is_timeout, timeout
+from app.core.routing import route_group
+from app.middlewares import DeadlineMiddleware, request_deadline
+from app.services.purge import start_purge
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_scope(method: str, path: str, headers: dict[str, str] | None = None) -> Any:
+    return {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "headers": [
+            (k.lower().encode(), v.encode()) for k, v in (headers or {}).items()
+        ],
+    }
+
+
+async def test_route_group() -> None:
+    assert route_group("GET", "/health/db") == "health"
+    assert route_group("GET", "/patients/1/summary") == "summary"
+    assert route_group("POST", "/patients/1/notes/upload") == "upload"
+    assert route_group("GET", "/notes/search") == "search"
+    assert route_group("DELETE", "/patients/1") == "write"
+    assert route_group("GET", "/patients/") == "read"
+
+
+async def test_request_deadline_header_only_shortens(monkeypatch: Any) -> None:
+    monkeypatch.setattr(settings, "request_deadlines", {"read": 10.0})
+    assert request_deadline(make_scope("GET", "/patients/")) == 10.0
+    headers = {"X-Request-Timeout": "2.5"}
+    assert request_deadline(make_scope("GET", "/patients/", headers)) == 2.5
+    headers = {"X-Request-Timeout": "60"}
+    assert request_deadline(make_scope("GET", "/patients/", headers)) == 10.0
+    headers = {"X-Request-Timeout": "soon"}
+    assert request_deadline(make_scope("GET", "/patients/", headers)) == 10.0
+    assert request_deadline(make_scope("POST", "/patients/")) is None
+
+
+async def test_nested_deadline_cannot_extend() -> None:
+    assert timeout(30.0) == 30.0
+    with deadline(1.0):
+        with deadline(60.0):
+            left = timeout()
+            assert left is not None and left <= 1.0
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            timeout()
+
+
+async def test_deadline_sets_transaction_timeouts() -> None:
+    assert postgres_db.AsyncSessionLocal is not None
+    async with postgres_db.AsyncSessionLocal() as session:
+        assert await session.scalar(text("SHOW statement_timeout")) == "0"
+        await session.rollback()
+        with deadline(5.0):
+            value = await session.scalar(text("SHOW statement_timeout"))
+            assert value is not None and value.endswith("s")
+            await session.rollback()
+
+        with deadline(0.2):
+            with pytest.raises(DBAPIError) as error:
+                await session.execute(text("SELECT pg_sleep(5)"))
+        assert is_timeout(error.value)
+
+
+def make_app(delay: float, started: asyncio.Event | None = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+
+    @app.get("/slow")
+    async def slow() -> dict[str, str]:
+        if started:
+            started.set()
+        await asyncio.sleep(delay)
+        return {"status": "ok"}
+
+    return app
+
+
+async def test_deadline_exceeded_returns_504(monkeypatch: Any) -> None:
+    monkeypatch.setattr(settings, "request_deadlines", {"read": 5.0})
+    async with AsyncClient(app=make_app(1.0), base_url="http://test") as client:
+        response = await client.get("/slow")
+        assert response.status_code == 200
+
+        response = await client.get("/slow", headers={"X-Request-Timeout": "0.05"})
+        assert response.status_code == 504
+        assert response.json() == {"detail": "Request deadline exceeded"}
+
+
+async def test_client_disconnect_cancels_handler() -> None:
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow_app(scope: Any, receive: Any, send: Any) -> None:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive() -> Message:
+        if messages:
+            return messages.pop()
+        await started.wait()
+        return {"type": "http.disconnect"}
+
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    middleware = DeadlineMiddleware(slow_app)
+    await asyncio.wait_for(middleware(make_scope("GET", "/slow"), receive, send), 5)
+    assert cancelled.is_set()
+    assert sent == []
+
+
+async def test_body_is_read_at_the_handler_pace() -> None:
+    chunks = [
+        {"type": "http.request", "body": b"a", "more_body": True},
+        {"type": "http.request", "body": b"b", "more_body": False},
+    ]
+    reads = 0
+
+    async def receive() -> Message:
+        nonlocal reads
+        reads += 1
+        return chunks.pop(0) if chunks else {"type": "http.disconnect"}
+
+    async def app(scope: Any, receive: Any, send: Any) -> None:
+        await asyncio.sleep(0.05)
+        assert reads == 0  # nothing was read ahead of the handler
+        assert (await receive())["body"] == b"a"
+        await asyncio.sleep(0.05)
+        assert reads == 1
+        assert (await receive())["body"] == b"b"
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    scope = make_scope("POST", "/upload", {"Transfer-Encoding": "chunked"})
+
+    async def send(message: Message) -> None:
+        pass
+
+    await asyncio.wait_for(DeadlineMiddleware(app)(scope, receive, send), 5)
+    assert reads >= 2
+
+
+async def test_background_purge_outlives_the_request_deadline() -> None:
+    with deadline(0):
+        # Created during the request, so it copies the expired deadline
+        task = start_purge()
+    await task
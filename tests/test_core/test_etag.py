@@ -0,0 +1,17 @@
+from app.core.etag import etag_matches, make_etag
+
+
+class TestEtag:
+    def test_make_etag_is_strong_and_stable(self) -> None:
+        etag = make_etag("patient", 1, "2024-01-01")
+        assert etag.startswith('"') and etag.endswith('"')
+        assert etag == make_etag("patient", 1, "2024-01-01")
+        assert etag != make_etag("patient", 1, "2024-01-02")
+
+    def test_etag_matches(self) -> None:
+        etag = make_etag("patient", 1)
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", W/{etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
@@ -0,0 +1,59 @@
+import io
+import json
+import logging
+import sys
+from typing import Any
+
+from app.config import settings
+from app.core import logging as app_logging
+from app.core.logging import JSONFormatter, setup_logging, stop_logging
+
+
+def test_json_formatter_includes_extra_fields() -> None:
+    logger = logging.getLogger("test.json")
+    try:
+        raise ValueError("bad value")
+    except ValueError:
+        record = logger.makeRecord(
+            logger.name,
+            logging.ERROR,
+            __file__,
+            1,
+            "Patient %s failed",
+            (7,),
+            sys.exc_info(),
+            extra={"status": 500, "path": "/patients/7"},
+        )
+
+    entry = json.loads(JSONFormatter().format(record))
+
+    assert entry["level"] == "ERROR"
+    assert entry["logger"] == "test.json"
+    assert entry["message"] == "Patient 7 failed"
+    assert entry["status"] == 500 and entry["path"] == "/patients/7"
+    assert "ValueError: bad value" in entry["exception"]
+    assert "args" not in entry and "msg" not in entry
+
+
+def test_records_are_written_by_the_listener(monkeypatch: Any) -> None:
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", stdout)
+    monkeypatch.setattr(settings, "log_format", "json")
+    setup_logging()
+    try:
+        items = [1, 2]
+        logging.getLogger("test.queue").warning(
+            "Items %s", items, extra={"request_id": "abc"}
+        )
+        # Formatted when logged, later changes do not leak into the record
+        items.append(3)
+        assert app_logging._listener is not None
+    finally:
+        stop_logging()
+        monkeypatch.undo()
+        setup_logging()
+
+    [line] = stdout.getvalue().splitlines()
+    entry = json.loads(line)
+    assert entry["message"] == "Items [1, 2]"
+    assert entry["request_id"] == "abc"
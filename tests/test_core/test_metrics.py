@@ -0,0 +1,130 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from httpx import AsyncClient
+from starlette.types import Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core import worker_metrics
+from app.core.admission import AdmissionControl
+from app.core.metrics import Histogram, RequestMetrics, request_metrics
+from app.middlewares import MetricsMiddleware
+
+
+class TestHistogram:
+    def test_observe_is_cumulative(self) -> None:
+        histogram = Histogram(buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe(value)
+        snapshot = histogram.snapshot()
+        assert snapshot["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+        assert snapshot["count"] == 4
+        assert snapshot["sum"] == 3.65
+
+
+class TestRequestMetrics:
+    def test_render_prometheus_text(self) -> None:
+        metrics = RequestMetrics(latency_buckets=(0.1,), size_buckets=(1000,))
+        metrics.observe("GET", "/patients/{patient_id}", 200, 0.05, 512)
+        metrics.observe("GET", "/patients/{patient_id}", 404, 0.2, 30)
+        metrics.in_flight["read"] += 1
+
+        lines = metrics.render().splitlines()
+
+        labels = 'method="GET",route="/patients/{patient_id}"'
+        assert f'http_requests_total{{{labels},status="2xx"}} 1' in lines
+        assert f'http_requests_total{{{labels},status="4xx"}} 1' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in lines
+        assert f'http_response_size_bytes_bucket{{{labels},le="1000"}} 2' in lines
+        assert f"http_response_size_bytes_sum{{{labels}}} 542.0" in lines
+        assert 'http_requests_in_flight{group="read"} 1' in lines
+
+    @pytest.mark.asyncio
+    async def test_requests_are_keyed_by_route_template(
+        self, client: AsyncClient
+    ) -> None:
+        request_metrics.routes.clear()
+        await client.get("/patients/12345")
+        await client.get("/patients/67890")
+        await client.get("/no/such/path")
+
+        assert set(request_metrics.routes) == {
+            ("GET", "/patients/{patient_id}"),
+            ("GET", "unmatched"),
+        }
+        metrics = request_metrics.routes["GET", "/patients/{patient_id}"]
+        assert metrics.statuses == [0, 0, 0, 0, 2, 0]  # other, 1xx to 5xx
+        assert metrics.duration.count == 2
+        assert not any(request_metrics.in_flight.values())
+
+        response = await client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert 'route="/patients/{patient_id}",status="4xx"} 2' in response.text
+
+    @pytest.mark.asyncio
+    async def test_duration_stops_before_background_work(self) -> None:
+        async def app(scope: Scope, receive: Receive, send: Send) -> None:
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            await asyncio.sleep(0.2)  # a background task
+
+        async def receive() -> Message:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: Message) -> None:
+            pass
+
+        metrics = RequestMetrics()
+        scope = {"type": "http", "method": "BREW", "path": "/pot", "headers": []}
+        await MetricsMiddleware(app, metrics)(scope, receive, send)
+
+        [(method, route)] = metrics.routes
+        assert (method, route) == ("OTHER", "unmatched")
+        assert metrics.routes[method, route].duration.sum < 0.2
+
+
+class TestWorkerMetrics:
+    @pytest.mark.asyncio
+    async def test_render_adds_up_workers(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(settings, "metrics_dir", str(tmp_path))
+        own = RequestMetrics(latency_buckets=(0.1,), size_buckets=(1000,))
+        own.observe("GET", "/patients/", 200, 0.05, 10)
+        admission = AdmissionControl({"summary": 1}, {})
+        monkeypatch.setattr(worker_metrics, "request_metrics", own)
+        monkeypatch.setattr(worker_metrics, "admission_control", admission)
+
+        exited = subprocess.Popen([sys.executable, "-c", ""])
+        exited.wait()
+        for pid, status in ((os.getppid(), 200), (exited.pid, 500)):
+            other = RequestMetrics(latency_buckets=(0.1,), size_buckets=(1000,))
+            other.observe("GET", "/patients/", status, 0.5, 10)
+            other.in_flight["read"] += 1
+            stats = AdmissionControl({"summary": 1}, {}).stats()
+            stats["summary"]["active"] = 1
+            stats["summary"]["shed"] = {"queue_full": 2}
+            (tmp_path / f"{pid}.json").write_text(
+                json.dumps({"requests": other.dump(), "admission": stats})
+            )
+
+        lines = (await worker_metrics.render_metrics()).splitlines()
+
+        labels = 'method="GET",route="/patients/"'
+        assert f'http_requests_total{{{labels},status="2xx"}} 2' in lines
+        assert f'http_requests_total{{{labels},status="5xx"}} 1' in lines
+        assert f'http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1' in lines
+        assert f"http_request_duration_seconds_count{{{labels}}} 3" in lines
+        # Gauges of the exited worker are dropped, its counters kept
+        assert 'http_requests_in_flight{group="read"} 1' in lines
+        assert 'http_admission_active{group="summary"} 1' in lines
+        shed = 'http_requests_shed_total{group="summary",reason="queue_full"} 4'
+        assert shed in lines
+        assert (tmp_path / f"{os.getpid()}.json").exists()
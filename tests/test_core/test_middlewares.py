@@ -0,0 +1,100 @@
+import logging
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from starlette.types import Message, Receive, Scope, Send
+
+from app.config import settings
+from app.middlewares import LoggingMiddleware
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_scope() -> Any:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": "/export",
+        "headers": [],
+        "client": ("10.0.0.1", 1234),
+    }
+
+
+async def receive() -> Message:
+    return {"type": "http.request", "body": b"", "more_body": False}
+
+
+async def test_streaming_response_is_not_buffered() -> None:
+    sent: list[Message] = []
+
+    async def streaming_app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        for chunk in (b"a", b"b"):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            # Each chunk reaches the server before the next one is produced
+            assert sent[-1]["body"] == chunk
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    with patch("app.middlewares.logger") as mock_logger:
+        await LoggingMiddleware(streaming_app)(make_scope(), receive, send)
+
+    headers = dict(sent[0]["headers"])
+    assert b"x-process-time" in headers
+    assert headers[b"x-db-query-count"] == b"0"
+    assert headers[b"server-timing"].startswith(b'db;dur=0.00;desc="0 queries"')
+    assert [m["body"] for m in sent[1:]] == [b"a", b"b", b""]
+    level, message, *args = mock_logger.log.call_args.args
+    assert level == logging.INFO
+    assert message % tuple(args) == (
+        f"Response: (10.0.0.1) GET /export Status: 200 "
+        f"Duration: {args[4]:.4f}s Queries: 0 (0.0000s)"
+    )
+    assert mock_logger.log.call_args.kwargs["extra"]["status"] == 200
+
+
+async def test_error_is_logged_and_raised() -> None:
+    async def failing_app(scope: Scope, receive: Receive, send: Send) -> None:
+        raise RuntimeError("boom")
+
+    async def send(message: Message) -> None:
+        pass
+
+    with patch("app.middlewares.logger") as mock_logger:
+        with pytest.raises(RuntimeError):
+            await LoggingMiddleware(failing_app)(make_scope(), receive, send)
+
+    message, *args = mock_logger.error.call_args.args
+    assert "Exception: boom" in message % tuple(args)
+
+
+def status_app(status: int) -> Any:
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    return app
+
+
+async def test_access_log_sampling_keeps_errors_and_slow_requests(
+    monkeypatch: Any,
+) -> None:
+    async def send(message: Message) -> None:
+        pass
+
+    monkeypatch.setattr(settings, "access_log_sample_rate", 0.0)
+    with patch("app.middlewares.logger") as mock_logger:
+        await LoggingMiddleware(status_app(200))(make_scope(), receive, send)
+        mock_logger.log.assert_not_called()
+
+        await LoggingMiddleware(status_app(404))(make_scope(), receive, send)
+        await LoggingMiddleware(status_app(503))(make_scope(), receive, send)
+        levels = [call.args[0] for call in mock_logger.log.call_args_list]
+        assert levels == [logging.INFO, logging.WARNING]
+
+        monkeypatch.setattr(settings, "slow_request_seconds", 0.0)
+        await LoggingMiddleware(status_app(200))(make_scope(), receive, send)
+        assert mock_logger.log.call_count == 3
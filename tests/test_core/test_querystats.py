@@ -0,0 +1,76 @@
+from datetime import date
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.querystats import normalize_sql, params_shape, track_queries
+from app.models.patients import Patient
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_normalize_sql() -> None:
+    statement = """SELECT patients.id
+        FROM patients
+        WHERE patients.id IN ($1, $2, $3) AND name = 'O''Brien' AND anon_1 > 10"""
+    assert normalize_sql(statement) == (
+        "SELECT patients.id FROM patients "
+        "WHERE patients.id IN ($n, ...) AND name = ? AND anon_1 > ?"
+    )
+
+
+async def test_params_shape() -> None:
+    assert params_shape((1, "Jane", date(1990, 1, 1))) == "(int, str, date)"
+    assert params_shape({"id": 1}) == "{id: int}"
+    assert params_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
+
+
+async def test_track_queries_counts_repeated_statements(
+    db_session: AsyncSession, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "debug", True)
+    with track_queries() as queries:
+        for patient_id in range(5):
+            await db_session.scalar(
+                select(Patient.name).where(Patient.id == patient_id)
+            )
+        await db_session.execute(text("SELECT 1"))
+    assert queries.count == 6
+    assert queries.seconds > 0
+    [(statement, times)] = queries.repeated(5)
+    assert statement.startswith("SELECT patients.name")
+    assert times == 5
+
+    await db_session.execute(text("SELECT 1"))
+    assert queries.count == 6
+
+
+async def test_slow_query_log_hides_values(
+    db_session: AsyncSession, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "slow_query_seconds", 1e-9)
+    with patch("app.core.querystats.logger") as mock_logger:
+        await db_session.execute(
+            select(Patient.id).where(Patient.name == "Secret Name")
+        )
+    template, *args = mock_logger.warning.call_args.args
+    message = template % tuple(args)
+    assert message.startswith("Slow query")
+    assert "params=(str" in message
+    assert "Secret Name" not in message
+
+
+async def test_query_headers(client: AsyncClient) -> None:
+    response = await client.get("/patients/batch?ids=1,2")
+    assert response.status_code == 200
+    assert int(response.headers["X-DB-Query-Count"]) >= 1
+    assert float(response.headers["X-DB-Time"]) > 0
+    assert "X-Process-Time" in response.headers
+    db, app, total = response.headers["Server-Timing"].split(", ")
+    assert db.startswith("db;dur=") and db.endswith(' queries"')
+    assert app.startswith("app;dur=") and total.startswith("total;dur=")
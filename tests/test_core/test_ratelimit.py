@@ -0,0 +1,163 @@
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+from httpx import AsyncClient
+from starlette.types import Message, Receive, Scope, Send
+
+from app.config import settings
+from app.core.ratelimit import MemoryStore, RateLimiter, rate_limiter
+from app.middlewares import RateLimitMiddleware, rate_limit_key
+
+pytestmark = pytest.mark.asyncio
+
+
+class TestMemoryStore:
+    async def test_bucket_empties_then_refills(self) -> None:
+        store = MemoryStore()
+        with patch("app.core.ratelimit.time.monotonic", return_value=100.0):
+            first = await store.take("k", capacity=2, per_second=0.5)
+            second = await store.take("k", capacity=2, per_second=0.5)
+            third = await store.take("k", capacity=2, per_second=0.5)
+
+        assert (first.allowed, first.remaining, first.reset) == (True, 1, 2)
+        assert (second.allowed, second.remaining, second.reset) == (True, 0, 4)
+        assert (third.allowed, third.retry_after) == (False, 2)
+
+        with patch("app.core.ratelimit.time.monotonic", return_value=102.0):
+            assert (await store.take("k", capacity=2, per_second=0.5)).allowed
+
+    async def test_keys_are_independent_and_bounded(self) -> None:
+        store = MemoryStore(maxsize=2)
+        for key in ("a", "b", "c"):
+            await store.take(key, capacity=1, per_second=0.001)
+
+        assert not (await store.take("c", capacity=1, per_second=0.001)).allowed
+        # "a" was evicted, so it starts with a full bucket again
+        assert (await store.take("a", capacity=1, per_second=0.001)).allowed
+
+
+async def test_unlimited_group() -> None:
+    limiter = RateLimiter(MemoryStore(), {"summary": 1, "read": 0}, window=60)
+    assert await limiter.check("read", "ip:1.2.3.4") is None
+    assert await limiter.check("summary", "ip:1.2.3.4") is not None
+
+
+async def test_keys_share_the_budget_of_their_ip() -> None:
+    store = MemoryStore()
+    limiter = RateLimiter(store, {"summary": 1}, window=60, keys_per_ip=2)
+    decisions = [
+        await limiter.check("summary", f"key:{n}", "ip:1.2.3.4") for n in range(3)
+    ]
+    assert [d.allowed for d in decisions if d] == [True, True, False]
+    # The rejected key was not given a bucket of its own
+    assert "summary:key:2" not in store._buckets
+    other = await limiter.check("summary", "key:0", "ip:5.6.7.8")
+    assert other is not None and not other.allowed  # key:0 already spent
+
+
+async def test_rejections_describe_the_client_budget() -> None:
+    store = MemoryStore()
+    limiter = RateLimiter(store, {"summary": 1}, window=60, keys_per_ip=2)
+    with patch("app.core.ratelimit.time.monotonic", return_value=100.0):
+        assert await limiter.check("summary", "key:0", "ip:1.2.3.4")
+        # Rejected by its own bucket: the IP token is given back
+        rejected = await limiter.check("summary", "key:0", "ip:1.2.3.4")
+        assert rejected is not None and not rejected.allowed
+        assert store._buckets["summary:ip:1.2.3.4"][0] == 1
+        assert (await limiter.check("summary", "key:1", "ip:1.2.3.4")).allowed
+        # Rejected by the IP bucket, in the terms of the client's policy
+        rejected = await limiter.check("summary", "key:2", "ip:1.2.3.4")
+    assert rejected is not None and not rejected.allowed
+    assert (rejected.limit, rejected.remaining, rejected.retry_after) == (1, 0, 30)
+
+
+def make_scope(path: str, headers: list[tuple[bytes, bytes]] | None = None) -> Any:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "headers": headers or [],
+        "client": ("10.0.0.1", 1234),
+    }
+
+
+async def test_rate_limit_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    headers = [(b"x-api-key", b"integration-1")]
+    assert rate_limit_key(make_scope("/", headers)) == "ip:10.0.0.1"
+
+    monkeypatch.setattr(settings, "rate_limit_key_header", "X-API-Key")
+    assert rate_limit_key(make_scope("/", headers)) == "key:integration-1"
+    assert rate_limit_key(make_scope("/")) == "ip:10.0.0.1"
+
+
+async def test_middleware_rejects_before_the_app() -> None:
+    calls = 0
+
+    async def app(scope: Scope, receive: Receive, send: Send) -> None:
+        nonlocal calls
+        calls += 1
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    sent: list[Message] = []
+
+    async def send(message: Message) -> None:
+        sent.append(message)
+
+    limiter = RateLimiter(MemoryStore(), {"summary": 1}, window=60)
+    middleware = RateLimitMiddleware(app, limiter)
+    for _ in range(2):
+        await middleware(make_scope("/patients/1/summary"), receive, send)
+    await middleware(make_scope("/health"), receive, send)
+
+    allowed, rejected, health = (m for m in sent if "status" in m)
+    assert calls == 2
+    assert allowed["status"] == 200
+    assert (b"ratelimit-limit", b"1") in allowed["headers"]
+    assert (b"ratelimit-remaining", b"0") in allowed["headers"]
+    assert (b"ratelimit-reset", b"60") in allowed["headers"]
+    assert (b"ratelimit-policy", b"1;w=60") in allowed["headers"]
+    assert rejected["status"] == 429
+    assert (b"retry-after", b"60") in rejected["headers"]
+    assert not any(name.startswith(b"ratelimit") for name, _ in health["headers"])
+
+
+async def test_summary_is_rate_limited_per_client(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "rate_limit_key_header", "X-API-Key")
+    limit = settings.rate_limits["summary"]
+    for _ in range(limit):
+        response = await client.get(
+            "/patients/999/summary", headers={"X-API-Key": "noisy"}
+        )
+        assert response.status_code == 404
+
+    response = await client.get("/patients/999/summary", headers={"X-API-Key": "noisy"})
+    assert response.status_code == 429
+    assert response.headers["RateLimit-Remaining"] == "0"
+    assert int(response.headers["Retry-After"]) > 0
+
+    other = await client.get("/patients/999/summary", headers={"X-API-Key": "quiet"})
+    assert other.status_code == 404
+
+
+async def test_rotating_the_key_header_does_not_reset_the_budget(
+    client: AsyncClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "rate_limit_key_header", "X-API-Key")
+    # No tokens come back while the requests are made
+    monkeypatch.setattr(rate_limiter, "window", 1e9)
+    budget = settings.rate_limits["summary"] * settings.rate_limit_keys_per_ip
+    for n in range(budget):
+        response = await client.get(
+            "/patients/999/summary", headers={"X-API-Key": f"rotated-{n}"}
+        )
+        assert response.status_code == 404
+
+    response = await client.get("/patients/999/summary", headers={"X-API-Key": "new"})
+    assert response.status_code == 429
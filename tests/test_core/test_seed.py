@@ -1,7 +1,8 @@
-from datetime import datetime
+from datetime import date, datetime
 from unittest.mock import AsyncMock, MagicMock
 
 import pytest
+from sqlalchemy import Delete, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.seed import clear_database, seed_database
@@ -47,7 +48,9 @@ class TestSeedDatabase:
         self, mock_session: AsyncMock
     ) -> None:
         """Test that seeding is skipped when data exists and force=False."""
-        existing_patient = Patient(name="Existing Patient", date_of_birth="1990-01-01")
+        existing_patient = Patient(
+            name="Existing Patient", date_of_birth=date(1990, 1, 1)
+        )
         result = MagicMock()
         result.scalars.return_value.all.return_value = [existing_patient]
         mock_session.execute.return_value = result
@@ -61,14 +64,22 @@ class TestSeedDatabase:
         self, mock_session: AsyncMock
     ) -> None:
         """Test that force=True deletes existing data before seeding."""
-        existing_patient = Patient(name="Existing Patient", date_of_birth="1990-01-01")
+        existing_patient = Patient(
+            name="Existing Patient", date_of_birth=date(1990, 1, 1)
+        )
         result = MagicMock()
         result.scalars.return_value.all.return_value = [existing_patient]
         mock_session.execute.return_value = result
 
         await seed_database(mock_session, force=True)
 
-        mock_session.delete.assert_called_with(existing_patient)
+        mock_session.delete.assert_not_called()
+        tables = [
+            call.args[0].table.name
+            for call in mock_session.execute.call_args_list
+            if isinstance(call.args[0], Delete)
+        ]
+        assert tables == ["patient_notes", "patients"]
 
     @pytest.mark.asyncio
     async def test_seed_database_creates_five_patients(
@@ -147,23 +158,14 @@ class TestClearDatabase:
         self, mock_session: AsyncMock
     ) -> None:
         """Test that notes are deleted before patients."""
-        note = PatientNote(patient_id=1, content="Test", timestamp=datetime.now())
-        patient = Patient(name="Test", date_of_birth="1990-01-01")
-
-        notes_result = MagicMock()
-        notes_result.scalars.return_value.all.return_value = [note]
-
-        patients_result = MagicMock()
-        patients_result.scalars.return_value.all.return_value = [patient]
-
-        mock_session.execute.side_effect = [notes_result, patients_result]
-
         await clear_database(mock_session)
 
-        delete_calls = mock_session.delete.call_args_list
-        assert len(delete_calls) == 2
-        assert isinstance(delete_calls[0][0][0], PatientNote)
-        assert isinstance(delete_calls[1][0][0], Patient)
+        statements = [call.args[0] for call in mock_session.execute.call_args_list]
+        assert all(isinstance(statement, Delete) for statement in statements)
+        assert [statement.table.name for statement in statements] == [
+            "patient_notes",
+            "patients",
+        ]
 
     @pytest.mark.asyncio
     async def test_clear_database_commits_once(self, mock_session: AsyncMock) -> None:
@@ -177,27 +179,21 @@ class TestClearDatabase:
         mock_session.commit.assert_called_once()
 
     @pytest.mark.asyncio
-    async def test_clear_database_deletes_multiple_records(
-        self, mock_session: AsyncMock
-    ) -> None:
-        """Test clearing database with multiple patients and notes."""
-        notes = [
-            PatientNote(patient_id=1, content="Note 1", timestamp=datetime.now()),
-            PatientNote(patient_id=2, content="Note 2", timestamp=datetime.now()),
-        ]
+    async def test_clear_database_is_set_based(self, db_session: AsyncSession) -> None:
+        """Test that clearing never loads rows, whatever their number."""
         patients = [
-            Patient(name="Patient 1", date_of_birth="1990-01-01"),
-            Patient(name="Patient 2", date_of_birth="1991-02-02"),
+            Patient(name=f"Patient {i}", date_of_birth=date(1990, 1, 1))
+            for i in range(3)
         ]
-
-        notes_result = MagicMock()
-        notes_result.scalars.return_value.all.return_value = notes
-
-        patients_result = MagicMock()
-        patients_result.scalars.return_value.all.return_value = patients
-
-        mock_session.execute.side_effect = [notes_result, patients_result]
-
-        await clear_database(mock_session)
-
-        assert mock_session.delete.call_count == 4  # 2 notes + 2 patients
+        db_session.add_all(patients)
+        await db_session.flush()
+        db_session.add_all(
+            PatientNote(patient_id=patient.id, content="Note", timestamp=datetime.now())
+            for patient in patients
+        )
+        await db_session.commit()
+
+        await clear_database(db_session)
+
+        assert await db_session.scalar(select(func.count(Patient.id))) == 0
+        assert await db_session.scalar(select(func.count(PatientNote.id))) == 0
@@ -0,0 +1,34 @@
+import os
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+from app.config import settings
+from app.server import main, worker_count
+
+
+def test_worker_count_defaults_to_usable_cpus(monkeypatch: Any) -> None:
+    monkeypatch.setattr(settings, "web_concurrency", None)
+    assert worker_count() == len(os.sched_getaffinity(0))
+    monkeypatch.setattr(settings, "web_concurrency", 3)
+    assert worker_count() == 3
+
+
+def test_main_seeds_once_before_starting_workers(monkeypatch: Any) -> None:
+    monkeypatch.setattr(settings, "seed_database_on_startup", True)
+    monkeypatch.setattr(settings, "web_concurrency", 2)
+    # Restored after the test, main() sets them for the workers
+    for name in ("SEED_DATABASE_ON_STARTUP", "WEB_CONCURRENCY", "METRICS_DIR"):
+        monkeypatch.setenv(name, os.environ.get(name, ""))
+    seen: list[str] = []
+
+    with (
+        patch("app.server.seed_once", AsyncMock()) as seed_once,
+        patch("app.server.Supervisor") as supervisor,
+    ):
+        supervisor.return_value.run.side_effect = lambda: seen.append(
+            os.environ["SEED_DATABASE_ON_STARTUP"]
+        )
+        main()
+
+    seed_once.assert_awaited_once_with()
+    assert seen == ["false"]
@@ -0,0 +1,175 @@
+import asyncio
+from collections.abc import Generator
+from pathlib import Path
+
+import orjson
+import pytest
+from httpx import AsyncClient
+
+from app.config import settings
+from app.core import tracing
+from app.core.tracing import (
+    InMemoryExporter,
+    TracedORJSONResponse,
+    configure_tracing,
+    parse_traceparent,
+    span,
+    start_trace,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture
+def exporter() -> Generator[InMemoryExporter, None, None]:
+    configure_tracing("memory")
+    assert isinstance(tracing.exporter, InMemoryExporter)
+    yield tracing.exporter
+    configure_tracing(None)
+
+
+class TestTraceparent:
+    def test_parses_sampled_header(self) -> None:
+        header = f"00-{TRACE_ID}-{PARENT_ID}-01"
+        assert parse_traceparent(header) == (TRACE_ID, PARENT_ID, True)
+
+    def test_parses_unsampled_header(self) -> None:
+        header = f"00-{TRACE_ID}-{PARENT_ID}-00"
+        assert parse_traceparent(header) == (TRACE_ID, PARENT_ID, False)
+
+    @pytest.mark.parametrize(
+        "header",
+        [
+            None,
+            "",
+            "garbage",
+            f"01-{TRACE_ID}-{PARENT_ID}-01",
+            f"00-{'0' * 32}-{PARENT_ID}-01",
+            f"00-{TRACE_ID}-{'0' * 16}-01",
+            f"00-{TRACE_ID[:-1]}-{PARENT_ID}-01",
+        ],
+    )
+    def test_rejects_invalid_header(self, header: str | None) -> None:
+        assert parse_traceparent(header) is None
+
+
+class TestSpans:
+    def test_child_spans_nest_under_the_current_span(
+        self, exporter: InMemoryExporter
+    ) -> None:
+        with start_trace("root") as root:
+            with span("outer") as outer:
+                with span("inner") as inner:
+                    pass
+
+        assert outer is not None and inner is not None
+        assert [s.name for s in exporter.spans] == ["inner", "outer", "root"]
+        assert inner.parent_id == outer.span_id
+        assert outer.parent_id == root.span_id
+        assert {s.trace_id for s in exporter.spans} == {root.trace_id}
+
+    @pytest.mark.asyncio
+    async def test_context_propagates_to_tasks(
+        self, exporter: InMemoryExporter
+    ) -> None:
+        async def work(name: str) -> None:
+            with span(name):
+                await asyncio.sleep(0)
+
+        with start_trace("root") as root:
+            await asyncio.gather(work("a"), asyncio.create_task(work("b")))
+
+        children = [s for s in exporter.spans if s.name in ("a", "b")]
+        assert len(children) == 2
+        assert all(s.parent_id == root.span_id for s in children)
+
+    def test_continues_incoming_trace(self, exporter: InMemoryExporter) -> None:
+        with start_trace("root", f"00-{TRACE_ID}-{PARENT_ID}-01") as root:
+            pass
+
+        assert root.trace_id == TRACE_ID
+        assert root.parent_id == PARENT_ID
+        assert root.traceparent == f"00-{TRACE_ID}-{root.span_id}-01"
+
+    def test_unsampled_trace_is_not_exported(self, exporter: InMemoryExporter) -> None:
+        with start_trace("root", f"00-{TRACE_ID}-{PARENT_ID}-00"):
+            with span("child") as child:
+                assert child is None
+
+        assert exporter.spans == []
+
+    def test_sample_ratio(
+        self, exporter: InMemoryExporter, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        monkeypatch.setattr(settings, "trace_sample_ratio", 0.0)
+        with start_trace("root") as root:
+            pass
+
+        assert not root.sampled
+        assert exporter.spans == []
+
+    def test_error_status(self, exporter: InMemoryExporter) -> None:
+        with pytest.raises(KeyError):
+            with start_trace("root"):
+                with span("child"):
+                    raise KeyError("missing")
+
+        assert [(s.name, s.status) for s in exporter.spans] == [
+            ("child", "error"),
+            ("root", "error"),
+        ]
+        assert exporter.spans[0].attributes["error.type"] == "KeyError"
+
+    def test_no_span_outside_a_trace(self) -> None:
+        with span("orphan") as orphan:
+            assert orphan is None
+
+    def test_serialization_span(self, exporter: InMemoryExporter) -> None:
+        with start_trace("root"):
+            body = TracedORJSONResponse({"status": "ok"}).body
+
+        serialize = exporter.spans[0]
+        assert serialize.name == "serialize"
+        assert serialize.attributes["bytes"] == len(body)
+
+
+def test_file_exporter_writes_json_lines(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(settings, "trace_file", str(path))
+    configure_tracing("file")
+    with start_trace("root", answer=42):
+        pass
+    configure_tracing(None)
+
+    (line,) = path.read_text().splitlines()
+    exported = orjson.loads(line)
+    assert exported["name"] == "root"
+    assert exported["attributes"] == {"answer": 42}
+    assert exported["end_ns"] >= exported["start_ns"]
+
+
+def test_unknown_exporter() -> None:
+    with pytest.raises(ValueError):
+        configure_tracing("zipkin")
+
+
+@pytest.mark.asyncio
+async def test_request_trace(client: AsyncClient, exporter: InMemoryExporter) -> None:
+    response = await client.get(
+        "/patients/999", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+    )
+    assert response.status_code == 404
+
+    root = exporter.spans[-1]
+    assert root.name == "GET /patients/{patient_id}"
+    assert root.trace_id == TRACE_ID
+    assert root.parent_id == PARENT_ID
+    assert root.attributes["http.status_code"] == 404
+
+    queries = [s for s in exporter.spans if s.name == "db.query"]
+    assert queries
+    assert all(s.trace_id == TRACE_ID for s in queries)
+    assert all("999" not in s.attributes["db.statement"] for s in queries)
@@ -1,4 +1,4 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
@@ -9,7 +9,7 @@ from app.llm.backends.openai import OpenAIProvider
 class TestOpenAIProvider:
     def test_openai_provider_initialization(self) -> None:
         with (
-            patch("app.llm.backends.openai.OpenAI") as mock_openai,
+            patch("openai.AsyncOpenAI") as mock_openai,
             patch("app.config.settings.openai_api_key", "test_api_key"),
         ):
             mock_openai.return_value = MagicMock()
@@ -25,19 +25,21 @@ class TestOpenAIProvider:
     @pytest.mark.asyncio
     async def test_generate_summary_success(self) -> None:
         with (
-            patch("app.llm.backends.openai.OpenAI") as mock_openai,
+            patch("openai.AsyncOpenAI") as mock_openai,
             patch("app.config.settings.openai_api_key", "test_api_key"),
         ):
             mock_client = MagicMock()
-            mock_client.chat.completions.create.return_value = MagicMock(
-                choices=[MagicMock(message=MagicMock(content="Test summary"))]
+            mock_client.chat.completions.create = AsyncMock(
+                return_value=MagicMock(
+                    choices=[MagicMock(message=MagicMock(content="Test summary"))]
+                )
             )
             mock_openai.return_value = mock_client
 
             provider = OpenAIProvider()
             summary = await provider.generate_summary("Test prompt")
             assert summary == "Test summary"
-            mock_client.chat.completions.create.assert_called_once_with(
+            mock_client.chat.completions.create.assert_awaited_once_with(
                 model=settings.llm_model,
                 messages=[
                     {
@@ -46,4 +48,5 @@ class TestOpenAIProvider:
                     },
                     {"role": "user", "content": "Test prompt"},
                 ],
+                timeout=settings.llm_timeout,
             )
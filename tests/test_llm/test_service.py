@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date
 from typing import Generator
 from unittest.mock import AsyncMock, MagicMock, patch
 
@@ -43,34 +43,41 @@ class TestLLMService:
 
     def test_calculate_age(self) -> None:
         service = LLMService()
-        age = service._calculate_age("2000-01-01")
-        today = datetime.now()
+        age = service._calculate_age(date(2000, 1, 1))
+        today = date.today()
         assert isinstance(age, int)
         assert age == today.year - 2000
 
+    def test_calculate_age_before_birthday(self) -> None:
+        service = LLMService()
+        today = date.today()
+        birthday = date(today.year - 30, 12, 31)
+        expected = 30 if today == date(today.year, 12, 31) else 29
+        assert service._calculate_age(birthday) == expected
+
     def test_build_prompt(self) -> None:
         service = LLMService()
         notes = [
             {"timestamp": "2023-10-01", "content": "Patient is recovering well."},
             {"timestamp": "2023-10-15", "content": "No signs of infection."},
         ]
-        prompt = service._build_prompt("John Doe", "1990-05-20", notes)
+        prompt = service._build_prompt("John Doe", date(1990, 5, 20), notes)
 
         assert prompt == PATIENT_NOTES_SUMMARY_PROMPT.format(
             patient_name="John Doe",
-            age=service._calculate_age("1990-05-20"),
-            date_of_birth="1990-05-20",
+            age=service._calculate_age(date(1990, 5, 20)),
+            date_of_birth=date(1990, 5, 20),
             notes_text=f"Note 1 ({notes[0]['timestamp']}):\n{notes[0]['content']}\n\nNote 2 ({notes[1]['timestamp']}):\n{notes[1]['content']}",
         )
 
     def test_build_prompt_no_notes(self) -> None:
         service = LLMService()
-        prompt = service._build_prompt("Jane Doe", "1985-12-10", [])
+        prompt = service._build_prompt("Jane Doe", date(1985, 12, 10), [])
 
         assert prompt == PATIENT_NOTES_SUMMARY_PROMPT.format(
             patient_name="Jane Doe",
-            age=service._calculate_age("1985-12-10"),
-            date_of_birth="1985-12-10",
+            age=service._calculate_age(date(1985, 12, 10)),
+            date_of_birth=date(1985, 12, 10),
             notes_text="",
         )
 
@@ -80,7 +87,9 @@ class TestLLMService:
     ) -> None:
         assert isinstance(mock_llm_service, MagicMock)
         service = LLMService()
-        summary = await service.generate_patient_summary("John Doe", "1990-01-01", [])
+        summary = await service.generate_patient_summary(
+            "John Doe", date(1990, 1, 1), []
+        )
         assert summary == "No medical notes available for this patient."
         mock_llm_service.return_value.assert_not_called()
 
@@ -97,7 +106,7 @@ class TestLLMService:
             {"timestamp": "2023-10-01", "content": "Patient is recovering well."},
         ]
         summary = await service.generate_patient_summary(
-            "John Doe", "1990-05-20", notes
+            "John Doe", date(1990, 5, 20), notes
         )
         assert summary == "Generated summary"
         mock_llm_service.return_value.generate_summary.assert_awaited_once()
@@ -117,7 +126,7 @@ class TestLLMService:
         with pytest.raises(
             SummaryGenerationError, match="Failed to generate patient summary"
         ) as exc:
-            await service.generate_patient_summary("John Doe", "1990-05-20", notes)
+            await service.generate_patient_summary("John Doe", date(1990, 5, 20), notes)
             exc_info = exc.value.__cause__
             assert str(exc_info) == "LLM error"
         mock_llm_service.return_value.generate_summary.assert_awaited_once()
@@ -1,8 +1,17 @@
 """Tests for FastAPI main application."""
 
+import os
+import subprocess
+import sys
+from pathlib import Path
+
 import pytest
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
 from httpx import AsyncClient
 
+from app.main import app
+
 
 @pytest.mark.asyncio
 async def test_health_check(client: AsyncClient) -> None:
@@ -10,3 +19,48 @@ async def test_health_check(client: AsyncClient) -> None:
     response = await client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
+
+
+def test_default_response_class_is_orjson() -> None:
+    """Test routes without an explicit response class render with orjson."""
+    route = next(r for r in app.routes if getattr(r, "path", None) == "/patients/")
+    assert issubclass(app.router.default_response_class, ORJSONResponse)
+    assert isinstance(route, APIRoute)
+    assert route.response_class is app.router.default_response_class
+
+
+# Imported first in the same interpreter; app.main's own cost is then
+# measured against them, which keeps the check independent of machine speed
+BASELINE_MODULES = ["fastapi", "sqlalchemy.ext.asyncio"]
+# app.main cost about 0.35x the baseline on Python 3.11 (about 1.1x while
+# openai was imported eagerly); raise it only with a reason in the commit message
+IMPORT_BUDGET_RATIO = 0.75
+# Loaded on first use, never when the app starts
+LAZY_MODULES = ["openai"]
+
+
+def test_import_time_budget() -> None:
+    """Test `import app.main` stays within budget and skips lazy modules."""
+    code = (
+        f"import sys, {', '.join(BASELINE_MODULES)}; import app.main; "
+        f"print([m for m in {LAZY_MODULES} if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    assert result.stdout.strip() == "[]"
+    # Lines read "import time: self [us] | cumulative | module"
+    cumulative = {
+        module.strip(): int(micros)
+        for _, micros, module in (
+            line.split("|") for line in result.stderr.splitlines() if "|" in line
+        )
+        if micros.strip().isdigit()
+    }
+    baseline = sum(cumulative[module] for module in BASELINE_MODULES)
+    assert cumulative["app.main"] < baseline * IMPORT_BUDGET_RATIO
@@ -1,3 +1,5 @@
+from datetime import date
+
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -9,7 +11,7 @@ async def sample_patient(db_session: AsyncSession) -> Patient:
     """Create a sample patient for testing."""
     patient = Patient(
         name="John Doe",
-        date_of_birth="1990-01-15",
+        date_of_birth=date(1990, 1, 15),
     )
     db_session.add(patient)
     await db_session.commit()
@@ -5,6 +5,9 @@ import pytest
 from fastapi_pagination import Params, set_params
 from httpx import AsyncClient
 
+from app.schemas.notes import NoteRead
+from app.schemas.pagination import Page, TotalMode
+
 pytestmark = pytest.mark.asyncio
 
 
@@ -65,34 +68,71 @@ class TestListPatientsNotesRoute:
     ) -> None:
         set_params(Params(size=10, page=1))
         patient_id = 1
-        mock_service.get_patient_notes.return_value = {
-            "items": [
-                {
-                    "id": 1,
-                    "patient_id": patient_id,
-                    "content": "Note 1",
-                    "created_at": "2024-01-01T12:00:00",
-                    "timestamp": "2024-01-01T12:00:00",
-                },
-                {
-                    "id": 2,
-                    "patient_id": patient_id,
-                    "content": "Note 2",
-                    "created_at": "2024-01-02T12:00:00",
-                    "timestamp": "2024-01-02T12:00:00",
-                },
-            ],
-            "total": 2,
-            "page": 1,
-            "size": 50,
-            "pages": 1,
-        }
+        mock_service.get_notes_version.return_value = (2, 2)
+        mock_service.get_patient_notes.return_value = Page[NoteRead].model_validate(
+            {
+                "items": [
+                    {
+                        "id": 1,
+                        "patient_id": patient_id,
+                        "content": "Note 1",
+                        "created_at": "2024-01-01T12:00:00",
+                        "timestamp": "2024-01-01T12:00:00",
+                    },
+                    {
+                        "id": 2,
+                        "patient_id": patient_id,
+                        "content": "Note 2",
+                        "created_at": "2024-01-02T12:00:00",
+                        "timestamp": "2024-01-02T12:00:00",
+                    },
+                ],
+                "total": 2,
+                "page": 1,
+                "size": 50,
+                "pages": 1,
+            }
+        )
         response = await client_with_mock_note_service.get(
             f"/patients/{patient_id}/notes/"
         )
         assert response.status_code == 200
         assert isinstance(response.json(), dict)
-        mock_service.get_patient_notes.assert_awaited_once_with(patient_id, None)
+        mock_service.get_patient_notes.assert_awaited_once_with(
+            patient_id, None, TotalMode.exact
+        )
+
+    async def test_list_patient_notes_not_modified(
+        self, client_with_mock_note_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        patient_id = 1
+        mock_service.get_notes_version.return_value = (0, None)
+        mock_service.get_patient_notes.return_value = Page[NoteRead](
+            items=[], total=0, page=1, size=50, pages=0, has_next=False
+        )
+        response = await client_with_mock_note_service.get(
+            f"/patients/{patient_id}/notes/"
+        )
+        etag = response.headers["etag"]
+        mock_service.get_patient_notes.reset_mock()
+
+        response = await client_with_mock_note_service.get(
+            f"/patients/{patient_id}/notes/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        mock_service.get_patient_notes.assert_not_awaited()
+
+        mock_service.get_notes_version.return_value = (1, 7)
+        response = await client_with_mock_note_service.get(
+            f"/patients/{patient_id}/notes/", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+
+        mock_service.get_notes_version.return_value = (0, None)
+        response = await client_with_mock_note_service.get(
+            f"/patients/{patient_id}/notes/?size=10", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
 
 
 class TestDeletePatientNoteRoute:
@@ -114,3 +154,60 @@ class TestDeletePatientNoteRoute:
         assert response.status_code == 204
         mock_service.get_note.assert_awaited_once_with(note_id)
         mock_service.delete_note.assert_awaited_once_with(note_id)
+
+
+class TestSearchNotesRoutes:
+    async def test_search_patient_notes(
+        self, client_with_mock_note_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        patient_id = 1
+        mock_service.search_notes.return_value = {
+            "items": [
+                {
+                    "id": 1,
+                    "patient_id": patient_id,
+                    "content": "Chest pain reported",
+                    "created_at": "2024-01-01T12:00:00",
+                    "timestamp": "2024-01-01T12:00:00",
+                    "rank": 0.1,
+                    "snippet": "<b>Chest</b> <b>pain</b> reported",
+                }
+            ],
+            "next_cursor": None,
+        }
+        response = await client_with_mock_note_service.get(
+            f"/patients/{patient_id}/notes/search", params={"q": "chest pain"}
+        )
+        assert response.status_code == 200
+        assert response.json()["items"][0]["snippet"].startswith("<b>Chest</b>")
+        mock_service.search_notes.assert_awaited_once_with(
+            "chest pain",
+            patient_id=patient_id,
+            start=None,
+            end=None,
+            cursor=None,
+            limit=20,
+        )
+
+    async def test_search_notes_global(
+        self, client_with_mock_note_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.search_notes.return_value = {"items": [], "next_cursor": None}
+        response = await client_with_mock_note_service.get(
+            "/notes/search", params={"q": "fever", "limit": 5}
+        )
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "next_cursor": None}
+        mock_service.search_notes.assert_awaited_once_with(
+            "fever", start=None, end=None, cursor=None, limit=5
+        )
+
+    async def test_search_notes_invalid_cursor(
+        self, client_with_mock_note_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.search_notes.side_effect = ValueError("Invalid search cursor")
+        response = await client_with_mock_note_service.get(
+            "/notes/search", params={"q": "fever", "cursor": "bogus"}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid search cursor"
@@ -2,10 +2,13 @@ from datetime import datetime, timezone
 
 import pytest
 from fastapi_pagination import Params, set_params
+from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.models.notes import PatientNote
 from app.models.patients import Patient
 from app.services.notes import NoteService
+from app.services.patients import PatientService, patient_cache
 
 pytestmark = pytest.mark.asyncio
 
@@ -40,6 +43,22 @@ async def test_get_patient_notes(
     assert all(note.patient_id == sample_patient.id for note in notes.items)
 
 
+async def test_get_patient_notes_of_soft_deleted_patient(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    set_params(Params(size=10, page=1))
+    service = NoteService(db_session)
+    await service.create_note(
+        patient_id=sample_patient.id, content="Note", timestamp=datetime.now()
+    )
+    sample_patient.deleted_at = datetime.now(timezone.utc)
+    await db_session.commit()
+
+    notes = await service.get_patient_notes(patient_id=sample_patient.id)
+    assert notes.items == []
+    assert notes.total == 0
+
+
 async def test_get_note_by_id(
     db_session: AsyncSession, sample_patient: Patient
 ) -> None:
@@ -68,6 +87,21 @@ async def test_create_note_invalid_patient(db_session: AsyncSession) -> None:
         assert str(e) == "Patient with id 9999 not found"
 
 
+async def test_create_note_for_patient_deleted_by_another_worker(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    await PatientService(db_session).get_patient(sample_patient.id)
+    # Another worker's delete does not invalidate this process's cache
+    await db_session.execute(delete(Patient).where(Patient.id == sample_patient.id))
+    await db_session.commit()
+    assert await patient_cache.get(sample_patient.id) is not None
+
+    with pytest.raises(ValueError, match="not found"):
+        await NoteService(db_session).create_note(
+            patient_id=sample_patient.id, content="Late", timestamp=datetime.now()
+        )
+
+
 async def test_get_patient_notes_sorted(
     db_session: AsyncSession, sample_patient: Patient
 ) -> None:
@@ -157,3 +191,130 @@ async def test_get_latests_patient_notes(
     notes = await service.get_latests_patient_notes(patient_id=sample_patient.id)
     assert len(notes) == 5
     assert all(note.patient_id == sample_patient.id for note in notes)
+
+
+async def test_search_notes(db_session: AsyncSession, sample_patient: Patient) -> None:
+    service = NoteService(db_session)
+    for content in [
+        "Patient reports chest pain after exercise.",
+        "Chest pain resolved, blood pressure normal.",
+        "Routine follow-up, no complaints.",
+    ]:
+        await service.create_note(
+            patient_id=sample_patient.id, content=content, timestamp=datetime.now()
+        )
+
+    results = await service.search_notes("chest pain")
+    assert len(results["items"]) == 2
+    assert results["next_cursor"] is None
+    assert all("<b>" in item["snippet"] for item in results["items"])
+    ranks = [item["rank"] for item in results["items"]]
+    assert ranks == sorted(ranks, reverse=True)
+
+    results = await service.search_notes("chest", patient_id=sample_patient.id + 1)
+    assert results["items"] == []
+
+
+async def test_search_notes_date_filter(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = NoteService(db_session)
+    for day in (1, 2, 3):
+        await service.create_note(
+            patient_id=sample_patient.id,
+            content=f"Headache on day {day}",
+            timestamp=datetime(2023, 1, day, tzinfo=timezone.utc),
+        )
+
+    results = await service.search_notes(
+        "headache",
+        patient_id=sample_patient.id,
+        start=datetime(2023, 1, 2, tzinfo=timezone.utc),
+        end=datetime(2023, 1, 3, tzinfo=timezone.utc),
+    )
+    assert [item["content"] for item in results["items"]] == ["Headache on day 2"]
+
+
+async def test_search_notes_keyset_pagination(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = NoteService(db_session)
+    for i in range(5):
+        await service.create_note(
+            patient_id=sample_patient.id,
+            content=f"Fever recorded {' fever' * i}",
+            timestamp=datetime.now(),
+        )
+
+    seen: list[int] = []
+    cursor = None
+    while True:
+        page = await service.search_notes("fever", cursor=cursor, limit=2)
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+
+async def test_search_notes_invalid_cursor(db_session: AsyncSession) -> None:
+    service = NoteService(db_session)
+    with pytest.raises(ValueError, match="Invalid search cursor"):
+        await service.search_notes("fever", cursor="not-a-cursor")
+
+
+async def test_get_notes_version(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = NoteService(db_session)
+    assert await service.get_notes_version(sample_patient.id) == (0, None)
+
+    note = await service.create_note(
+        patient_id=sample_patient.id, content="Note", timestamp=datetime.now()
+    )
+    assert await service.get_notes_version(sample_patient.id) == (1, note.id)
+
+    await PatientService(db_session).delete_patient(sample_patient.id)
+    assert await service.get_notes_version(sample_patient.id) == (0, None)
+
+
+async def test_patient_note_stats(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = NoteService(db_session)
+    patients = PatientService(db_session)
+    first = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    last = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+    patient = await patients.get_patient(sample_patient.id)
+    assert patient is not None
+    assert patient.notes_count == 0
+    assert patient.last_note_at is None
+
+    note = await service.create_note(sample_patient.id, "Latest", last)
+    db_session.add_all(
+        PatientNote(patient_id=sample_patient.id, content="Older", timestamp=ts)
+        for ts in (first, datetime(2024, 2, 1, tzinfo=timezone.utc))
+    )
+    await db_session.commit()
+    await patient_cache.invalidate(sample_patient.id)
+
+    patient = await patients.get_patient(sample_patient.id)
+    assert patient is not None
+    assert patient.notes_count == 3
+    assert patient.first_note_at == first
+    assert patient.last_note_at == last
+
+    await service.delete_note(note.id)
+    patient = await patients.get_patient(sample_patient.id)
+    assert patient is not None
+    assert patient.notes_count == 2
+    assert patient.last_note_at == datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+    await service.delete_patient_notes(sample_patient.id)
+    patient = await patients.get_patient(sample_patient.id)
+    assert patient is not None
+    assert patient.notes_count == 0
+    assert patient.first_note_at is None
@@ -1,3 +1,5 @@
+from datetime import date
+
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -9,7 +11,7 @@ async def sample_patient(db_session: AsyncSession) -> Patient:
     """Create a sample patient for testing."""
     patient = Patient(
         name="John Doe",
-        date_of_birth="1990-01-15",
+        date_of_birth=date(1990, 1, 15),
     )
     db_session.add(patient)
     await db_session.commit()
@@ -23,15 +25,15 @@ async def sample_patients(db_session: AsyncSession) -> list[Patient]:
     patients = [
         Patient(
             name="Alice Johnson",
-            date_of_birth="1985-03-20",
+            date_of_birth=date(1985, 3, 20),
         ),
         Patient(
             name="Bob Smith",
-            date_of_birth="1992-07-10",
+            date_of_birth=date(1992, 7, 10),
         ),
         Patient(
             name="Carol Williams",
-            date_of_birth="1988-11-05",
+            date_of_birth=date(1988, 11, 5),
         ),
     ]
     db_session.add_all(patients)
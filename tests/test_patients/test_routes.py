@@ -1,9 +1,18 @@
-from unittest.mock import Mock
+from collections.abc import AsyncIterator
+from datetime import date, datetime
+from unittest.mock import Mock, patch
 
 import pytest
 from httpx import AsyncClient
+from sqlalchemy.exc import IntegrityError
 
+from app.config import settings
 from app.models.patients import Patient
+from app.schemas.notes import NoteRead
+from app.schemas.pagination import TotalMode
+from app.schemas.patients import PatientWithNotes
+from app.services.patients import PatientDeletion
+from app.services.sharded import DuplicateExternalIdError
 
 pytestmark = pytest.mark.asyncio
 
@@ -18,16 +27,19 @@ class TestPatientsGetRoutes:
                     id=1,
                     name="John Doe",
                     date_of_birth="1990-01-15",
+                    notes_count=0,
                 ),
                 Patient(
                     id=2,
                     name="Jane Smith",
                     date_of_birth="1985-07-30",
+                    notes_count=0,
                 ),
                 Patient(
                     id=3,
                     name="Alice Johnson",
                     date_of_birth="1978-11-22",
+                    notes_count=0,
                 ),
             ],
             "total": 3,
@@ -39,9 +51,84 @@ class TestPatientsGetRoutes:
         assert response.status_code == 200
         assert isinstance(response.json(), dict)
         mock_service.list_patients.assert_awaited_once_with(
-            sort_by=None, name_filter=None
+            sort_by=None,
+            name_filter=None,
+            total_mode=TotalMode.exact,
+            notes_limit=None,
+            born_from=None,
+            born_to=None,
+            min_age=None,
+            max_age=None,
         )
 
+    async def test_get_patients_by_age(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.list_patients.return_value = {
+            "items": [],
+            "total": 0,
+            "page": 1,
+            "size": 50,
+            "pages": 0,
+        }
+        response = await client_with_mock_patient_service.get(
+            "/patients/?min_age=18&max_age=65&born_from=1950-01-01"
+        )
+        assert response.status_code == 200
+        kwargs = mock_service.list_patients.await_args.kwargs
+        assert kwargs["min_age"] == 18
+        assert kwargs["max_age"] == 65
+        assert kwargs["born_from"] == date(1950, 1, 1)
+
+        response = await client_with_mock_patient_service.get(
+            "/patients/?min_age=65&max_age=18"
+        )
+        assert response.status_code == 400
+
+    async def test_get_patients_batch(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.get_patients.return_value = {
+            "items": [
+                Patient(id=2, name="Jane", date_of_birth="1990-01-15", notes_count=0)
+            ],
+            "missing": [5],
+        }
+        response = await client_with_mock_patient_service.get(
+            "/patients/batch?ids=2,5&ids=7"
+        )
+        assert response.status_code == 200
+        assert response.json()["missing"] == [5]
+        assert [p["id"] for p in response.json()["items"]] == [2]
+        mock_service.get_patients.assert_awaited_once_with([2, 5, 7])
+
+        response = await client_with_mock_patient_service.post(
+            "/patients/batch", json={"ids": [7, 2]}
+        )
+        assert response.status_code == 200
+        mock_service.get_patients.assert_awaited_with([7, 2])
+
+    async def test_get_patients_batch_invalid(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        response = await client_with_mock_patient_service.get("/patients/batch?ids=a")
+        assert response.status_code == 422
+        response = await client_with_mock_patient_service.post(
+            "/patients/batch", json={"ids": list(range(1, 1002))}
+        )
+        assert response.status_code == 413
+        response = await client_with_mock_patient_service.get(
+            f"/patients/batch?ids=1,{2**31}"
+        )
+        assert response.status_code == 422
+        response = await client_with_mock_patient_service.post(
+            "/patients/batch", json={"ids": [1, 2**31]}
+        )
+        assert response.status_code == 422
+        response = await client_with_mock_patient_service.get("/patients/batch?ids=0")
+        assert response.status_code == 422
+        mock_service.get_patients.assert_not_called()
+
     async def test_get_patient_by_id(
         self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
     ) -> None:
@@ -49,6 +136,7 @@ class TestPatientsGetRoutes:
             id=1,
             name="John Doe",
             date_of_birth="1990-01-15",
+            notes_count=0,
         )
         mock_service.get_patient.return_value = patient
         response = await client_with_mock_patient_service.get(f"/patients/{patient.id}")
@@ -58,6 +146,67 @@ class TestPatientsGetRoutes:
         assert response.json()["id"] == patient.id
         assert response.json()["name"] == patient.name
 
+    async def test_get_patient_not_modified(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.get_patient.return_value = Patient(
+            id=1,
+            name="John Doe",
+            date_of_birth="1990-01-15",
+            updated_at=datetime(2024, 1, 1, 12, 0),
+            notes_count=0,
+        )
+        response = await client_with_mock_patient_service.get("/patients/1")
+        etag = response.headers["etag"]
+
+        response = await client_with_mock_patient_service.get(
+            "/patients/1", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+
+        mock_service.get_patient.return_value.updated_at = datetime(2024, 1, 2)
+        response = await client_with_mock_patient_service.get(
+            "/patients/1", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+
+    async def test_get_patient_with_notes(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.get_patient_with_notes.return_value = PatientWithNotes(
+            id=1,
+            name="John Doe",
+            date_of_birth="1990-01-15",
+            notes=[
+                NoteRead(
+                    id=7,
+                    patient_id=1,
+                    content="Follow-up",
+                    timestamp=datetime(2024, 1, 1, 12, 0),
+                    created_at=datetime(2024, 1, 1, 12, 0),
+                )
+            ],
+        )
+        response = await client_with_mock_patient_service.get(
+            "/patients/1?include=notes&notes_limit=3"
+        )
+        assert response.status_code == 200
+        mock_service.get_patient_with_notes.assert_awaited_once_with(1, 3)
+        mock_service.get_patient.assert_not_called()
+        assert [note["id"] for note in response.json()["notes"]] == [7]
+
+    async def test_get_patient_include_unknown(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        response = await client_with_mock_patient_service.get(
+            "/patients/1?include=notes,visits"
+        )
+        assert response.status_code == 400
+        mock_service.get_patient.assert_not_called()
+
     async def test_get_patient_not_found(
         self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
     ) -> None:
@@ -76,16 +225,63 @@ class TestPatientsCreateRoutes:
             "name": "John Doe",
             "date_of_birth": "1990-01-15",
         }
-        mock_service.create_patient.return_value = Patient(id=1, **patient_data)
+        mock_service.create_patient.return_value = Patient(
+            id=1, notes_count=0, **patient_data
+        )
         response = await client_with_mock_patient_service.post(
             "/patients/", json=patient_data
         )
-        mock_service.create_patient.assert_awaited_once_with(patient_data)
+        mock_service.create_patient.assert_awaited_once_with(
+            {"name": "John Doe", "date_of_birth": date(1990, 1, 15)}
+        )
         assert response.status_code == 201
         assert response.json()["id"] == mock_service.create_patient.return_value.id
         assert response.json()["name"] == patient_data["name"]
         assert response.json()["date_of_birth"] == patient_data["date_of_birth"]
 
+    async def test_create_patient_duplicate_external_id(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.create_patient.side_effect = IntegrityError(
+            None, None, DuplicateExternalIdError()
+        )
+        response = await client_with_mock_patient_service.post(
+            "/patients/",
+            json={
+                "name": "John Doe",
+                "date_of_birth": "1990-01-15",
+                "external_id": "a",
+            },
+        )
+        assert response.status_code == 409
+        assert response.json()["detail"] == (
+            "A patient with this external_id already exists"
+        )
+
+    async def test_create_patient_other_integrity_errors_are_not_conflicts(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.create_patient.side_effect = IntegrityError(
+            None, None, Exception("not-null violation")
+        )
+        with pytest.raises(IntegrityError):
+            await client_with_mock_patient_service.post(
+                "/patients/", json={"name": "John Doe", "date_of_birth": "1990-01-15"}
+            )
+
+    async def test_create_patient_duplicate_external_id_in_database(
+        self, client: AsyncClient
+    ) -> None:
+        payload = {
+            "name": "John Doe",
+            "date_of_birth": "1990-01-15",
+            "external_id": "a",
+        }
+        response = await client.post("/patients/", json=payload)
+        assert response.status_code == 201
+        response = await client.post("/patients/", json=payload)
+        assert response.status_code == 409
+
     async def test_create_patient_invalid_data(
         self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
     ) -> None:
@@ -108,7 +304,10 @@ class TestPatientsCreateRoutes:
         }
         normalized_name = "John Doe"
         mock_service.create_patient.return_value = Patient(
-            id=1, name=normalized_name, date_of_birth=patient_data["date_of_birth"]
+            id=1,
+            name=normalized_name,
+            date_of_birth=patient_data["date_of_birth"],
+            notes_count=0,
         )
         response = await client_with_mock_patient_service.post(
             "/patients/", json=patient_data
@@ -116,7 +315,7 @@ class TestPatientsCreateRoutes:
         mock_service.create_patient.assert_awaited_once_with(
             {
                 "name": normalized_name,
-                "date_of_birth": patient_data["date_of_birth"],
+                "date_of_birth": date(1990, 1, 15),
             }
         )
         assert response.status_code == 201
@@ -185,12 +384,14 @@ class TestPatientsUpdateRoutes:
             "date_of_birth": "1983-04-12",
         }
         mock_service.update_patient.return_value = Patient(
-            id=patient_id, **updated_data
+            id=patient_id, notes_count=0, **updated_data
         )
         response = await client_with_mock_patient_service.put(
             f"/patients/{patient_id}", json=updated_data
         )
-        mock_service.update_patient.assert_awaited_once_with(patient_id, updated_data)
+        mock_service.update_patient.assert_awaited_once_with(
+            patient_id, {"name": "Bob Smith Jr.", "date_of_birth": date(1983, 4, 12)}
+        )
         assert response.status_code == 200
         assert response.json()["name"] == updated_data["name"]
 
@@ -205,7 +406,9 @@ class TestPatientsUpdateRoutes:
         response = await client_with_mock_patient_service.put(
             "/patients/999999", json=updated_data
         )
-        mock_service.update_patient.assert_awaited_once_with(999999, updated_data)
+        mock_service.update_patient.assert_awaited_once_with(
+            999999, {"name": "Non Existent", "date_of_birth": date(1970, 1, 1)}
+        )
         assert response.status_code == 404
 
 
@@ -232,6 +435,15 @@ class TestPatientsDeleteRoutes:
         mock_service.get_patient.assert_called_with(patient_id)
         assert get_response.status_code == 404
 
+    async def test_delete_large_patient_schedules_purge(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.delete_patient.return_value = PatientDeletion.soft
+        with patch("app.routes.patients.purge_deleted_patients") as mock_purge:
+            response = await client_with_mock_patient_service.delete("/patients/1")
+        assert response.status_code == 204
+        mock_purge.assert_awaited_once_with()
+
     async def test_delete_patient_not_found(
         self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
     ) -> None:
@@ -239,3 +451,132 @@ class TestPatientsDeleteRoutes:
         response = await client_with_mock_patient_service.delete("/patients/999999")
         mock_service.delete_patient.assert_awaited_once_with(999999)
         assert response.status_code == 404
+
+
+class TestPatientsBulkCreateRoutes:
+    async def test_bulk_create_json_array(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.bulk_create_patients.return_value = {
+            "ids": [1, 2],
+            "created": 2,
+            "updated": 0,
+        }
+        payload = [
+            {"name": "John Doe", "date_of_birth": "1990-01-15"},
+            {"name": "Jane Doe", "date_of_birth": "1991-02-16", "external_id": "a"},
+        ]
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk", json=payload
+        )
+        assert response.status_code == 201
+        assert response.json()["ids"] == [1, 2]
+        mock_service.bulk_create_patients.assert_awaited_once_with(
+            [
+                {
+                    "name": "John Doe",
+                    "date_of_birth": date(1990, 1, 15),
+                    "external_id": None,
+                },
+                {
+                    "name": "Jane Doe",
+                    "date_of_birth": date(1991, 2, 16),
+                    "external_id": "a",
+                },
+            ],
+            upsert=False,
+        )
+
+    async def test_bulk_create_ndjson(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        mock_service.bulk_create_patients.return_value = {
+            "ids": [1],
+            "created": 0,
+            "updated": 1,
+        }
+        body = (
+            b'{"name": "John Doe", "date_of_birth": "1990-01-15", "external_id": "a"}\n'
+        )
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk?upsert=true",
+            content=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == 201
+        mock_service.bulk_create_patients.assert_awaited_once_with(
+            [
+                {
+                    "name": "John Doe",
+                    "date_of_birth": date(1990, 1, 15),
+                    "external_id": "a",
+                }
+            ],
+            upsert=True,
+        )
+
+    async def test_bulk_create_invalid_record(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        body = (
+            b'{"name": "John Doe", "date_of_birth": "1990-01-15"}\n'
+            b'{"name": "Jane Doe", "date_of_birth": "1990-13-15"}\n'
+        )
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk",
+            content=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == ["body", 1, "date_of_birth"]
+        mock_service.bulk_create_patients.assert_not_called()
+
+    async def test_bulk_create_duplicate_external_id(
+        self, client_with_mock_patient_service: AsyncClient, mock_service: Mock
+    ) -> None:
+        payload = [
+            {"name": "John Doe", "date_of_birth": "1990-01-15", "external_id": "a"},
+            {"name": "Jane Doe", "date_of_birth": "1991-02-16", "external_id": "a"},
+        ]
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk", json=payload
+        )
+        assert response.status_code == 422
+        mock_service.bulk_create_patients.assert_not_called()
+
+    async def test_bulk_create_too_large_body(
+        self,
+        client_with_mock_patient_service: AsyncClient,
+        mock_service: Mock,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "max_bulk_body_size", 100)
+        payload = [{"name": "John Doe", "date_of_birth": "1990-01-15"}] * 5
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk", json=payload
+        )
+        assert response.status_code == 413
+        mock_service.bulk_create_patients.assert_not_called()
+
+    async def test_bulk_create_ndjson_stops_past_the_limit(
+        self,
+        client_with_mock_patient_service: AsyncClient,
+        mock_service: Mock,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(settings, "max_bulk_patients", 2)
+        sent: list[int] = []
+
+        async def body() -> AsyncIterator[bytes]:
+            for index in range(10):
+                sent.append(index)
+                yield b'{"name": "John Doe", "date_of_birth": "1990-01-15"}\n'
+
+        response = await client_with_mock_patient_service.post(
+            "/patients/bulk",
+            content=body(),
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.status_code == 413
+        assert len(sent) < 10
+        mock_service.bulk_create_patients.assert_not_called()
@@ -1,9 +1,29 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from typing import Any
+from unittest.mock import patch
+
 import pytest
 from fastapi_pagination import Params, set_params
+from sqlalchemy import event, func, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.core.db import postgres_db
+from app.core.pagination import Explain
+from app.models.notes import PatientNote
 from app.models.patients import Patient
-from app.services.patients import PatientService
+from app.schemas.pagination import TotalMode
+from app.schemas.patients import PatientCreate
+from app.services.patients import (
+    PatientDeletion,
+    PatientService,
+    _years_ago,
+    patient_cache,
+    patient_cache_ttl,
+)
+from app.services.purge import start_purge
 
 pytestmark = pytest.mark.asyncio
 
@@ -32,12 +52,80 @@ async def test_list_patients(
     assert dates == sorted(dates, reverse=True)
 
 
+async def test_list_patients_by_age(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    set_params(Params(size=10, page=1))
+    service = PatientService(db_session)
+    patients = await service.list_patients(
+        born_from=date(1985, 1, 1), born_to=date(1988, 12, 31), sort_by="name"
+    )
+    assert [p.name for p in patients.items] == ["Alice Johnson", "Carol Williams"]
+
+    youngest = max(patient.date_of_birth for patient in sample_patients)
+    today = date.today()
+    age = today.year - youngest.year
+    age -= (today.month, today.day) < (youngest.month, youngest.day)
+    patients = await service.list_patients(max_age=age)
+    assert [p.date_of_birth for p in patients.items] == [youngest]
+    patients = await service.list_patients(min_age=age + 1)
+    assert patients.total == len(sample_patients) - 1
+    patients = await service.list_patients(min_age=age, max_age=age)
+    assert patients.total == 1
+
+
+async def test_years_ago() -> None:
+    assert _years_ago(10, date(2024, 5, 17)) == date(2014, 5, 17)
+    assert _years_ago(1, date(2024, 2, 29)) == date(2023, 2, 28)
+
+
+async def test_list_patients_total_none(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    service = PatientService(db_session)
+    set_params(Params(size=2, page=1))
+    patients = await service.list_patients(total_mode=TotalMode.none)
+    assert patients.total is None
+    assert len(patients.items) == 2
+    assert patients.has_next is True
+
+    set_params(Params(size=2, page=2))
+    patients = await service.list_patients(total_mode=TotalMode.none)
+    assert len(patients.items) == 1
+    assert patients.has_next is False
+
+
+async def test_list_patients_total_estimate(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    set_params(Params(size=10, page=1))
+    service = PatientService(db_session)
+    patients = await service.list_patients(total_mode=TotalMode.estimate)
+    assert patients.total is not None and patients.total >= 0
+    assert len(patients.items) == len(sample_patients)
+
+    patients = await service.list_patients(
+        name_filter="Alice'); DROP TABLE patients; --", total_mode=TotalMode.estimate
+    )
+    assert patients.total is not None and patients.total >= 0
+    assert await db_session.scalar(select(func.count(Patient.id))) == len(
+        sample_patients
+    )
+
+
+async def test_estimate_binds_parameters() -> None:
+    query = select(Patient).where(Patient.name.ilike("%Alice's%"))
+    sql = str(Explain(query).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "Alice" not in sql
+
+
 async def test_create_patient(db_session: AsyncSession, patient_data: dict) -> None:
     service = PatientService(db_session)
-    patient = await service.create_patient(patient_data)
+    patient = await service.create_patient(PatientCreate(**patient_data).model_dump())
     assert patient.id is not None
     assert patient.name == "Jane Smith"
-    assert patient.date_of_birth == "1995-06-15"
+    assert patient.date_of_birth == date(1995, 6, 15)
 
 
 async def test_get_patient(db_session: AsyncSession, sample_patient: Patient) -> None:
@@ -46,14 +134,151 @@ async def test_get_patient(db_session: AsyncSession, sample_patient: Patient) ->
     assert fetched_patient is not None
     assert fetched_patient.id == sample_patient.id
     assert fetched_patient.name == "John Doe"
-    assert fetched_patient.date_of_birth == "1990-01-15"
+    assert fetched_patient.date_of_birth == date(1990, 1, 15)
+
+
+async def test_list_patients_with_notes(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    first, second, third = (patient.id for patient in sample_patients)
+    for patient in sample_patients[:2]:
+        db_session.add_all(
+            PatientNote(
+                patient_id=patient.id,
+                content=f"Note {i}",
+                timestamp=base + timedelta(days=i),
+            )
+            for i in range(3)
+        )
+    await db_session.commit()
+    db_session.expire_all()
+
+    statements: list[str] = []
+
+    def count(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = db_session.bind.sync_engine  # type: ignore[union-attr]
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        set_params(Params(size=10, page=1))
+        service = PatientService(db_session)
+        patients = await service.list_patients(sort_by="id", notes_limit=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    # Count, page and one query for the notes of the whole page
+    assert len(statements) == 3
+    assert (
+        statements[-1]
+        .rstrip()
+        .endswith("ORDER BY latest_notes.patient_id, latest_notes.timestamp DESC")
+    )
+    assert [patient.notes_count for patient in patients.items] == [3, 3, 0]
+    notes = {patient.id: patient.notes for patient in patients.items}
+    assert [n.content for n in notes[first]] == ["Note 2", "Note 1"]
+    assert [n.content for n in notes[second]] == ["Note 2", "Note 1"]
+    assert notes[third] == []
+
+
+async def test_list_patients_by_activity(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    least_active = sample_patients[0].id
+    for count, patient in enumerate(sample_patients[1:], start=1):
+        db_session.add_all(
+            PatientNote(patient_id=patient.id, content="Note", timestamp=base)
+            for _ in range(count)
+        )
+    await db_session.commit()
+    db_session.expire_all()
+
+    set_params(Params(size=10, page=1))
+    service = PatientService(db_session)
+    patients = await service.list_patients(sort_by="-notes_count")
+    assert [p.notes_count for p in patients.items] == [2, 1, 0]
+    patients = await service.list_patients(sort_by="-last_note_at")
+    assert patients.items[-1].id == least_active
+
+
+async def test_get_patient_with_notes(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = PatientService(db_session)
+    patient = await service.get_patient_with_notes(sample_patient.id, 5)
+    assert patient is not None
+    assert patient.id == sample_patient.id
+    assert patient.notes == []
+
+    assert await service.get_patient_with_notes(999999, 5) is None
+
+
+async def test_get_patient_is_cached(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    service = PatientService(db_session)
+    await service.get_patient(sample_patient.id)
+    await service.get_patient(sample_patient.id)
+    assert patient_cache.stats()["hits"] == 1
+
+    await service.update_patient(sample_patient.id, {"name": "Renamed"})
+    fetched_patient = await service.get_patient(sample_patient.id)
+    assert fetched_patient is not None
+    assert fetched_patient.name == "Renamed"
+
+
+async def test_get_patients(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    service = PatientService(db_session)
+    first, second, third = (patient.id for patient in sample_patients)
+    await service.get_patient(second)
+
+    statements: list[str] = []
+
+    def count(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = db_session.bind.sync_engine  # type: ignore[union-attr]
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        result = await service.get_patients([third, 999999, second, first, third])
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert [patient.id for patient in result["items"]] == [third, second, first]
+    assert result["missing"] == [999999]
+    assert len(statements) == 1
+    assert patient_cache.stats()["size"] == 3
+
+
+async def test_get_patient_bypass_cache(
+    db_session: AsyncSession, sample_patient: Patient
+) -> None:
+    await PatientService(db_session).get_patient(sample_patient.id)
+    service = PatientService(db_session, use_cache=False)
+    await service.get_patient(sample_patient.id)
+    assert patient_cache.stats()["hits"] == 0
+
+
+async def test_patient_cache_ttl_with_several_workers(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings, "patient_cache_ttl", 60.0)
+    monkeypatch.setattr(settings, "patient_cache_worker_ttl", 2.0)
+    monkeypatch.setattr(settings, "web_concurrency", None)
+    assert patient_cache_ttl() == 60.0
+    monkeypatch.setattr(settings, "web_concurrency", 4)
+    assert patient_cache_ttl() == 2.0
 
 
 async def test_update_patient(
     db_session: AsyncSession, sample_patient: Patient
 ) -> None:
     service = PatientService(db_session)
-    update_data = {"name": "Updated Name", "date_of_birth": "2000-01-01"}
+    update_data = {"name": "Updated Name", "date_of_birth": date(2000, 1, 1)}
     updated_patient = await service.update_patient(sample_patient.id, update_data)
     assert isinstance(updated_patient, sample_patient.__class__)
     assert updated_patient.id == sample_patient.id
@@ -66,6 +291,179 @@ async def test_delete_patient(
 ) -> None:
     service = PatientService(db_session)
     success = await service.delete_patient(sample_patient.id)
-    assert success is True
+    assert success == PatientDeletion.hard
     deleted_patient = await service.get_patient(sample_patient.id)
     assert deleted_patient is None
+    assert await service.delete_patient(sample_patient.id) is None
+
+
+async def test_delete_large_patient_is_purged_in_batches(
+    db_session: AsyncSession, sample_patient: Patient, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "patient_purge_threshold", 3)
+    db_session.add_all(
+        PatientNote(patient_id=sample_patient.id, content=f"Note {i}", timestamp=ts)
+        for i, ts in enumerate([datetime.now(timezone.utc)] * 5)
+    )
+    await db_session.commit()
+
+    service = PatientService(db_session)
+    assert await service.delete_patient(sample_patient.id) == PatientDeletion.soft
+    assert await service.get_patient(sample_patient.id) is None
+    set_params(Params(size=10, page=1))
+    assert (await service.list_patients()).total == 0
+
+    deletes: list[int] = []
+
+    def count(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if "DELETE FROM patient_notes" in statement:
+            deletes.append(1)
+
+    engine = db_session.bind.sync_engine  # type: ignore[union-attr]
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        purged = await service.purge_deleted_patients(batch_size=2)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert purged == [sample_patient.id]
+    # Batches of 2, 2 and 1, then an empty one
+    assert len(deletes) == 4
+    assert await db_session.scalar(select(func.count(PatientNote.id))) == 0
+    assert await db_session.get(Patient, sample_patient.id) is None
+
+
+async def test_purge_leaves_notes_locked_by_another_purge(
+    db_session: AsyncSession, sample_patient: Patient, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "patient_purge_threshold", 1)
+    db_session.add_all(
+        PatientNote(patient_id=sample_patient.id, content=f"Note {i}", timestamp=ts)
+        for i, ts in enumerate([datetime.now(timezone.utc)] * 3)
+    )
+    await db_session.commit()
+    service = PatientService(db_session)
+    assert await service.delete_patient(sample_patient.id) == PatientDeletion.soft
+
+    assert postgres_db.AsyncSessionLocal is not None
+    async with postgres_db.AsyncSessionLocal() as other:
+        # Another purge holds one note
+        await other.execute(
+            select(PatientNote.id)
+            .where(PatientNote.patient_id == sample_patient.id)
+            .limit(1)
+            .with_for_update()
+        )
+        await service.purge_deleted_patients(batch_size=2)
+        assert await db_session.get(Patient, sample_patient.id) is not None
+        await other.rollback()
+
+    await service.purge_deleted_patients(batch_size=2)
+    db_session.expunge_all()
+    assert await db_session.get(Patient, sample_patient.id) is None
+    assert await db_session.scalar(select(func.count(PatientNote.id))) == 0
+
+
+async def test_bulk_create_patients(db_session: AsyncSession) -> None:
+    service = PatientService(db_session)
+    patients_data = [
+        {"name": f"Patient {i}", "date_of_birth": date(1990, 1, 1), "external_id": None}
+        for i in range(5)
+    ]
+    result = await service.bulk_create_patients(patients_data)
+    assert result["created"] == 5
+    assert result["updated"] == 0
+    assert result["ids"] == sorted(result["ids"])
+    for patient_id, data in zip(result["ids"], patients_data):
+        patient = await service.get_patient(patient_id)
+        assert patient is not None
+        assert patient.name == data["name"]
+
+
+async def test_bulk_upsert_patients(db_session: AsyncSession) -> None:
+    service = PatientService(db_session)
+    first = await service.bulk_create_patients(
+        [
+            {
+                "name": "Old Name",
+                "date_of_birth": date(1990, 1, 1),
+                "external_id": "ext-1",
+            }
+        ]
+    )
+    await service.get_patient(first["ids"][0])  # warm the cache
+
+    result = await service.bulk_create_patients(
+        [
+            {
+                "name": "New Patient",
+                "date_of_birth": date(1991, 1, 1),
+                "external_id": "x",
+            },
+            {
+                "name": "New Name",
+                "date_of_birth": date(1990, 1, 1),
+                "external_id": "ext-1",
+            },
+        ],
+        upsert=True,
+    )
+    assert result["created"] == 1
+    assert result["updated"] == 1
+    assert result["ids"][1] == first["ids"][0]
+    patient = await service.get_patient(first["ids"][0])
+    assert patient is not None
+    assert patient.name == "New Name"
+
+
+async def test_bulk_upsert_skips_patients_pending_purge(
+    db_session: AsyncSession, monkeypatch: Any
+) -> None:
+    monkeypatch.setattr(settings, "patient_purge_threshold", 0)
+    service = PatientService(db_session)
+    row = {"name": "Patient", "date_of_birth": date(1990, 1, 1), "external_id": "e"}
+    first = await service.bulk_create_patients([row])
+    db_session.add(
+        PatientNote(
+            patient_id=first["ids"][0],
+            content="Note",
+            timestamp=datetime.now(timezone.utc),
+        )
+    )
+    await db_session.commit()
+    assert await service.delete_patient(first["ids"][0]) == PatientDeletion.soft
+
+    result = await service.bulk_create_patients([row], upsert=True)
+    assert (result["created"], result["updated"]) == (1, 0)
+    assert result["ids"] != first["ids"]
+    assert await service.get_patient(result["ids"][0]) is not None
+
+
+async def test_read_path_skips_identity_map(
+    db_session: AsyncSession, sample_patients: list[Patient]
+) -> None:
+    ids = [patient.id for patient in sample_patients]
+    db_session.expunge_all()
+    set_params(Params(size=10, page=1))
+    service = PatientService(db_session, use_cache=False)
+    page = await service.list_patients(notes_limit=1)
+    assert [patient.id for patient in page.items] == ids
+    await service.get_patient(ids[0])
+    await service.get_patients(ids)
+    assert len(db_session.identity_map) == 0
+
+
+async def test_start_purge_logs_failures() -> None:
+    with (
+        patch(
+            "app.services.purge.purge_deleted_patients",
+            side_effect=RuntimeError("boom"),
+        ),
+        patch("app.services.purge.logger") as logger,
+    ):
+        task = start_purge()
+        with pytest.raises(RuntimeError):
+            await task
+        await asyncio.sleep(0)
+
+    logger.error.assert_called_once()
@@ -0,0 +1,213 @@
+from argparse import Namespace
+from collections import Counter
+from collections.abc import AsyncGenerator, Generator
+from datetime import date, datetime, timezone
+
+import pytest
+import pytest_asyncio
+from fastapi_pagination import Params, set_params
+from httpx import AsyncClient
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy_utils import create_database, database_exists, drop_database
+
+import alembic
+from alembic.config import Config
+from app.config import settings
+from app.core.backends.postgres import PostgresBackend, shard_index
+from app.core.db import postgres_db
+from app.models.notes import PatientNote
+from app.models.patients import Patient
+from app.schemas.pagination import TotalMode
+from app.services.notes import NoteService
+from app.services.sharded import ShardedNoteService, ShardedPatientService
+
+pytestmark = pytest.mark.asyncio
+
+# Local databases standing in for shards, next to the test database
+SHARD_URLS = [f"{settings.database_url}_shard{i}" for i in range(3)]
+
+NAMES = ["bob", "Alice", "Émile", "Zoe", "carol", "Dave", "Eve"]
+
+
+@pytest.fixture(scope="module")
+def shard_urls() -> Generator[list[str], None, None]:
+    for url in SHARD_URLS:
+        if database_exists(url):
+            drop_database(url)
+        create_database(url)
+        alembic_cfg = Config("alembic.ini", cmd_opts=Namespace(x=[f"url={url}"]))
+        alembic.command.upgrade(alembic_cfg, "head")
+    yield SHARD_URLS
+    for url in SHARD_URLS:
+        drop_database(url)
+
+
+@pytest_asyncio.fixture
+async def sharded_db(shard_urls: list[str]) -> AsyncGenerator[PostgresBackend, None]:
+    await postgres_db.close()
+    await postgres_db.init(settings.database_url, shard_urls=shard_urls)
+    await postgres_db.prepare_shards()
+    yield postgres_db
+    for index in range(len(shard_urls)):
+        async with postgres_db.shard_session(index) as session:
+            await session.execute(delete(PatientNote))
+            await session.execute(delete(Patient))
+            await session.commit()
+
+
+async def shard_patient_ids(backend: PostgresBackend) -> list[set[int]]:
+    ids = []
+    for index in range(len(backend.shards)):
+        async with backend.shard_session(index) as session:
+            ids.append(set((await session.scalars(select(Patient.id))).all()))
+    return ids
+
+
+async def create_patients(backend: PostgresBackend) -> list[int]:
+    assert backend.AsyncSessionLocal is not None
+    async with backend.AsyncSessionLocal() as session:
+        result = await ShardedPatientService(session, backend).bulk_create_patients(
+            [
+                {"name": name, "date_of_birth": date(1980 + i, 1, 1)}
+                for i, name in enumerate(NAMES)
+            ]
+        )
+    return result["ids"]
+
+
+async def test_shard_index_spreads_consecutive_ids() -> None:
+    counts = Counter(shard_index(patient_id, 3) for patient_id in range(1, 3001))
+    assert set(counts) == {0, 1, 2}
+    assert all(900 <= count <= 1100 for count in counts.values())
+    assert shard_index(42, 3) == shard_index(42, 3)
+
+
+async def test_patient_routes_use_the_patient_shard(
+    sharded_db: PostgresBackend, client: AsyncClient
+) -> None:
+    ids = []
+    for i in range(6):
+        response = await client.post(
+            "/patients/", json={"name": f"Patient {i}", "date_of_birth": "1990-01-01"}
+        )
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    assert ids == sorted(ids) and len(set(ids)) == 6
+
+    on_shards = await shard_patient_ids(sharded_db)
+    for patient_id in ids:
+        assert [patient_id in shard for shard in on_shards].count(True) == 1
+        assert patient_id in on_shards[shard_index(patient_id, 3)]
+
+    for patient_id in ids:
+        response = await client.put(f"/patients/{patient_id}", json={"name": "New"})
+        assert response.status_code == 200
+        response = await client.get(f"/patients/{patient_id}")
+        assert response.json()["name"] == "New"
+        response = await client.delete(f"/patients/{patient_id}")
+        assert response.status_code == 204
+    assert await shard_patient_ids(sharded_db) == [set(), set(), set()]
+
+
+async def test_create_patient_route_rejects_duplicate_external_id(
+    sharded_db: PostgresBackend, client: AsyncClient
+) -> None:
+    payload = {"name": "Patient", "date_of_birth": "1990-01-01", "external_id": "e1"}
+    response = await client.post("/patients/", json=payload)
+    assert response.status_code == 201
+    response = await client.post("/patients/", json=payload)
+    assert response.status_code == 409
+    assert sum(len(ids) for ids in await shard_patient_ids(sharded_db)) == 1
+
+
+async def test_list_patients_merges_shards(sharded_db: PostgresBackend) -> None:
+    ids = await create_patients(sharded_db)
+    assert len({shard_index(patient_id, 3) for patient_id in ids}) > 1
+    assert sharded_db.AsyncSessionLocal is not None
+    async with sharded_db.AsyncSessionLocal() as session:
+        service = ShardedPatientService(session, sharded_db)
+
+        set_params(Params(size=3, page=1))
+        page = await service.list_patients(sort_by="name")
+        assert page.total == len(NAMES)
+        assert [p.name for p in page.items] == sorted(NAMES)[:3]
+
+        set_params(Params(size=3, page=2))
+        page = await service.list_patients(sort_by="-date_of_birth")
+        assert [p.name for p in page.items] == NAMES[::-1][3:6]
+        assert page.has_next is True
+
+        set_params(Params(size=3, page=3))
+        page = await service.list_patients(total_mode=TotalMode.none)
+        assert [p.id for p in page.items] == sorted(ids)[6:]
+        assert page.total is None and page.has_next is False
+
+        set_params(Params(size=10, page=1))
+        page = await service.list_patients(name_filter="Alice", notes_limit=2)
+        assert [(p.name, p.notes) for p in page.items] == [("Alice", [])]
+
+
+async def test_get_patients_across_shards(sharded_db: PostgresBackend) -> None:
+    ids = await create_patients(sharded_db)
+    assert sharded_db.AsyncSessionLocal is not None
+    async with sharded_db.AsyncSessionLocal() as session:
+        service = ShardedPatientService(session, sharded_db)
+        requested = [ids[4], 999999, ids[0], ids[5], ids[4]]
+        result = await service.get_patients(requested)
+    assert [p.id for p in result["items"]] == [ids[4], ids[0], ids[5]]
+    assert result["missing"] == [999999]
+
+
+async def test_bulk_upsert_across_shards(sharded_db: PostgresBackend) -> None:
+    assert sharded_db.AsyncSessionLocal is not None
+    async with sharded_db.AsyncSessionLocal() as session:
+        service = ShardedPatientService(session, sharded_db)
+        rows = [
+            {"name": f"P{i}", "date_of_birth": date(1990, 1, 1), "external_id": f"e{i}"}
+            for i in range(6)
+        ]
+        first = await service.bulk_create_patients(rows)
+        assert first["created"] == 6
+
+        with pytest.raises(IntegrityError):
+            await service.bulk_create_patients(rows[:1])
+        with pytest.raises(IntegrityError):
+            await service.create_patient(rows[1])
+
+        rows = [{**row, "name": "Renamed"} for row in rows[3:]] + [
+            {"name": "New", "date_of_birth": date(1990, 1, 1), "external_id": "x"}
+        ]
+        result = await service.bulk_create_patients(rows, upsert=True)
+    assert (result["created"], result["updated"]) == (1, 3)
+    assert result["ids"][:3] == first["ids"][3:]
+    assert sum(len(ids) for ids in await shard_patient_ids(sharded_db)) == 7
+
+
+async def test_search_notes_across_shards(sharded_db: PostgresBackend) -> None:
+    ids = await create_patients(sharded_db)
+    note_ids = []
+    for patient_id in ids:
+        index = shard_index(patient_id, 3)
+        async with sharded_db.shard_session(index) as session:
+            note = await NoteService(session).create_note(
+                patient_id, "Patient reports fever", datetime.now(timezone.utc)
+            )
+            assert note.id % 3 == (index + 1) % 3
+            note_ids.append(note.id)
+
+    assert sharded_db.AsyncSessionLocal is not None
+    async with sharded_db.AsyncSessionLocal() as session:
+        service = ShardedNoteService(session, sharded_db)
+        found: list[int] = []
+        cursor = None
+        while True:
+            page = await service.search_notes("fever", cursor=cursor, limit=3)
+            found += [item["id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert sorted(found) == sorted(note_ids)
+
+        count = await session.scalar(select(func.count(PatientNote.id)))
+    assert count == 0  # nothing on the primary
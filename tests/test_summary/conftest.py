@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -12,7 +12,7 @@ async def sample_patient(db_session: AsyncSession) -> Patient:
     """Create a sample patient for testing."""
     patient = Patient(
         name="John Doe",
-        date_of_birth="1990-01-15",
+        date_of_birth=date(1990, 1, 15),
     )
     db_session.add(patient)
     await db_session.commit()
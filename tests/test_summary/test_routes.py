@@ -76,3 +76,43 @@ class TestSummaryRoutes:
         mock_service.generate_summary.assert_awaited_once_with(
             patient_id=1, llm_service=mock_llm
         )
+
+    async def test_get_patient_summary_timeout(
+        self,
+        client_with_mock_summary_service: AsyncClient,
+        mock_service: AsyncMock,
+    ) -> None:
+        mock_service.generate_summary.side_effect = TimeoutError(
+            "LLM request timed out"
+        )
+
+        response = await client_with_mock_summary_service.get("/patients/1/summary")
+
+        assert response.status_code == 504
+        assert response.json() == {"detail": "Request deadline exceeded"}
+
+    async def test_get_patient_summary_not_modified(
+        self,
+        client_with_mock_summary_service: AsyncClient,
+        mock_service: AsyncMock,
+        mock_llm: AsyncMock,
+    ) -> None:
+        mock_service.get_summary_version.return_value = ("2024-01-01", 3, 7)
+        mock_service.generate_summary.return_value = {
+            "heading": {
+                "patient_id": 1,
+                "name": "John Doe",
+                "date_of_birth": "1990-01-15",
+                "total_notes": 3,
+            },
+            "summary": "This is a sample summary.",
+            "generated_at": "2024-01-01T12:00:00",
+        }
+        response = await client_with_mock_summary_service.get("/patients/1/summary")
+        etag = response.headers["etag"]
+
+        response = await client_with_mock_summary_service.get(
+            "/patients/1/summary", headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        mock_service.generate_summary.assert_awaited_once()
@@ -36,6 +36,7 @@ class TestPatientSummaryService:
         mock_patient.id = 1
         mock_patient.name = "John Doe"
         mock_patient.date_of_birth = "1990-01-15"
+        mock_patient.notes_count = 12
         mock_patients_service.get_patient.return_value = mock_patient
 
         mock_notes_service.get_latests_patient_notes.return_value = sample_patient_notes
@@ -49,7 +50,7 @@ class TestPatientSummaryService:
         assert summary["heading"]["patient_id"] == mock_patient.id
         assert summary["heading"]["name"] == "John Doe"
         assert summary["heading"]["date_of_birth"] == "1990-01-15"
-        assert summary["heading"]["total_notes"] == len(sample_patient_notes)
+        assert summary["heading"]["total_notes"] == 12
         assert summary["summary"] == "Summary text"
         assert "generated_at" in summary
         mock_patients_service.get_patient.assert_awaited_once_with(mock_patient.id)